@@ -0,0 +1 @@
+"""Micro-benchmarks of the core and persistence packages."""
@@ -0,0 +1,139 @@
+"""Throughput of a UserService shared by threads, in operations per second.
+
+Threads share a fixed number of operations - a mix of reads and message
+sends against a fresh copy of one cached JSON database. Compares
+the reader/writer locking of the persistence stack against serializing
+every call with a single lock, for growing numbers of threads
+
+Run from the project directory, optionally with a share of writes:
+    python -m benchmarks.concurrent_throughput [write_ratio]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from threading import Barrier, Lock, Thread
+from typing import Any, Callable, List
+
+from core.factory import get_user_service, open_database
+from core.user_service import UserService
+
+DEFAULT_WRITE_RATIO = 0.05
+USERS = 200
+OPERATIONS = 8000
+THREAD_COUNTS = [1, 2, 4, 8]
+PASSWORD = "Pa$$word8123"
+
+
+class SerializedService:
+    """UserService proxy running every call under one exclusive lock."""
+
+    def __init__(self, user_service: UserService) -> None:
+        """Wrap the service."""
+        self.__user_service = user_service
+        self.__lock = Lock()
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        """Return the service's method wrapped with the lock."""
+        method = getattr(self.__user_service, name)
+
+        def locked(*args: Any, **kwargs: Any) -> Any:
+            with self.__lock:
+                return method(*args, **kwargs)
+        return locked
+
+
+def create_database_file(directory: str) -> str:
+    """Create a database with registered users, return its path."""
+    path = os.path.join(directory, "template.json")
+    with open(path, mode="w", encoding="utf-8") as db_file:
+        db_file.write(
+            '{"users": {}, "messages": {}, '
+            '"friend_requests": {}, "photos": {}}'
+        )
+    database = open_database(path)
+    user_service = get_user_service(database)
+    for i in range(USERS):
+        user_service.register_new_user(
+            f"user {i}", f"user{i}@example.com", PASSWORD
+        )
+    database.close()
+    return path
+
+
+def run_operations(user_service: Any, seed: int, count: int,
+                   write_ratio: float) -> None:
+    """Run a random mix of reads and sends of the logged-in user."""
+    generator = random.Random(seed)
+    sender = user_service.get_current_user()
+    receivers = user_service.get_users_by_username_fragment("user 1")
+    for i in range(count):
+        receiver = generator.choice(receivers)
+        draw = generator.random()
+        if draw < write_ratio:
+            user_service.send_message(sender, receiver, f"{seed} {i}")
+        elif draw < (1 + write_ratio) / 2:
+            user_service.get_messages_page(sender, receiver, limit=20)
+        else:
+            user_service.get_users_by_username_fragment(
+                f"user {generator.randrange(USERS)}"
+            )
+
+
+def measure(template_path: str, thread_count: int, serialized: bool,
+            write_ratio: float) -> float:
+    """Return operations per second of all threads together."""
+    path = os.path.join(os.path.dirname(template_path), "database.json")
+    shutil.copyfile(template_path, path)
+    database = open_database(path)
+    user_service: Any = get_user_service(database)
+    user_service.log_in_user("user 0", PASSWORD)
+    if serialized:
+        user_service = SerializedService(user_service)
+
+    barrier = Barrier(thread_count + 1)
+
+    def work(seed: int) -> None:
+        barrier.wait()
+        run_operations(
+            user_service, seed, OPERATIONS // thread_count, write_ratio
+        )
+
+    threads: List[Thread] = [
+        Thread(target=work, args=(seed,)) for seed in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    database.close()
+    return OPERATIONS / seconds
+
+
+def main(args):
+    """Print throughput of both locking schemes for every thread count."""
+    write_ratio = float(args[1]) if len(args) > 1 else DEFAULT_WRITE_RATIO
+    with tempfile.TemporaryDirectory() as directory:
+        template_path = create_database_file(directory)
+        print(f"{USERS} users, {OPERATIONS} operations,"
+              f" {write_ratio:.0%} writes")
+        for thread_count in THREAD_COUNTS:
+            serialized = measure(
+                template_path, thread_count, True, write_ratio
+            )
+            rw_locked = measure(
+                template_path, thread_count, False, write_ratio
+            )
+            print(f"{thread_count} threads: "
+                  f"single lock {serialized:.0f} ops/s, "
+                  f"rw lock {rw_locked:.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
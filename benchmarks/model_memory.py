@@ -0,0 +1,94 @@
+"""Resident memory of materialized messages, in bytes per entity.
+
+Compares slotted, frozen Message with interned user ids against
+an equivalent plain dataclass, as messages were defined before
+
+Run from the project directory, optionally with a number of messages:
+    python -m benchmarks.model_memory [count]
+"""
+
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from core.identifiers import generate_uuid
+from core.serializers import MessageSerializer
+
+DEFAULT_COUNT = 1_000_000
+USERS = 100
+
+
+@dataclass
+class LegacyMessage:
+    """Message as a plain dataclass with an instance dictionary."""
+
+    uuid: str
+    text: str
+    timestamp: datetime
+    from_user_id: str
+    to_user_id: str
+
+
+def legacy_from_json(json_dict: Dict) -> LegacyMessage:
+    """Deserialize a message the way it was done before."""
+    return LegacyMessage(
+        uuid=json_dict["uuid"],
+        text=json_dict["text"],
+        timestamp=datetime.fromisoformat(json_dict["timestamp"]),
+        from_user_id=json_dict["from_user_id"],
+        to_user_id=json_dict["to_user_id"]
+    )
+
+
+def current_from_json(json_dict: Dict):
+    """Deserialize a message from the database."""
+    return MessageSerializer.from_json(json_dict, trusted=True)
+
+
+def generate_messages_json(count: int) -> List[Dict]:
+    """Generate message dictionaries as parsed from a database file.
+
+    Every dictionary has its own copies of strings, like after json.load
+    """
+    user_ids = [generate_uuid() for _ in range(USERS)]
+    start = datetime(2023, 1, 1)
+    return [
+        {
+            "uuid": generate_uuid(),
+            "text": "Hello!",
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "from_user_id": "".join(user_ids[i % USERS]),
+            "to_user_id": "".join(user_ids[(i + 1) % USERS])
+        }
+        for i in range(count)
+    ]
+
+
+def measure(from_json: Callable[[Dict], object],
+            messages_json: List[Dict]) -> float:
+    """Return bytes allocated per deserialized message."""
+    tracemalloc.start()
+    messages = [from_json(message_json) for message_json in messages_json]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del messages
+    return allocated / len(messages_json)
+
+
+def main(args):
+    """Print bytes per message before and after."""
+    count = int(args[1]) if len(args) > 1 else DEFAULT_COUNT
+    messages_json = generate_messages_json(count)
+
+    before = measure(legacy_from_json, messages_json)
+    after = measure(current_from_json, messages_json)
+    print(f"{count} messages")
+    print(f"before: {before:.1f} bytes per message")
+    print(f"after:  {after:.1f} bytes per message")
+    print(f"saved:  {(1 - after / before) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
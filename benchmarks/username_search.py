@@ -0,0 +1,82 @@
+"""Time of username fragment search, in microseconds per query.
+
+Compares the trigram index of UserRepository against a linear scan
+of all usernames, as the search was done before
+
+Run from the project directory, optionally with a number of users:
+    python -m benchmarks.username_search [count]
+"""
+
+import random
+import sys
+import timeit
+from typing import Callable, Dict, List
+
+from core.identifiers import generate_uuid
+from persistence.indexes import TrigramIndex
+
+DEFAULT_COUNT = 100_000
+QUERIES = 200
+LIMIT = 20
+SYLLABLES = ["ka", "ro", "mi", "lu", "be", "ta", "no", "wi", "se", "do"]
+
+
+def generate_users_json(count: int) -> List[Dict]:
+    """Generate user dictionaries with random usernames."""
+    generator = random.Random(0)
+    return [
+        {
+            "uuid": generate_uuid(),
+            "username": "".join(generator.choices(SYLLABLES, k=4)) + str(i)
+        }
+        for i in range(count)
+    ]
+
+
+def linear_search(users_json: List[Dict]) -> Callable[[str], List[str]]:
+    """Return a search scanning all usernames, ordered like the index."""
+    def search(fragment: str) -> List[str]:
+        matches = sorted(
+            (user["username"], user["uuid"]) for user in users_json
+            if fragment in user["username"]
+        )
+        return [user_id for _, user_id in matches[:LIMIT]]
+    return search
+
+
+def index_search(users_json: List[Dict]) -> Callable[[str], List[str]]:
+    """Return a search using the trigram index."""
+    index = TrigramIndex("username")
+    for user_json in users_json:
+        index.add(user_json)
+    return lambda fragment: index.search(fragment, LIMIT)
+
+
+def measure(search: Callable[[str], List[str]], fragments: List[str]) -> float:
+    """Return microseconds per query."""
+    seconds = timeit.timeit(
+        lambda: [search(fragment) for fragment in fragments], number=1
+    )
+    return seconds / len(fragments) * 1_000_000
+
+
+def main(args):
+    """Print time per query before and after."""
+    count = int(args[1]) if len(args) > 1 else DEFAULT_COUNT
+    users_json = generate_users_json(count)
+    generator = random.Random(1)
+    fragments = [
+        user["username"][:6]
+        for user in generator.choices(users_json, k=QUERIES)
+    ]
+
+    before = measure(linear_search(users_json), fragments)
+    after = measure(index_search(users_json), fragments)
+    print(f"{count} users, {QUERIES} queries, limit {LIMIT}")
+    print(f"before: {before:.1f} us per query")
+    print(f"after:  {after:.1f} us per query")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
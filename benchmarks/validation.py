@@ -0,0 +1,129 @@
+"""Per-entity validation cost of model classes, before and after.
+
+Validation functions from before precompiling patterns are kept here
+as a baseline, the current ones are imported from core.validation
+
+Run from the project directory:
+    python -m benchmarks.validation
+"""
+
+import os
+import re
+from string import ascii_letters
+from timeit import timeit
+from typing import Callable, Dict
+
+from core import validation
+from core.identifiers import generate_uuid
+
+REPEATS = 2000
+PHOTO_SIZE = 100_000
+FRIENDS = 20
+
+
+def legacy_is_uuid(uuid: str) -> bool:
+    """Check uuid compiling the pattern on every call."""
+    uuid_pattern = re.compile(
+        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    )
+    return bool(re.fullmatch(uuid_pattern, uuid))
+
+
+def legacy_is_email(text: str) -> bool:
+    """Check email compiling the pattern on every call."""
+    email_pattern = re.compile(
+        r"([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+"
+    )
+    return bool(re.fullmatch(email_pattern, text))
+
+
+def legacy_is_filename(text: str) -> bool:
+    """Check filename compiling the pattern on every call."""
+    filename_pattern = re.compile(r".+\..+")
+    return bool(re.fullmatch(filename_pattern, text))
+
+
+def legacy_is_hex(text: str) -> bool:
+    """Check hex digits one by one."""
+    return all(char in "01234556789abcdef" for char in text)
+
+
+def legacy_is_hash(text: str) -> bool:
+    """Check hash digits one by one."""
+    if len(text) != 64:
+        return False
+    if any(char not in "0123456789abcdef" for char in text):
+        return False
+    return True
+
+
+def legacy_is_salt(text: str) -> bool:
+    """Check salt letters one by one."""
+    if len(text) != validation.SALT_LENGTH:
+        return False
+    if any(char not in ascii_letters for char in text):
+        return False
+    return True
+
+
+LEGACY = {
+    "is_uuid": legacy_is_uuid,
+    "is_email": legacy_is_email,
+    "is_filename": legacy_is_filename,
+    "is_hex": legacy_is_hex,
+    "is_hash": legacy_is_hash,
+    "is_salt": legacy_is_salt,
+}
+CURRENT = {name: getattr(validation, name) for name in LEGACY}
+
+
+def validate_user(check: Dict[str, Callable[[str], bool]]) -> None:
+    """Run checks performed by User.__post_init__."""
+    check["is_uuid"](USER_ID)
+    check["is_email"]("name.surname@example.com")
+    check["is_hash"](
+        "fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd"
+    )
+    check["is_salt"]("aBcDeFgHiJ")
+    for friend_id in FRIEND_IDS:
+        check["is_uuid"](friend_id)
+
+
+def validate_message(check: Dict[str, Callable[[str], bool]]) -> None:
+    """Run checks performed by Message.__post_init__."""
+    check["is_uuid"](MESSAGE_ID)
+    check["is_uuid"](USER_ID)
+    check["is_uuid"](FRIEND_IDS[0])
+
+
+def validate_photo(check: Dict[str, Callable[[str], bool]]) -> None:
+    """Run checks performed by Photo.__post_init__."""
+    check["is_uuid"](MESSAGE_ID)
+    check["is_filename"]("picture.jpg")
+    check["is_hex"](PHOTO_HEX)
+
+
+USER_ID = generate_uuid()
+MESSAGE_ID = generate_uuid()
+FRIEND_IDS = [generate_uuid() for _ in range(FRIENDS)]
+PHOTO_HEX = os.urandom(PHOTO_SIZE).hex()
+
+
+def main():
+    """Print per-entity validation time before and after."""
+    cases = [
+        (f"User ({FRIENDS} friends)", validate_user, REPEATS),
+        ("Message", validate_message, REPEATS),
+        (f"Photo ({PHOTO_SIZE // 1000} kB)", validate_photo, 20),
+    ]
+    print(f"{'entity':<22}{'before [us]':>14}{'after [us]':>14}"
+          f"{'speedup':>10}")
+    for name, validate, repeats in cases:
+        before = timeit(lambda: validate(LEGACY), number=repeats) / repeats
+        after = timeit(lambda: validate(CURRENT), number=repeats) / repeats
+        print(f"{name:<22}{before * 1e6:>14.1f}{after * 1e6:>14.1f}"
+              f"{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from copy import deepcopy
 from hashlib import sha256
 from random import choices
 from string import ascii_letters
+from threading import Lock
 from typing import Optional
 
 from core.model import User
@@ -17,6 +18,7 @@ class Authentication:
     Stores currently logged-in user.
     Handles logging in and out.
     Compares user credentials with those stored in UserRepository.
+    Logged-in user is shared by all threads using the object.
     """
 
     def __init__(self, user_repository: UserRepository):
@@ -26,6 +28,7 @@ class Authentication:
         """
         self.__user_repository = user_repository
         self.__logged_in_user: Optional[User] = None
+        self.__lock = Lock()
 
     def log_in(self, login: str, password: str) -> None:
         """Attempt to log in with given credentials.
@@ -36,21 +39,21 @@ class Authentication:
         :raises UserDoesNotExistError: if there is no user with matching login
         :raises IncorrectPasswordError: if given password is incorrect
         """
-        if self.__logged_in_user is not None:
-            self.log_out()
+        self.log_out()
 
         user = self.__user_repository.get_by_username(login)
         if user is None:
             raise UserDoesNotExistError(login)
 
-        if hash_password(password, user.salt) == user.password_hash:
-            self.__logged_in_user = user
-        else:
+        if hash_password(password, user.salt) != user.password_hash:
             raise IncorrectPasswordError()
+        with self.__lock:
+            self.__logged_in_user = user
 
     def log_out(self) -> None:
         """Log out currently logged-in user if there is any."""
-        self.__logged_in_user = None
+        with self.__lock:
+            self.__logged_in_user = None
 
     @property
     def logged_in_user(self) -> Optional[User]:
@@ -59,7 +62,9 @@ class Authentication:
         Copying to prevent from mutating the user externally - avoid
             security vulnerability
         """
-        return deepcopy(self.__logged_in_user)
+        with self.__lock:
+            logged_in_user = self.__logged_in_user
+        return deepcopy(logged_in_user)
 
 
 def hash_password(password: str, salt: str) -> str:
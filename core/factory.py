@@ -1,6 +1,7 @@
 """Utilities for creating class instances with their dependencies."""
 
-from typing import TextIO
+import os
+from typing import TextIO, Optional
 
 from core.authentication import Authentication
 from core.model import User, Message, FriendRequest, Photo
@@ -8,14 +9,46 @@ from core.serializers import (
     MessageSerializer, UserSerializer, FriendRequestSerializer, PhotoSerializer
 )
 from core.user_service import UserService
+from persistence.blob_store import BlobStore
+from persistence.directory_database import DirectoryDatabase
+from persistence.interface import Database
 from persistence.json_database import JsonDatabase
+from persistence.log_database import LogDatabase
+from persistence.sqlite_database import (
+    IndexSpec, SqliteDatabase, migrate_json_database
+)
 from persistence.repositories import (
     PhotoRepository, MessageRepository,
     UserRepository, FriendRequestRepository
 )
 
+COLLECTION_NAME_MAP = {
+    User: "users",
+    Message: "messages",
+    FriendRequest: "friend_requests",
+    Photo: "photos"
+}
+COLLECTION_NAMES = list(COLLECTION_NAME_MAP.values())
+LOG_DATABASE_SUFFIX = ".log"
+SQLITE_DATABASE_SUFFIX = ".sqlite"
+SQLITE_INDEXES: IndexSpec = {
+    "users": [("username",), ("email",)],
+    "messages": [("from_user_id", "to_user_id", "timestamp")],
+    "friend_requests": [
+        ("to_user_id", "timestamp"),
+        ("from_user_id", "timestamp")
+    ]
+}
+BLOB_STORE_SUFFIX = ".blobs"
+FLUSH_EVERY = 100
+FLUSH_INTERVAL_MS = 1000
+WATCH_INTERVAL_MS = 500
+
 
-def get_user_service_default(database_file: TextIO) -> UserService:
+def get_user_service_default(
+        database_file: TextIO,
+        cached: bool = False
+) -> UserService:
     """Create UserService connected to database in given file.
 
     Creating all dependencies, sharing class instances.
@@ -23,32 +56,44 @@ def get_user_service_default(database_file: TextIO) -> UserService:
 
     :param database_file: file storing the database used
         by UserService and its dependencies
+    :param cached: whether the database should keep its collections
+        in memory, defaults to False
     """
-    collection_name_map = {
-        User: "users",
-        Message: "messages",
-        FriendRequest: "friend_requests",
-        Photo: "photos"
-    }
-    collection_names = list(collection_name_map.values())
-    database = JsonDatabase(database_file, collection_names)
+    database = JsonDatabase(database_file, COLLECTION_NAMES, cached)
+    return get_user_service(database)
+
+
+def get_user_service(
+        database: Database,
+        blob_store: Optional[BlobStore] = None
+) -> UserService:
+    """Create UserService connected to the given database.
+
+    Creating all dependencies, sharing class instances.
+    Database must provide default collections - users, messages,
+    friend_requests, photos
 
+    :param database: database used by UserService and its dependencies
+    :param blob_store: store for content of photos, defaults to None -
+        photos are stored entirely in the database
+    """
     user_serializer = UserSerializer()
     message_serializer = MessageSerializer()
     friend_request_serializer = FriendRequestSerializer()
     photo_serializer = PhotoSerializer()
 
     user_repository = UserRepository(
-        database, user_serializer, collection_name_map[User]
+        database, user_serializer, COLLECTION_NAME_MAP[User]
     )
     message_repository = MessageRepository(
-        database, message_serializer, collection_name_map[Message]
+        database, message_serializer, COLLECTION_NAME_MAP[Message]
     )
     friend_request_repository = FriendRequestRepository(
-        database, friend_request_serializer, collection_name_map[FriendRequest]
+        database, friend_request_serializer,
+        COLLECTION_NAME_MAP[FriendRequest]
     )
     photo_repository = PhotoRepository(
-        database, photo_serializer, collection_name_map[Photo]
+        database, photo_serializer, COLLECTION_NAME_MAP[Photo], blob_store
     )
 
     authentication = Authentication(user_repository)
@@ -61,3 +106,67 @@ def get_user_service_default(database_file: TextIO) -> UserService:
     )
 
     return user_service
+
+
+def open_database(path: str) -> Database:
+    """Open a database with default collections stored under given path.
+
+    Paths ending with LOG_DATABASE_SUFFIX are opened as a LogDatabase,
+    paths ending with SQLITE_DATABASE_SUFFIX as an SqliteDatabase,
+    directories are opened as a DirectoryDatabase with a file
+    per collection, any other path is opened as a JSON file.
+    JSON files are opened in cached mode, flushed every FLUSH_EVERY
+    mutations or FLUSH_INTERVAL_MS milliseconds after a change,
+    the database must be closed to persist all changes.
+    JSON files, also of directories, are checked for changes made
+    by other instances every WATCH_INTERVAL_MS milliseconds
+
+    :param path: path to the database file
+    """
+    if path.endswith(LOG_DATABASE_SUFFIX):
+        return LogDatabase(path, COLLECTION_NAMES)
+    if path.endswith(SQLITE_DATABASE_SUFFIX):
+        return SqliteDatabase(path, COLLECTION_NAMES, SQLITE_INDEXES)
+    if os.path.isdir(path):
+        return DirectoryDatabase(
+            path,
+            COLLECTION_NAMES,
+            cached=True,
+            flush_every=FLUSH_EVERY,
+            flush_interval_ms=FLUSH_INTERVAL_MS,
+            watch_interval_ms=WATCH_INTERVAL_MS
+        )
+
+    db_file = open(path, mode="r+", encoding="utf-8")
+    return JsonDatabase(
+        db_file,
+        COLLECTION_NAMES,
+        cached=True,
+        flush_every=FLUSH_EVERY,
+        flush_interval_ms=FLUSH_INTERVAL_MS,
+        watch_interval_ms=WATCH_INTERVAL_MS
+    )
+
+
+def open_blob_store(database_path: str) -> BlobStore:
+    """Open a blob store kept next to the database under given path.
+
+    :param database_path: path to the database file
+    """
+    return BlobStore(database_path + BLOB_STORE_SUFFIX)
+
+
+def migrate_to_sqlite(json_path: str, sqlite_path: str) -> None:
+    """Copy a JSON database with default collections to an SQLite database.
+
+    SQLite file is created if missing
+
+    :param json_path: path to the JSON database file
+    :param sqlite_path: path to the SQLite database file
+    :raises InvalidDatabaseFileError: if JSON file is not a valid database
+    """
+    database = SqliteDatabase(sqlite_path, COLLECTION_NAMES, SQLITE_INDEXES)
+    try:
+        migrate_json_database(json_path, database, COLLECTION_NAMES)
+    finally:
+        database.close()
@@ -1,9 +1,13 @@
 """Model classes structuring data used and persisted by the application."""
 
-from dataclasses import dataclass, field
+from dataclasses import (
+    dataclass, field, fields, MISSING, FrozenInstanceError
+)
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Protocol, List, BinaryIO, Tuple
+from typing import (
+    Optional, Protocol, Set, BinaryIO, Tuple, Type, TypeVar, cast
+)
 
 from core.identifiers import generate_uuid
 from core.validation import (
@@ -23,19 +27,123 @@ from core.validation import (
 class Entity(Protocol):
     """Entity persisted in a database."""
 
-    uuid: str
+    @property
+    def uuid(self) -> str:
+        """Return id of the entity."""
+        ...
+
+
+M = TypeVar("M")
+
+
+def create_trusted(model_class: Type[M], **field_values) -> M:
+    """Create an instance of a model class skipping its validation.
+
+    Only for data which was validated before, like entities loaded
+    from the application's own database. Omitted fields get their
+    default values
+
+    :param model_class: dataclass to instantiate
+    :param field_values: values of the fields by name
+    """
+    instance = model_class.__new__(model_class)
+    for model_field in fields(model_class):  # type: ignore
+        if model_field.name in field_values:
+            value = field_values[model_field.name]
+        elif model_field.default is not MISSING:
+            value = model_field.default
+        else:
+            value = model_field.default_factory()  # type: ignore
+        object.__setattr__(instance, model_field.name, value)
+    return instance
+
+
+def slotted(cls: Type[M]) -> Type[M]:
+    """Recreate a dataclass with __slots__ instead of instance dictionaries.
+
+    Equivalent of dataclass(slots=True) available since Python 3.10,
+    must be applied above the dataclass decorator.
+    Frozen dataclasses get pickling support, which they would lose
+    with slots otherwise, and reject assignment of any attribute
+
+    :param cls: dataclass to recreate
+    """
+    field_names = tuple(
+        model_field.name
+        for model_field in fields(cls)  # type: ignore
+    )
+    namespace = dict(cls.__dict__)
+    namespace["__slots__"] = field_names
+    for name in field_names:
+        namespace.pop(name, None)  # Default values are kept by __init__
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+
+    if namespace["__dataclass_params__"].frozen:
+        namespace["__getstate__"] = _get_slots_state
+        namespace["__setstate__"] = _set_frozen_slots_state
+        namespace["__setattr__"] = _frozen_setattr
+        namespace["__delattr__"] = _frozen_delattr
+
+    slotted_class = type(cls.__name__, cls.__bases__, namespace)
+    slotted_class.__qualname__ = cls.__qualname__
+    return cast(Type[M], slotted_class)
+
+
+def _get_slots_state(self) -> Tuple:
+    """Return values of all slots of a slotted dataclass instance."""
+    return tuple(getattr(self, name) for name in self.__slots__)
+
+
+def _set_frozen_slots_state(self, state: Tuple) -> None:
+    """Restore values of all slots of a frozen dataclass instance."""
+    for name, value in zip(self.__slots__, state):
+        object.__setattr__(self, name, value)
+
 
+def _frozen_setattr(self, name: str, value) -> None:
+    """Reject assignment to an attribute of a frozen instance."""
+    raise FrozenInstanceError(f"cannot assign to field '{name}'")
 
+
+def _frozen_delattr(self, name: str) -> None:
+    """Reject deletion of an attribute of a frozen instance."""
+    raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+
+class Blob(Protocol):
+    """Binary content of a file."""
+
+    def get_buffer(self) -> memoryview:
+        """Return the content without copying it."""
+        ...
+
+
+@dataclass(frozen=True)
+class BytesBlob:
+    """Binary content held in memory."""
+
+    data: bytes
+
+    def get_buffer(self) -> memoryview:
+        """Return the content without copying it."""
+        return memoryview(self.data)
+
+
+@slotted
 @dataclass
 class User:
-    """Class for storing data about a user."""
+    """Class for storing data about a user.
+
+    Friends are kept in a set of their uuids
+    """
 
     uuid: str
     username: str
     email: str
     password_hash: str
     salt: str
-    friend_uuids: List[str] = field(default_factory=list)
+    friend_uuids: Set[str] = field(default_factory=set)
     profile_picture_id: Optional[str] = None
     bio: Optional[str] = None
 
@@ -78,10 +186,21 @@ class User:
         """
         return user.uuid in self.friend_uuids
 
+    def get_mutual_friend_uuids(self, user: 'User') -> Set[str]:
+        """Return uuids of friends common to self and user.
 
-@dataclass
+        :param user: the other user
+        """
+        return self.friend_uuids & user.friend_uuids
+
+
+@slotted
+@dataclass(frozen=True)
 class Message:
-    """Class for storing data about a message."""
+    """Class for storing data about a message.
+
+    Messages are immutable
+    """
 
     uuid: str
     text: str
@@ -109,6 +228,7 @@ class Message:
             raise SelfReferenceError()
 
 
+@slotted
 @dataclass
 class FriendRequest:
     """Class for storing data about a friend request."""
@@ -135,17 +255,20 @@ class FriendRequest:
             raise SelfReferenceError()
 
 
+@slotted
 @dataclass
 class Photo:
     """Class representing a photo.
 
-    Content of the binary file is stored as a string of hexadecimal digits
+    Content of the binary file is either held by a blob
+    or stored as a string of hexadecimal digits
     """
 
     uuid: str
     filename: str
     format: str
-    binary_data_hex: str
+    binary_data_hex: str = ""
+    blob: Optional[Blob] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
         """Validate parameters.
@@ -173,8 +296,16 @@ class Photo:
 
     def get_bytes(self) -> bytes:
         """Return binary data of the photo."""
+        if self.blob is not None:
+            return bytes(self.blob.get_buffer())
         return bytes.fromhex(self.binary_data_hex)
 
+    def get_buffer(self) -> memoryview:
+        """Return binary data of the photo, without copying if possible."""
+        if self.blob is not None:
+            return self.blob.get_buffer()
+        return memoryview(bytes.fromhex(self.binary_data_hex))
+
     @classmethod
     def from_file(cls, file_handle: BinaryIO, file_path: str) -> 'Photo':
         """Create a Photo object from a binary file.
@@ -192,6 +323,5 @@ class Photo:
         file_format = path.suffix.replace(".", "")
 
         photo_data = file_handle.read()
-        binary_data_hex = photo_data.hex()
 
-        return cls(uuid, filename, file_format, binary_data_hex)
+        return cls(uuid, filename, file_format, blob=BytesBlob(photo_data))
@@ -1,9 +1,13 @@
 """Json serialization of model classes."""
 
 from datetime import datetime
-from typing import Dict
+from functools import partial
+from sys import intern
+from typing import Dict, Callable, Type, TypeVar
 
-from core.model import User, Message, FriendRequest, Photo
+from core.model import User, Message, FriendRequest, Photo, create_trusted
+
+M = TypeVar("M")
 
 
 class UserSerializer:
@@ -21,27 +25,29 @@ class UserSerializer:
             "email": entity.email,
             "password_hash": entity.password_hash,
             "salt": entity.salt,
-            "friend_uuids": entity.friend_uuids,
+            "friend_uuids": sorted(entity.friend_uuids),
             "profile_picture_id": entity.profile_picture_id,
             "bio": entity.bio
         }
 
     @staticmethod
-    def from_json(json_dict: Dict) -> User:
+    def from_json(json_dict: Dict, trusted: bool = False) -> User:
         """Create user object from its JSON representation.
 
         :param json_dict: dictionary representation of a user
+        :param trusted: skip validation of already validated data,
+            defaults to False
         :raises RepresentationError: if json_dict is not a
             valid representation of a user
         """
         try:
-            return User(
+            return _constructor(User, trusted)(
                 uuid=json_dict["uuid"],
                 username=json_dict["username"],
                 email=json_dict["email"],
                 password_hash=json_dict["password_hash"],
                 salt=json_dict["salt"],
-                friend_uuids=json_dict["friend_uuids"],
+                friend_uuids=set(json_dict["friend_uuids"]),
                 profile_picture_id=json_dict["profile_picture_id"],
                 bio=json_dict["bio"]
             )
@@ -69,20 +75,24 @@ class MessageSerializer:
         }
 
     @staticmethod
-    def from_json(json_dict: Dict) -> Message:
+    def from_json(json_dict: Dict, trusted: bool = False) -> Message:
         """Create a message object from its JSON representation.
 
+        User ids are interned, so messages of the same users share them
+
         :param json_dict: dictionary representation of a message
+        :param trusted: skip validation of already validated data,
+            defaults to False
         :raises RepresentationError: if json_dict is not a
             valid representation of a message
         """
         try:
-            return Message(
+            return _constructor(Message, trusted)(
                 uuid=json_dict["uuid"],
                 text=json_dict["text"],
                 timestamp=datetime.fromisoformat(json_dict["timestamp"]),
-                from_user_id=json_dict["from_user_id"],
-                to_user_id=json_dict["to_user_id"]
+                from_user_id=intern(json_dict["from_user_id"]),
+                to_user_id=intern(json_dict["to_user_id"])
             )
         except KeyError:
             raise RepresentationError(json_dict)
@@ -107,15 +117,17 @@ class FriendRequestSerializer:
         }
 
     @staticmethod
-    def from_json(json_dict: Dict) -> FriendRequest:
+    def from_json(json_dict: Dict, trusted: bool = False) -> FriendRequest:
         """Create a friend request object from its JSON representation.
 
         :param json_dict: dictionary representation of a friend request
+        :param trusted: skip validation of already validated data,
+            defaults to False
         :raises RepresentationError: if json_dict is not a
             valid representation of a friend request
         """
         try:
-            return FriendRequest(
+            return _constructor(FriendRequest, trusted)(
                 uuid=json_dict["uuid"],
                 timestamp=datetime.fromisoformat(json_dict["timestamp"]),
                 from_user_id=json_dict["from_user_id"],
@@ -132,25 +144,33 @@ class PhotoSerializer:
     def to_json(entity: Photo) -> Dict:
         """Convert a Photo object to a JSON representation.
 
+        Content held by a blob is converted to a string of hex digits
+
         :param entity: photo to serializer
         """
+        if entity.blob is not None:
+            binary_data_hex = entity.get_buffer().hex()
+        else:
+            binary_data_hex = entity.binary_data_hex
         return {
             "uuid": entity.uuid,
             "filename": entity.filename,
             "format": entity.format,
-            "binary_data_hex": entity.binary_data_hex
+            "binary_data_hex": binary_data_hex
         }
 
     @staticmethod
-    def from_json(json_dict: Dict) -> Photo:
+    def from_json(json_dict: Dict, trusted: bool = False) -> Photo:
         """Create a Photo object from its JSON representation.
 
         :param json_dict: dictionary representation of a photo
+        :param trusted: skip validation of already validated data,
+            defaults to False
         :raises RepresentationError: if json_dict is not a
             valid representation of a friend request
         """
         try:
-            return Photo(
+            return _constructor(Photo, trusted)(
                 uuid=json_dict["uuid"],
                 filename=json_dict["filename"],
                 format=json_dict["format"],
@@ -160,6 +180,11 @@ class PhotoSerializer:
             raise RepresentationError(json_dict)
 
 
+def _constructor(model_class: Type[M], trusted: bool) -> Callable[..., M]:
+    """Return function creating model instances, validating if untrusted."""
+    return partial(create_trusted, model_class) if trusted else model_class
+
+
 class RepresentationError(Exception):
     """Exception signaling invalid representation of an entity."""
 
@@ -0,0 +1,118 @@
+"""Incremental search of users the logged-in user can invite."""
+
+from typing import Optional, List, Set, Tuple
+
+from core.authentication import UnauthorizedError
+from core.model import User
+from core.user_service import UserService
+
+
+class InviteCandidateSearch:
+    """Search of users by username fragment, for search-as-you-type.
+
+    Excludes the logged-in user, his friends and users with a pending
+    friend request from or to him. Ids to exclude are collected once,
+    into a set, and kept until reset or until the service's data
+    version changes.
+    When the query extends the previous one, results are narrowed
+    from the previous result instead of searching the database again.
+    """
+
+    def __init__(self, user_service: UserService, limit: Optional[int] = None):
+        """Create search using the given service.
+
+        :param user_service: service providing users and friend requests
+        :param limit: maximal number of returned users,
+            defaults to None - no limit
+        """
+        self.__user_service = user_service
+        self.__limit = limit
+        self.__excluded_ids: Optional[Set[str]] = None
+        self.__last_fragment: Optional[str] = None
+        self.__last_users: List[User] = []
+        self.__data_version: Optional[Tuple[int, ...]] = None
+
+    def search(self, username_fragment: str) -> List[User]:
+        """Get users to invite with usernames containing the fragment.
+
+        Users are ordered by username
+
+        :param username_fragment: exact text contained in users' usernames
+        :raises UnauthorizedError: if nobody is logged-in
+        """
+        data_version = self.__user_service.get_data_version()
+        if data_version != self.__data_version:
+            self.reset()
+            self.__data_version = data_version
+
+        if self.__last_fragment is not None \
+                and self.__last_fragment in username_fragment:
+            users = [
+                user for user in self.__last_users
+                if username_fragment in user.username
+            ]
+            complete = True
+        else:
+            users, complete = self._search_service(username_fragment)
+
+        if complete:
+            self.__last_fragment = username_fragment
+            self.__last_users = users
+        else:
+            self.__last_fragment = None
+            self.__last_users = []
+        return users[:self.__limit]
+
+    def reset(self) -> None:
+        """Forget cached results and excluded users.
+
+        Called by search when the service's data version changed
+        """
+        self.__excluded_ids = None
+        self.__last_fragment = None
+        self.__last_users = []
+
+    def _search_service(
+            self, username_fragment: str
+    ) -> Tuple[List[User], bool]:
+        """Search users in the service, return them and completeness.
+
+        Result is complete if it contains all matching users,
+        not only the first ones up to the limit
+        """
+        excluded_ids = self._get_excluded_ids()
+        fetch_limit = None
+        if self.__limit is not None:
+            fetch_limit = self.__limit + len(excluded_ids) + 1
+
+        found = self.__user_service.get_users_by_username_fragment(
+            username_fragment, fetch_limit
+        )
+        users = [user for user in found if user.uuid not in excluded_ids]
+        complete = fetch_limit is None or len(found) < fetch_limit
+        return users, complete
+
+    def _get_excluded_ids(self) -> Set[str]:
+        """Return ids of users who can not be invited, collecting them once.
+
+        :raises UnauthorizedError: if nobody is logged-in
+        """
+        if self.__excluded_ids is not None:
+            return self.__excluded_ids
+
+        current_user = self.__user_service.get_current_user()
+        if current_user is None:
+            raise UnauthorizedError()
+
+        excluded_ids = {current_user.uuid}
+        excluded_ids.update(current_user.friend_uuids)
+        excluded_ids.update(
+            request.to_user_id for request
+            in self.__user_service.get_friend_requests_from(current_user)
+        )
+        excluded_ids.update(
+            request.from_user_id for request
+            in self.__user_service.get_friend_requests_to(current_user)
+        )
+        self.__excluded_ids = excluded_ids
+        return excluded_ids
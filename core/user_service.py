@@ -1,7 +1,9 @@
 """The main interface for all operations related with users."""
 
+from dataclasses import replace
 from datetime import datetime
-from typing import Optional, List
+from threading import Lock
+from typing import Optional, List, Tuple
 
 from core.authentication import Authentication, UnauthorizedError, \
     LoginFailedError, hash_password, generate_salt
@@ -9,7 +11,8 @@ from core.identifiers import generate_uuid
 from core.model import FriendRequest, Message, User, Photo
 from core.validation import is_weak_password
 from persistence.repositories import (
-    FriendRequestRepository, MessageRepository, PhotoRepository, UserRepository
+    FriendRequestRepository, MessageRepository, PhotoRepository,
+    UserRepository, MessagePage
 )
 
 
@@ -37,6 +40,7 @@ class UserService:
         self.__message_repository = message_repository
         self.__friend_request_repository = friend_request_repository
         self.__photo_repository = photo_repository
+        self.__registration_lock = Lock()
 
     def log_in_user(self, username: str, password: str) -> bool:
         """Attempt to log in, return True if successful.
@@ -54,19 +58,36 @@ class UserService:
         """Log out currently logged-in user if there is any."""
         self.__authentication.log_out()
 
+    def get_data_version(self) -> Tuple[int, ...]:
+        """Get versions of all stored data.
+
+        Versions differ if any data changed in the meantime,
+        so views can skip refreshing when they are equal
+        """
+        return (
+            self.__user_repository.version,
+            self.__message_repository.version,
+            self.__friend_request_repository.version,
+            self.__photo_repository.version
+        )
+
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by id or None if not found."""
         return self.__user_repository.get_by_id(user_id)
 
     def get_users_by_username_fragment(
-            self, username_fragment: str
+            self, username_fragment: str, limit: Optional[int] = None
     ) -> List[User]:
-        """Get all users with usernames matching given fragment.
+        """Get users with usernames matching given fragment.
+
+        Users are ordered by username
 
         :param username_fragment: exact text contained in users' usernames
+        :param limit: maximal number of returned users,
+            defaults to None - no limit
         """
         return self.__user_repository.get_by_username_fragment(
-            username_fragment
+            username_fragment, limit
         )
 
     def register_new_user(
@@ -88,22 +109,25 @@ class UserService:
             than 4 characters
         :raises IncorrectEmailError: if email is not a correct email address
         """
-        if self.__user_repository.get_by_username(username) is not None:
-            raise UsernameTakenException(username)
-        if self.__user_repository.get_by_email(email) is not None:
-            raise EmailAlreadyUsedException(email)
-        if is_weak_password(password):
-            raise WeakPasswordException()
-
-        salt = generate_salt()
-        user = User(
-            uuid=generate_uuid(),
-            username=username,
-            email=email,
-            password_hash=hash_password(password, salt),
-            salt=salt
-        )
-        self.save_user(user)
+        # Checked and saved at once, so concurrent registrations
+        # can not take the same username or email
+        with self.__registration_lock:
+            if self.__user_repository.get_by_username(username) is not None:
+                raise UsernameTakenException(username)
+            if self.__user_repository.get_by_email(email) is not None:
+                raise EmailAlreadyUsedException(email)
+            if is_weak_password(password):
+                raise WeakPasswordException()
+
+            salt = generate_salt()
+            user = User(
+                uuid=generate_uuid(),
+                username=username,
+                email=email,
+                password_hash=hash_password(password, salt),
+                salt=salt
+            )
+            self.save_user(user)
 
     def get_current_user(self) -> Optional[User]:
         """Get currently logged-in user or None if nobody is logged-in.
@@ -129,8 +153,7 @@ class UserService:
         """
         self._check_if_logged_in(user)
 
-        user.bio = bio
-        self.save_user(user)
+        self.save_user(replace(user, bio=bio))
 
     def get_profile_picture(self, user: User) -> Optional[Photo]:
         """Get user's profile picture or None if not set."""
@@ -144,20 +167,23 @@ class UserService:
 
         Requires user to be logged-in
         Previous profile picture is deleted
+        All changes are saved in a single transaction
 
         :raises UnauthorizedError: if user is not logged-in
         """
         self._check_if_logged_in(user)
 
-        previous_id = user.profile_picture_id
-        if previous_id is not None:
-            previous = self.__photo_repository.get_by_id(previous_id)
-            if previous is not None:
-                self.delete_picture(previous)
+        with self.__user_repository.transaction():
+            previous_id = user.profile_picture_id
+            if previous_id is not None:
+                previous = self.__photo_repository.get_by_id(previous_id)
+                if previous is not None:
+                    self.delete_picture(previous)
 
-        user.profile_picture_id = photo.uuid
-        self.__user_repository.save(user)
-        self.__photo_repository.save(photo)
+            self.__user_repository.save(
+                replace(user, profile_picture_id=photo.uuid)
+            )
+            self.__photo_repository.save(photo)
 
     def delete_picture(self, photo: Photo) -> None:
         """Delte photo from the database."""
@@ -168,10 +194,7 @@ class UserService:
 
         List can be in any order
         """
-        return [
-            friend for uuid in user.friend_uuids
-            if (friend := self.__user_repository.get_by_id(uuid)) is not None
-        ]
+        return self.__user_repository.get_by_ids(user.friend_uuids)
 
     def send_message(self, from_user: User, to_user: User, text: str) -> None:
         """Send text message from one user to another.
@@ -246,30 +269,41 @@ class UserService:
         """Accept a friend request, users will be friends after accepting.
 
         Accepting user must be logged-in
+        All changes are saved in a single transaction
 
         :raises UnauthorizedError: if user is not logged-in
         :raises ValueError: if friend requests refers to non-existing users
         :raises AlreadyFriendsException: if sending and receiving
             users are already friends
         """
-        from_user = self.__user_repository.get_by_id(
-            friend_request.from_user_id
-        )
-        to_user = self.__user_repository.get_by_id(friend_request.to_user_id)
-        if to_user is None or from_user is None:
-            raise ValueError("There are no users with given IDs")
-
-        self._check_if_logged_in(to_user)
-
-        if from_user.uuid in to_user.friend_uuids:
-            raise AlreadyFriendsException(from_user, to_user)
-
-        to_user.friend_uuids.append(from_user.uuid)
-        from_user.friend_uuids.append(to_user.uuid)
-
-        self.__user_repository.save(to_user)
-        self.__user_repository.save(from_user)
-        self.__friend_request_repository.delete(friend_request)
+        # Users are read in the transaction, so concurrent changes
+        # of their friends are not overwritten
+        with self.__user_repository.transaction():
+            from_user = self.__user_repository.get_by_id(
+                friend_request.from_user_id
+            )
+            to_user = self.__user_repository.get_by_id(
+                friend_request.to_user_id
+            )
+            if to_user is None or from_user is None:
+                raise ValueError("There are no users with given IDs")
+
+            self._check_if_logged_in(to_user)
+
+            if to_user.is_friends_with(from_user):
+                raise AlreadyFriendsException(from_user, to_user)
+
+            self.__user_repository.save_many([
+                replace(
+                    to_user,
+                    friend_uuids=to_user.friend_uuids | {from_user.uuid}
+                ),
+                replace(
+                    from_user,
+                    friend_uuids=from_user.friend_uuids | {to_user.uuid}
+                )
+            ])
+            self.__friend_request_repository.delete(friend_request)
 
     def delete_friend_request(self, friend_request: FriendRequest) -> None:
         """Delete friend request.
@@ -286,6 +320,39 @@ class UserService:
 
         :raises UnauthorizedError: if user is not logged-in
         """
+        self._check_if_either_logged_in(user_a, user_b)
+        return self.__message_repository.get_messages(user_a, user_b)
+
+    def get_messages_page(
+            self,
+            user_a: User,
+            user_b: User,
+            before: Optional[datetime] = None,
+            limit: int = 50
+    ) -> MessagePage:
+        """Get newest messages exchanged between two users before timestamp.
+
+        Messages are in chronological order, page's cursor passed
+        as 'before' returns the previous page
+        Requires user to be logged-in,
+        users can only view messages they sent or received
+
+        :param before: only messages sent earlier are returned,
+            None to get the newest messages
+        :param limit: maximal number of messages, defaults to 50
+        :raises UnauthorizedError: if user is not logged-in
+        :raises ValueError: if limit is not positive
+        """
+        self._check_if_either_logged_in(user_a, user_b)
+        return self.__message_repository.get_messages_page(
+            user_a, user_b, before, limit
+        )
+
+    def _check_if_either_logged_in(self, user_a: User, user_b: User) -> None:
+        """Raise exception if neither of the users is logged in.
+
+        :raises UnauthorizedError: if neither user is logged-in
+        """
         current_user = self.get_current_user()
         if current_user is None:
             raise UnauthorizedError()
@@ -294,8 +361,6 @@ class UserService:
                 and user_b.uuid != current_user.uuid:
             raise UnauthorizedError()
 
-        return self.__message_repository.get_messages(user_a, user_b)
-
     def _check_if_logged_in(self, user: User) -> None:
         """Raise exception if given user is not currently logged in.
 
@@ -2,7 +2,6 @@
 
 import re
 from string import (
-    ascii_letters,
     ascii_lowercase,
     ascii_uppercase,
     punctuation,
@@ -10,6 +9,18 @@ from string import (
 )
 
 SALT_LENGTH = 10
+HASH_LENGTH = 64
+
+_UUID_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+)
+_EMAIL_PATTERN = re.compile(
+    r"([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+"
+)
+_FILENAME_PATTERN = re.compile(r".+\..+")
+
+# Deleting all hex digits leaves an empty string only for hex text
+_DELETE_HEX_DIGITS = str.maketrans("", "", "0123456789abcdef")
 
 
 def is_uuid(uuid: str) -> bool:
@@ -17,18 +28,12 @@ def is_uuid(uuid: str) -> bool:
 
     :param uuid: string to check
     """
-    uuid_pattern = re.compile(
-        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
-    )
-    return bool(re.fullmatch(uuid_pattern, uuid))
+    return _UUID_PATTERN.fullmatch(uuid) is not None
 
 
 def is_email(text: str) -> bool:
     """Return whether given text is a valid email address."""
-    email_pattern = re.compile(
-        r"([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+"
-    )
-    return bool(re.fullmatch(email_pattern, text))
+    return _EMAIL_PATTERN.fullmatch(text) is not None
 
 
 def is_weak_password(password: str) -> bool:
@@ -56,33 +61,22 @@ def is_weak_password(password: str) -> bool:
 
 def is_filename(text: str) -> bool:
     """Return whether given text is a valid filename."""
-    filename_pattern = re.compile(r".+\..+")
-    return bool(re.fullmatch(filename_pattern, text))
+    return _FILENAME_PATTERN.fullmatch(text) is not None
 
 
 def is_hex(text: str) -> bool:
     """Return whether given text is a string of hexadecimal digits."""
-    return all(char in "01234556789abcdef" for char in text)
+    return not text.translate(_DELETE_HEX_DIGITS)
 
 
 def is_hash(text: str) -> bool:
     """Return whether given text is a valid hash."""
-    if len(text) != 64:
-        return False
-    if any(char not in "0123456789abcdef" for char in text):
-        return False
-
-    return True
+    return len(text) == HASH_LENGTH and is_hex(text)
 
 
 def is_salt(text: str) -> bool:
     """Return whether given text is a valid salt."""
-    if len(text) != SALT_LENGTH:
-        return False
-    if any(char not in ascii_letters for char in text):
-        return False
-
-    return True
+    return len(text) == SALT_LENGTH and text.isascii() and text.isalpha()
 
 
 class ModelError(ValueError):
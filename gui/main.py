@@ -4,33 +4,54 @@ Provide path to a database file as a positionala argument
 """
 
 import sys
+from typing import Optional
 
+from PySide2.QtCore import QObject, Signal
 from PySide2.QtWidgets import QApplication, QMainWindow
 
-from core.factory import get_user_service_default
+from core.factory import get_user_service, open_database, open_blob_store
 from core.user_service import UserService
+from persistence.json_database import JsonDatabase
 from gui.login_window_pages import LoginPage, RegisterPage
 from gui.main_window_tabs import ProfilePage, MessengerPage, InviteFriendsPage
 from gui.ui_components.ui_login_window import Ui_LoginWindow
 from gui.ui_components.ui_main_window import Ui_MainWindow
 
 
+class DatabaseChangeNotifier(QObject):
+    """Notifier of database changes made by other application instances.
+
+    Signal emitted from the thread watching the database is delivered
+    in the GUI thread
+    """
+
+    changed = Signal()
+
+
 class LoginWindow(QMainWindow):
     """Window for user login and registration.
 
     Opens at application start
     """
 
-    def __init__(self, user_service: UserService, parent=None):
+    def __init__(
+            self,
+            user_service: UserService,
+            change_notifier: Optional[DatabaseChangeNotifier] = None,
+            parent=None
+    ):
         """Create login window.
 
         :param user_service: service handling login and registration logic
+        :param change_notifier: notifier of database changes made by others,
+            defaults to None - changes are not watched
         :param parent: parent widget
         """
         super().__init__(parent)
         self.ui = Ui_LoginWindow()
         self.ui.setupUi(self)
         self.user_service = user_service
+        self.change_notifier = change_notifier
 
         self.login_page = LoginPage(
             user_service,
@@ -60,7 +81,7 @@ class LoginWindow(QMainWindow):
 
     def _open_main_window(self):
         """Open main window and close this one."""
-        self.main_window = MainWindow(self.user_service)
+        self.main_window = MainWindow(self.user_service, self.change_notifier)
         self.main_window.show()
         self.hide()
 
@@ -72,12 +93,19 @@ class MainWindow(QMainWindow):
     and inviting new friends or accepting invitations
     """
 
-    def __init__(self, user_service: UserService, parent=None):
+    def __init__(
+            self,
+            user_service: UserService,
+            change_notifier: Optional[DatabaseChangeNotifier] = None,
+            parent=None
+    ):
         """Create main window.
 
         User service must have a user already logged in
 
         :param user_service: service handling actions on users
+        :param change_notifier: notifier of database changes made by others,
+            defaults to None - changes are not watched
         :param parent: parent widget
         """
         super().__init__(parent)
@@ -87,6 +115,7 @@ class MainWindow(QMainWindow):
 
         self.user_service = user_service
         self.user = self.user_service.get_current_user()
+        self.change_notifier = change_notifier
 
         self._setup_main_window()
 
@@ -115,6 +144,13 @@ class MainWindow(QMainWindow):
 
         self.ui.tabs.setCurrentIndex(self.__index_by_name["Profile"])
         self.ui.tabs.currentChanged.connect(self._refresh_tab)
+        if self.change_notifier is not None:
+            self.change_notifier.changed.connect(
+                self.__messenger_tab.refresh
+            )
+            self.change_notifier.changed.connect(
+                self.__invite_friends_tab.refresh
+            )
 
     def _refresh_tab(self, tab_index: int):
         """Refresh tab with given index."""
@@ -122,8 +158,17 @@ class MainWindow(QMainWindow):
 
     def _log_out(self):
         """Log out user, open login window and close this one."""
+        if self.change_notifier is not None:
+            self.change_notifier.changed.disconnect(
+                self.__messenger_tab.refresh
+            )
+            self.change_notifier.changed.disconnect(
+                self.__invite_friends_tab.refresh
+            )
         self.user_service.log_out_user()
-        self.login_window = LoginWindow(self.user_service)
+        self.login_window = LoginWindow(
+            self.user_service, self.change_notifier
+        )
         self.login_window.show()
         self.hide()
 
@@ -131,19 +176,30 @@ class MainWindow(QMainWindow):
 def main(args):
     """Entrypoint to the application.
 
-    Expects path to a database file as first positional argument
+    Expects path to a database file as first positional argument,
+    files with the .log extension are opened as an append-only log,
+    directories are opened as a database with a file per collection,
+    photos are stored in a directory next to the database file
+    JSON files are watched, so the messenger shows changes made
+    by other instances of the application
     Opens Login window
 
     :param args: argument vector
     """
     db_filename = args[1]
-    db_file = open(db_filename, mode="r+", encoding="utf-8")
-    user_service = get_user_service_default(db_file)
+    database = open_database(db_filename)
+    user_service = get_user_service(database, open_blob_store(db_filename))
 
     app = QApplication(args)
-    window = LoginWindow(user_service)
+    change_notifier = DatabaseChangeNotifier()
+    if isinstance(database, JsonDatabase):
+        database.subscribe(change_notifier.changed.emit)
+    window = LoginWindow(user_service, change_notifier)
     window.show()
-    return app.exec_()
+    try:
+        return app.exec_()
+    finally:
+        database.close()
 
 
 if __name__ == '__main__':
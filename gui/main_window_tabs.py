@@ -1,6 +1,9 @@
 """Pages for the main window."""
 
-from PySide2.QtCore import QByteArray
+from datetime import datetime
+from typing import List, Optional, Union
+
+from PySide2.QtCore import QTimer
 from PySide2.QtGui import QPixmap
 from PySide2.QtWidgets import (
     QWidget,
@@ -9,7 +12,8 @@ from PySide2.QtWidgets import (
     QMessageBox
 )
 
-from core.model import Photo
+from core.model import Message, Photo, User
+from core.user_search import InviteCandidateSearch
 from core.user_service import UserService
 from core.validation import UnsupportedFileFormatError
 from gui.resources.resources import get_placeholder_picture
@@ -17,6 +21,10 @@ from gui.ui_components.ui_invite_friends_page import Ui_InviteFriendsPage
 from gui.ui_components.ui_messenger_page import Ui_MessengerPage
 from gui.ui_components.ui_profile_page import Ui_ProfilePage
 
+MESSAGES_PAGE_SIZE = 50
+SEARCH_RESULTS_LIMIT = 50
+SEARCH_DEBOUNCE_MS = 150
+
 
 class ProfilePage(QWidget):
     """Page showing user's profile."""
@@ -88,20 +96,21 @@ class ProfilePage(QWidget):
         user = self.user_service.get_current_user()
         bio = self.ui.bio_input.toPlainText()
         self.user_service.set_bio(user, bio)
-        self.ui.bio_display.setText(f"Bio: {user.bio}")
-        self.ui.bio_input.setText(user.bio)
+        self.ui.bio_display.setText(f"Bio: {bio}")
+        self.ui.bio_input.setText(bio)
 
     def _display_profile_picture(self):
         """Display user's profile picture or a placeholder if not set."""
         user = self.user_service.get_current_user()
         profile_picture = self.user_service.get_profile_picture(user)
+        picture_data: Union[memoryview, bytes]
         if profile_picture:
-            picture_bytes = profile_picture.get_bytes()
+            picture_data = profile_picture.get_buffer()
         else:
-            picture_bytes = get_placeholder_picture()
+            picture_data = get_placeholder_picture()
 
         pixmap = QPixmap()
-        pixmap.loadFromData(QByteArray(picture_bytes))
+        pixmap.loadFromData(picture_data)
         self.ui.profile_picture.setPixmap(pixmap)
 
 
@@ -119,15 +128,33 @@ class MessengerPage(QWidget):
         self.ui = Ui_MessengerPage()
         self.ui.setupUi(self)
         self.user_service = user_service
-        self.__friend = None
+        self.__friend: Optional[User] = None
+        self.__messages: List[Message] = []
+        self.__messages_cursor: Optional[datetime] = None
+        self.__distance_from_bottom = 0
+        self.__data_version = self.user_service.get_data_version()
 
         self._setup_friends_list()
+        self.ui.friends_list.itemClicked.connect(self._select_friend)
         self.ui.send_button.clicked.connect(self._send_message)
+        self.ui.messages_container.verticalScrollBar().valueChanged.connect(
+            self._messages_scrolled
+        )
 
     def refresh(self):
-        """Refresh page."""
+        """Refresh page if any data changed since it was displayed."""
+        data_version = self.user_service.get_data_version()
+        if data_version == self.__data_version:
+            return
+
+        self.__data_version = data_version
         self._setup_friends_list()
 
+    def showEvent(self, event):
+        """Restore scroll position of messages when the page is shown."""
+        super().showEvent(event)
+        QTimer.singleShot(0, self._restore_scroll_position)
+
     def _setup_friends_list(self):
         """Display list of user's friends."""
         self.ui.friends_list.clear()
@@ -140,7 +167,6 @@ class MessengerPage(QWidget):
             item.setText(friend.username)
             self.ui.friends_list.addItem(item)
 
-        self.ui.friends_list.itemClicked.connect(self._select_friend)
         self._display_messages()
         self._display_firend_info()
 
@@ -163,28 +189,83 @@ class MessengerPage(QWidget):
         )
         if friend_profile_picture is not None:
             pixmap = QPixmap()
-            pixmap.loadFromData(QByteArray(friend_profile_picture.get_bytes()))
+            pixmap.loadFromData(friend_profile_picture.get_buffer())
             self.ui.friend_profile_picture.setPixmap(pixmap)
 
     def _display_messages(self):
-        """Display messages exchanged with selected friend."""
+        """Display newest messages exchanged with selected friend."""
         self.ui.messages.clear()
+        self.__messages = []
+        self.__messages_cursor = None
+        self.__distance_from_bottom = 0
         if self.__friend is None:
             return
 
         user = self.user_service.get_current_user()
-        messages = self.user_service.get_messages(user, self.__friend)
+        page = self.user_service.get_messages_page(
+            user, self.__friend, limit=MESSAGES_PAGE_SIZE
+        )
+        self.__messages = page.messages
+        self.__messages_cursor = page.cursor
+        self._render_messages(user, self.__friend)
+
+    def _messages_scrolled(self, scroll_position: int):
+        """Remember position from the bottom, load more at the top."""
+        scroll_bar = self.ui.messages_container.verticalScrollBar()
+        self.__distance_from_bottom = scroll_bar.maximum() - scroll_position
+        if scroll_position == scroll_bar.minimum():
+            self._load_earlier_messages()
+
+    def _restore_scroll_position(self):
+        """Keep distance of messages from the bottom after they changed.
+
+        Newest messages are shown after the first load. Earlier messages
+        are loaded while the messages do not fill the view, as it can
+        not be scrolled to the top then
+        """
+        if not self.ui.messages_container.isVisible():
+            return
+
+        scroll_bar = self.ui.messages_container.verticalScrollBar()
+        scroll_bar.setValue(
+            scroll_bar.maximum() - self.__distance_from_bottom
+        )
+        if scroll_bar.maximum() == scroll_bar.minimum():
+            self._load_earlier_messages()
+
+    def _load_earlier_messages(self):
+        """Prepend previous page of messages if there is one."""
+        if self.__friend is None or self.__messages_cursor is None:
+            return
+
+        user = self.user_service.get_current_user()
+        if user is None:
+            return
+
+        page = self.user_service.get_messages_page(
+            user,
+            self.__friend,
+            before=self.__messages_cursor,
+            limit=MESSAGES_PAGE_SIZE
+        )
+        self.__messages = page.messages + self.__messages
+        self.__messages_cursor = page.cursor
+        self._render_messages(user, self.__friend)
+
+    def _render_messages(self, user: User, friend: User):
+        """Display loaded messages annotated with senders' usernames."""
         annotated_messages = []
-        for message in messages:
+        for message in self.__messages:
             if message.from_user_id == user.uuid:
                 username = user.username
             else:
-                username = self.__friend.username
+                username = friend.username
             message_display_text = f"{username}:\t{message.text}"
             annotated_messages.append(message_display_text)
 
         messages_text = "\n".join(annotated_messages)
         self.ui.messages.setText(messages_text)
+        QTimer.singleShot(0, self._restore_scroll_position)
 
     def _select_friend(self, item: QListWidgetItem):
         """Select friend to exchange messages with."""
@@ -226,21 +307,36 @@ class InviteFriendsPage(QWidget):
         self.__selected_user = None
         self.__awaiting_invitation = None
         self.__sent_invitation = None
+        self.__user_search = InviteCandidateSearch(
+            user_service, SEARCH_RESULTS_LIMIT
+        )
+        self.__search_timer = QTimer(self)
+        self.__search_timer.setSingleShot(True)
+        self.__search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+
+        self.__data_version = self.user_service.get_data_version()
 
         self._setup_event_handles()
         self._display_sent_invitations()
         self._display_awaiting_invitations()
 
     def refresh(self):
-        """Refresh page.
+        """Refresh page if any data changed since it was displayed."""
+        data_version = self.user_service.get_data_version()
+        if data_version == self.__data_version:
+            return
 
-        Required by MainWindow's interface
-        """
-        pass
+        self.__data_version = data_version
+        self._display_sent_invitations()
+        self._display_awaiting_invitations()
+        if self.ui.search_result.count() or self.ui.search_bar.text():
+            self._refresh_search()
 
     def _setup_event_handles(self):
         """Connect event handlers for buttons and lists."""
         self.ui.search_button.clicked.connect(self._search_users)
+        self.ui.search_bar.textChanged.connect(self._schedule_search)
+        self.__search_timer.timeout.connect(self._search_users)
         self.ui.invite_button.clicked.connect(self._invite_selected_user)
         self.ui.accept_button.clicked.connect(self._accept_awaiting_invitaiton)
         self.ui.ignore_button.clicked.connect(self._ignore_awaiting_invitation)
@@ -258,40 +354,27 @@ class InviteFriendsPage(QWidget):
         """Select user from search result."""
         self.__selected_user = item.user
 
+    def _schedule_search(self):
+        """Search users when typing stops for a moment."""
+        self.__search_timer.start()
+
     def _search_users(self):
         """Search and display users."""
+        self.__search_timer.stop()
         self.ui.search_result.clear()
+        self.__selected_user = None
 
-        current_user = self.user_service.get_current_user()
         username_fragment = self.ui.search_bar.text()
-        sent_invitations = self.user_service.get_friend_requests_from(
-            current_user
-        )
-        invited_user_ids = [invitation.to_user_id
-                            for invitation in sent_invitations]
-        awaiting_invitations = self.user_service.get_friend_requests_to(
-            current_user
-        )
-        already_invited_by_ids = [invitation.from_user_id
-                                  for invitation in awaiting_invitations]
-
-        users = self.user_service.get_users_by_username_fragment(
-            username_fragment
-        )
-        users = [user for user in users
-                 if user.uuid != current_user.uuid]
-        users = [user for user in users
-                 if not current_user.is_friends_with(user)]
-        users = [user for user in users
-                 if user.uuid not in invited_user_ids]
-        users = [user for user in users
-                 if user.uuid not in already_invited_by_ids]
-
-        for user in users:
+        for user in self.__user_search.search(username_fragment):
             item = QListWidgetItem(user.username)
             item.user = user
             self.ui.search_result.addItem(item)
 
+    def _refresh_search(self):
+        """Search users again after friends or invitations change."""
+        self.__user_search.reset()
+        self._search_users()
+
     def _invite_selected_user(self):
         """Send a friend request to the selected user from search result."""
         if self.__selected_user is None:
@@ -301,7 +384,7 @@ class InviteFriendsPage(QWidget):
         self.user_service.send_friend_request(
             current_user, self.__selected_user
         )
-        self._search_users()
+        self._refresh_search()
         self._display_sent_invitations()
 
     def _select_awaiting_invitation(self, item: QListWidgetItem):
@@ -331,7 +414,7 @@ class InviteFriendsPage(QWidget):
 
         self.user_service.accept_friend_request(self.__awaiting_invitation)
         self._display_awaiting_invitations()
-        self._search_users()
+        self._refresh_search()
 
     def _ignore_awaiting_invitation(self):
         """Delete selected received invitation."""
@@ -339,7 +422,7 @@ class InviteFriendsPage(QWidget):
             return
 
         self.user_service.delete_friend_request(self.__awaiting_invitation)
-        self._search_users()
+        self._refresh_search()
         self._display_awaiting_invitations()
 
     def _select_sent_invitation(self, list_item: QListWidgetItem):
@@ -366,3 +449,4 @@ class InviteFriendsPage(QWidget):
 
         self.user_service.delete_friend_request(self.__sent_invitation)
         self._display_sent_invitations()
+        self._refresh_search()
@@ -0,0 +1,120 @@
+"""Base class of databases with operations shared by all backends."""
+
+from typing import Callable, Dict, List
+
+from persistence.interface import VersionedCollection
+from persistence.rw_lock import ReadWriteLock
+
+
+class BaseDatabase:
+    """Base class of databases storing named collections of entities.
+
+    Keeps names of the collections, the lock guarding the database
+    and functions to call after the running transaction commits.
+    Subclasses implement reads, writes and transactions, they report
+    whether a transaction is running by _in_transaction.
+    """
+
+    def __init__(self, collection_names: List[str]):
+        """Initialize state shared by all databases.
+
+        :param collection_names: list of collection names used by the database
+        """
+        self._collection_names = collection_names
+        self._lock = ReadWriteLock()
+        self._after_commit: List[Callable[[], None]] = []
+
+    @property
+    def lock(self) -> ReadWriteLock:
+        """Return lock held by reads and writes of the database.
+
+        Repositories share it, so their locks and the database's are
+        always taken in the same order
+        """
+        return self._lock
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection, increased by every change."""
+        raise NotImplementedError
+
+    def get_collection(self, collection_name: str) -> List[Dict]:
+        """Get collection of entity dictionaries by name."""
+        raise NotImplementedError
+
+    def get_collection_if_changed(
+            self, collection_name: str, since_version: int
+    ) -> VersionedCollection:
+        """Get collection if it changed since the given version.
+
+        :param collection_name: name of the collection
+        :param since_version: version of the collection known to the caller
+        :return: current version with the collection, or with None
+            if the version is not newer than since_version
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        with self._lock.read():
+            version = self.get_version(collection_name)
+            if version <= since_version:
+                return VersionedCollection(version, None)
+            return VersionedCollection(
+                version, self.get_collection(collection_name)
+            )
+
+    def call_after_commit(self, callback: Callable[[], None]) -> None:
+        """Call the function after the running transaction is committed.
+
+        Outside a transaction the function is called at once,
+        it is never called if the transaction is discarded
+
+        :param callback: function to call
+        """
+        if self._in_transaction() and self._lock.held_for_writing:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    def _in_transaction(self) -> bool:
+        """Return whether a transaction is running."""
+        raise NotImplementedError
+
+    def _verify_collection_name(self, collection_name: str):
+        """Verify if collection with given name exists.
+
+        :param collection_name: name of a collection to verify
+        :raises CollectionDoesNotExistError: if collection with given name
+            does not exist
+        """
+        if collection_name not in self._collection_names:
+            raise CollectionDoesNotExistError(collection_name)
+
+    @staticmethod
+    def _verify_has_uuid(entity_dict: Dict) -> None:
+        """Verify if entiy dictionary has uuid key.
+
+        :param entity_dict: dictionary to verify
+        :raises NoUuidError: if dictionary does not have a uuid key
+        """
+        if "uuid" not in entity_dict:
+            raise NoUuidError()
+
+
+class JsonDatabaseException(Exception):
+    """Generic exception signaling a problem with the JsonDatabase."""
+
+    pass
+
+
+class CollectionDoesNotExistError(JsonDatabaseException):
+    """Collection does not exist in the database."""
+
+    def __init__(self, collection_name):
+        super().__init__(f"Collection: {collection_name} does not exist")
+        self.collection_name = collection_name
+
+
+class NoUuidError(JsonDatabaseException):
+    """Entity does not have a uuid."""
+
+    def __init__(self):
+        super().__init__("Entity dictionary must have a uuid key")
@@ -0,0 +1,116 @@
+"""Content-addressed store of binary blobs in a directory."""
+
+import mmap
+import os
+from hashlib import sha256
+from typing import Optional, Union
+
+
+class BlobStore:
+    """Store of binary blobs, each kept in a separate file.
+
+    Blob id is the SHA-256 digest of its content, so saving the same
+    content twice stores it only once.
+    Blob with id 'abcd...' is stored in file '<directory>/ab/abcd...'
+    """
+
+    def __init__(self, directory: str):
+        """Create a store in the given directory, creating it if missing.
+
+        :param directory: path to the directory storing blobs
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.__directory = directory
+
+    def put(self, data: Union[bytes, memoryview]) -> str:
+        """Store binary data and return its blob id.
+
+        :param data: content of the blob, any bytes-like object
+        """
+        blob_id = sha256(data).hexdigest()
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            return blob_id
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, mode="wb") as blob_file:
+            blob_file.write(data)
+            blob_file.flush()
+            os.fsync(blob_file.fileno())
+        os.replace(temp_path, path)
+        return blob_id
+
+    def get(self, blob_id: str) -> 'MappedBlob':
+        """Get blob by its id, content is read lazily.
+
+        :param blob_id: id returned by put
+        :raises BlobDoesNotExistError: if there is no blob with given id
+        """
+        if not self.contains(blob_id):
+            raise BlobDoesNotExistError(blob_id)
+        return MappedBlob(blob_id, self._path(blob_id))
+
+    def contains(self, blob_id: str) -> bool:
+        """Return whether blob with given id is stored.
+
+        :param blob_id: id of the blob
+        """
+        return os.path.exists(self._path(blob_id))
+
+    def delete(self, blob_id: str) -> None:
+        """Delete blob by its id or do nothing if it does not exist.
+
+        :param blob_id: id of the blob
+        """
+        try:
+            os.remove(self._path(blob_id))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, blob_id: str) -> str:
+        """Return path of the file storing blob with given id."""
+        return os.path.join(self.__directory, blob_id[:2], blob_id)
+
+
+class MappedBlob:
+    """Blob stored in a file, memory-mapped on first access."""
+
+    def __init__(self, blob_id: str, path: str):
+        """Create a blob backed by the given file, without reading it.
+
+        :param blob_id: id of the blob
+        :param path: path to the file with blob's content
+        """
+        self.__blob_id = blob_id
+        self.__path = path
+        self.__buffer: Optional[memoryview] = None
+
+    @property
+    def blob_id(self) -> str:
+        """Return id of the blob in its store."""
+        return self.__blob_id
+
+    def get_buffer(self) -> memoryview:
+        """Return the content without copying it."""
+        if self.__buffer is None:
+            self.__buffer = self._map()
+        return self.__buffer
+
+    def _map(self) -> memoryview:
+        """Map blob's file into memory read-only."""
+        with open(self.__path, mode="rb") as blob_file:
+            if os.fstat(blob_file.fileno()).st_size == 0:
+                return memoryview(b"")
+            mapped = mmap.mmap(
+                blob_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        return memoryview(mapped)
+
+
+class BlobDoesNotExistError(Exception):
+    """Blob with given id is not stored."""
+
+    def __init__(self, blob_id):
+        super().__init__(f"Blob: {blob_id} does not exist")
+        self.blob_id = blob_id
@@ -0,0 +1,457 @@
+"""Database in a directory with a JSON file per collection."""
+
+import json
+import os
+from contextlib import ExitStack, contextmanager
+from threading import Lock
+from typing import (
+    Optional, Dict, List, Iterable, Iterator, Any
+)
+
+from persistence.base_database import BaseDatabase
+from persistence.interface import Mutation
+from persistence.json_database import JsonDatabase, InvalidDatabaseFileError
+
+JOURNAL_FILENAME = "transaction.journal"
+
+
+class DirectoryDatabase(BaseDatabase):
+    """Database storing every collection in a separate JSON file.
+
+    Collection 'users' is stored in file '<directory>/users.json'
+    as a JsonDatabase with a single collection, so reading or writing
+    a collection touches only its own file.
+    Files are opened and verified lazily, on first access to
+    the collection. Missing files are created empty.
+
+    Options of the underlying JsonDatabases (cached mode, flush policy,
+    watching files for changes made by others) are passed to init.
+    Changes made inside a transaction are written when it ends,
+    each changed file is replaced atomically on its own. If a transaction
+    changes several collections, their new content is first written
+    to a journal file. When writing a collection file fails, or the
+    process dies in the middle, the journal is applied to all of them,
+    at once or when the database is opened again, so either all changes
+    of the transaction are persisted or none.
+    Operations of other threads wait until the transaction ends.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            collection_names: List[str],
+            cached: bool = False,
+            flush_every: int = 1,
+            flush_interval_ms: Optional[int] = None,
+            watch_interval_ms: Optional[int] = None
+    ):
+        """Open a database stored in the given directory.
+
+        Directory is created if missing
+
+        :param directory: path to the directory with collection files
+        :param collection_names: list of collection names used by the database
+        :param cached: whether to keep opened collections in memory,
+            defaults to False
+        :param flush_every: number of mutations of a collection after which
+            its changes are written, defaults to 1
+        :param flush_interval_ms: time in milliseconds after which changes
+            are written, defaults to None - no time limit
+        :param watch_interval_ms: time in milliseconds between checks
+            of opened collection files for changes made by others,
+            defaults to None - files are not watched
+        :raises ValueError: if writes are deferred or files are watched
+            without cached mode
+        """
+        if (flush_every > 1 or flush_interval_ms is not None) and not cached:
+            raise ValueError("Deferred writes require cached mode")
+        if watch_interval_ms is not None and not cached:
+            raise ValueError("Watching files requires cached mode")
+
+        os.makedirs(directory, exist_ok=True)
+        self.__directory = directory
+        super().__init__(collection_names)
+        self.__cached = cached
+        self.__flush_every = flush_every
+        self.__flush_interval_ms = flush_interval_ms
+        self.__watch_interval_ms = watch_interval_ms
+        self.__databases: Dict[str, JsonDatabase] = {}
+        self.__transaction: Optional[ExitStack] = None
+        self.__closed_versions = {
+            collection_name: 0 for collection_name in collection_names
+        }
+        self.__open_lock = Lock()
+        self.__journal_path = os.path.join(directory, JOURNAL_FILENAME)
+        if os.path.exists(self.__journal_path):
+            self._apply_journal()
+
+    def get_by_id(
+            self, entity_id: str, collection_name: str
+    ) -> Optional[Dict]:
+        """Get an entity by its id or None if not found.
+
+        :param entity_id: id of entity
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            return database.get_by_id(entity_id, collection_name)
+
+    def get_by_ids(
+            self, entity_ids: Iterable[str], collection_name: str
+    ) -> List[Dict]:
+        """Get entities with given ids, skipping ids not found.
+
+        Entities are returned in order of the ids
+
+        :param entity_ids: ids of entities
+        :param collection_name: entities' collection name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            return database.get_by_ids(entity_ids, collection_name)
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection.
+
+        Version increases with every change of the collection made through
+        this database, also across closing and reopening its file.
+        Does not open the collection's file
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        version = self.__closed_versions[collection_name]
+        database = self.__databases.get(collection_name)
+        if database is not None:
+            version += database.get_version(collection_name)
+        return version
+
+    def save(self, entity_dict: Dict, collection_name: str) -> None:
+        """Save an entity to the database, overwriting previous value.
+
+        :param entity_dict: entity dictionary to be persisted in the database
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when entity_dict does not have a uuid
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            database.save(entity_dict, collection_name)
+
+    def delete_by_id(self, entity_id: str, collection_name: str) -> None:
+        """Delete an existing entity from the database by its id.
+
+        If there is no entity with given id - do nothing
+
+        :param entity_id: id of the entity to delete
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            database.delete_by_id(entity_id, collection_name)
+
+    def get_collection(self, collection_name: str) -> List[Dict]:
+        """Get collection of entities by its name.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            return database.get_collection(collection_name)
+
+    def is_indexed(self, collection_name: str, field: str) -> bool:
+        """Return whether the database indexes the field, it never does.
+
+        Entities are found by scanning the collection in memory
+
+        :param collection_name: name of the collection
+        :param field: name of the field
+        """
+        return False
+
+    def find(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]] = None,
+            order_by: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get entities with fields equal to given values.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, defaults to None -
+            all entities match
+        :param order_by: name of the field to order by, prefixed with '-'
+            for descending order, defaults to None - any order
+        :param limit: maximal number of returned entities,
+            defaults to None - no limit
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            return database.find(collection_name, where, order_by, limit)
+
+    def find_before(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]],
+            field: str,
+            before: Optional[Any],
+            limit: int
+    ) -> List[Dict]:
+        """Get entities with a field lower than given value, highest first.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, None - all entities
+            match
+        :param field: name of the compared and ordered field
+        :param before: only entities with lower values are returned,
+            None - no bound
+        :param limit: maximal number of returned entities
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            return database.find_before(
+                collection_name, where, field, before, limit
+            )
+
+    def save_collection(self, collection: List[Dict],
+                        collection_name: str) -> None:
+        """Save collection to the database, overwriting all existing items.
+
+        :param collection: collection of entities to persist in the database
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when any entiy dict in the collection does not
+            have a uuid
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._opened(collection_name) as database:
+            database.save_collection(collection, collection_name)
+
+    def apply_batch(self, mutations: Iterable[Mutation]) -> None:
+        """Apply mutations of entities, writing every changed file once.
+
+        Mutations are applied in order
+
+        :param mutations: entities to save or delete
+        :raises CollectionDoesNotExistError: when collection of any mutation
+            does not exist
+        :raises NoUuidError: when any saved entity_dict does not have a uuid
+        """
+        mutations_by_collection: Dict[str, List[Mutation]] = {}
+        for mutation in mutations:
+            self._verify_collection_name(mutation.collection_name)
+            mutations_by_collection.setdefault(
+                mutation.collection_name, []
+            ).append(mutation)
+
+        with self.transaction():
+            for collection_name, collection_mutations \
+                    in mutations_by_collection.items():
+                database = self._get_database(collection_name)
+                database.apply_batch(collection_mutations)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Buffer changes made in the block and write them when it ends.
+
+        Collections opened inside the block join the transaction.
+        If the block raises an exception, all its changes are discarded.
+        Transaction started inside another one is a part of the outer one
+        """
+        with self._lock.write():
+            if self.__transaction is not None:
+                yield
+                return
+
+            self._after_commit = []
+            journaled: List[str] = []
+            try:
+                with ExitStack() as stack:
+                    for database in self.__databases.values():
+                        stack.enter_context(database.transaction())
+                    self.__transaction = stack
+                    try:
+                        yield
+                    finally:
+                        self.__transaction = None
+                    journaled = self._write_journal()
+                # Changes are written when the transactions end,
+                # deferred writes are flushed at once to match the journal
+                for collection_name in journaled:
+                    self.__databases[collection_name].flush()
+            except BaseException:
+                if not journaled:
+                    self._after_commit = []
+                    raise
+                self._apply_journal()
+            else:
+                if journaled:
+                    os.remove(self.__journal_path)
+            finally:
+                callbacks = self._after_commit
+                self._after_commit = []
+
+            for callback in callbacks:
+                callback()
+
+    def _in_transaction(self) -> bool:
+        """Return whether a transaction is running."""
+        return self.__transaction is not None
+
+    def check_for_changes(self) -> bool:
+        """Load opened collection files now if they were changed by others.
+
+        Does nothing if files are not watched
+
+        :return: whether any file changed
+        """
+        with self._lock.read():
+            databases = list(self.__databases.values())
+        changed = [database.check_for_changes() for database in databases]
+        return any(changed)
+
+    def flush(self) -> None:
+        """Write changes not flushed yet in any collection."""
+        with self._lock.write():
+            for database in self.__databases.values():
+                database.flush()
+
+    def close(self) -> None:
+        """Flush changes and close all collection files."""
+        with self._lock.write():
+            for collection_name, database in self.__databases.items():
+                database.close()
+                self.__closed_versions[collection_name] += \
+                    database.get_version(collection_name)
+            self.__databases.clear()
+
+    def _write_journal(self) -> List[str]:
+        """Write collections changed in the transaction to the journal.
+
+        Nothing is written if at most one collection changed,
+        its file is replaced atomically anyway
+
+        :return: names of collections written to the journal
+        """
+        changes: Dict[str, Dict] = {}
+        for database in self.__databases.values():
+            changes.update(database.transaction_changes)
+        if len(changes) <= 1:
+            return []
+
+        temp_path = self.__journal_path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(changes))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.__journal_path)
+        return list(changes)
+
+    def _apply_journal(self) -> None:
+        """Write collections from the journal to their files, remove it.
+
+        Collections are written whole, changes made by others to them
+        since the journal was written are overwritten
+
+        :raises InvalidDatabaseFileError: if the journal or a collection
+            file is corrupted
+        """
+        try:
+            with open(self.__journal_path, encoding="utf-8") as journal_file:
+                changes = json.load(journal_file)
+        except ValueError as e:
+            raise InvalidDatabaseFileError(
+                "Transaction journal must be in JSON format") from e
+
+        for collection_name, collection in changes.items():
+            database = self._get_database(collection_name)
+            database.save_collection(
+                list(collection.values()), collection_name
+            )
+            database.flush()
+        os.remove(self.__journal_path)
+
+    @contextmanager
+    def _opened(self, collection_name: str) -> Iterator[JsonDatabase]:
+        """Hold the read lock and the database of the collection in the block.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        with self._lock.read():
+            yield self._get_database(collection_name)
+
+    def _get_database(self, collection_name: str) -> JsonDatabase:
+        """Get database of the collection, opening its file on first access.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        database = self.__databases.get(collection_name)
+        if database is not None:
+            return database
+
+        with self.__open_lock:
+            database = self.__databases.get(collection_name)
+            if database is None:
+                database = self._open_database(collection_name)
+                self.__databases[collection_name] = database
+            return database
+
+    def _open_database(self, collection_name: str) -> JsonDatabase:
+        """Open database of the collection, joining a running transaction.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises InvalidDatabaseFileError: if collection's file is corrupted
+        """
+        self._verify_collection_name(collection_name)
+        path = self._collection_path(collection_name)
+        if not os.path.exists(path):
+            with open(path, mode="w", encoding="utf-8") as collection_file:
+                collection_file.write(json.dumps({collection_name: {}}))
+
+        collection_file = open(path, mode="r+", encoding="utf-8")
+        try:
+            database = JsonDatabase(
+                collection_file,
+                [collection_name],
+                self.__cached,
+                self.__flush_every,
+                self.__flush_interval_ms,
+                self.__watch_interval_ms
+            )
+        except InvalidDatabaseFileError:
+            collection_file.close()
+            raise
+
+        if self.__transaction is not None:
+            self.__transaction.enter_context(database.transaction())
+        return database
+
+    def _collection_path(self, collection_name: str) -> str:
+        """Return path of the file storing the collection."""
+        return os.path.join(self.__directory, collection_name + ".json")
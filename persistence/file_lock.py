@@ -0,0 +1,95 @@
+"""Inter-process locks of files."""
+
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None  # type: ignore
+
+LOCK_FILE_SUFFIX = ".lock"
+
+
+class FileLock:
+    """Shared or exclusive lock of a file held by processes.
+
+    Lock is taken on a separate lock file next to the locked file,
+    so it is kept when the locked file is replaced.
+    Every acquisition opens the lock file, so threads of one process
+    lock it independently.
+    Lock can also be held exclusively until released, e.g. for the whole
+    lifetime of a database opened by only one process at a time.
+    Without fcntl, i.e. on Windows, locking does nothing
+    """
+
+    def __init__(self, path: str):
+        """Create lock of the file, lock file is created when first locked.
+
+        :param path: path to the locked file
+        """
+        self.__lock_path = path + LOCK_FILE_SUFFIX
+        self.__held_descriptor: Optional[int] = None
+
+    @property
+    def lock_path(self) -> str:
+        """Return path to the lock file."""
+        return self.__lock_path
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """Hold lock shared with other readers in the block."""
+        with self._locked(fcntl.LOCK_SH if fcntl else 0):
+            yield
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold lock exclusively in the block."""
+        with self._locked(fcntl.LOCK_EX if fcntl else 0):
+            yield
+
+    def acquire_exclusive(self, blocking: bool = True) -> bool:
+        """Hold lock exclusively until release is called.
+
+        :param blocking: whether to wait until other holders release it,
+            defaults to True
+        :return: whether the lock was taken, False if it is held
+            by someone else and blocking is False
+        """
+        if fcntl is None:
+            return True
+
+        operation = fcntl.LOCK_EX if blocking \
+            else fcntl.LOCK_EX | fcntl.LOCK_NB
+        descriptor = os.open(self.__lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(descriptor, operation)
+        except BlockingIOError:
+            os.close(descriptor)
+            return False
+        except BaseException:
+            os.close(descriptor)
+            raise
+        self.__held_descriptor = descriptor
+        return True
+
+    def release(self) -> None:
+        """Release lock taken by acquire_exclusive, if it is held."""
+        if self.__held_descriptor is not None:
+            os.close(self.__held_descriptor)
+            self.__held_descriptor = None
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        """Hold lock of the file with given flock operation in the block."""
+        if fcntl is None:
+            yield
+            return
+
+        descriptor = os.open(self.__lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(descriptor, operation)
+            yield
+        finally:
+            os.close(descriptor)  # Closing releases the lock
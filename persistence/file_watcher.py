@@ -0,0 +1,113 @@
+"""Watcher of changes made to a file by other processes."""
+
+import os
+from threading import Event, Lock, Thread, current_thread
+from typing import Callable, Optional, Tuple
+
+FileSignature = Tuple[int, int, int]
+
+WATCH_INTERVAL_MS = 500
+
+
+def read_file_signature(path: str) -> Optional[FileSignature]:
+    """Return modification time, size and inode of the file.
+
+    Returns None if the file does not exist
+
+    :param path: path to the file
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileWatcher:
+    """Watcher calling a function when a file changes.
+
+    Changes are detected by polling the file's modification time, size
+    and inode - a file atomically replaced by another one has a new inode.
+    Polling is done on check() or, after start(), periodically
+    in a background thread.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            on_change: Callable[[], None],
+            interval_ms: int = WATCH_INTERVAL_MS
+    ):
+        """Create a watcher of the file, current state is not a change.
+
+        :param path: path to the watched file
+        :param on_change: function called after the file changed
+        :param interval_ms: time in milliseconds between checks
+            in the background thread, defaults to WATCH_INTERVAL_MS
+        :raises ValueError: if interval is not positive
+        """
+        if interval_ms <= 0:
+            raise ValueError("Interval must be positive")
+        self.__path = path
+        self.__on_change = on_change
+        self.__interval_ms = interval_ms
+        self.__lock = Lock()
+        self.__signature = read_file_signature(path)
+        self.__stopped = Event()
+        self.__thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Return whether the file is checked in the background thread."""
+        return self.__thread is not None
+
+    def check(self) -> bool:
+        """Check the file, call on_change if it changed since the last check.
+
+        :return: whether the file changed
+        """
+        signature = read_file_signature(self.__path)
+        with self.__lock:
+            if signature == self.__signature:
+                return False
+            self.__signature = signature
+        self.__on_change()
+        return True
+
+    def acknowledge(self) -> None:
+        """Treat current state of the file as known, not a change.
+
+        Must be called after the owner of the watcher changes the file
+        """
+        signature = read_file_signature(self.__path)
+        with self.__lock:
+            self.__signature = signature
+
+    def start(self) -> None:
+        """Start checking the file periodically in a daemon thread.
+
+        Does nothing if already started
+        """
+        if self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = Thread(target=self._watch, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Stop checking the file and wait for the background thread.
+
+        Does nothing if not started
+        """
+        thread = self.__thread
+        if thread is None:
+            return
+        self.__stopped.set()
+        self.__thread = None
+        if thread is not current_thread():
+            thread.join()
+
+    def _watch(self) -> None:
+        """Check the file until stopped."""
+        while not self.__stopped.wait(self.__interval_ms / 1000):
+            self.check()
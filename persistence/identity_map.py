@@ -0,0 +1,93 @@
+"""Identity map keeping live entity objects by their ids."""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class IdentityMap(Generic[T]):
+    """Map of entity ids to entity objects with bounded size.
+
+    When the map is full, adding an entity evicts the least recently
+    used one. Capacity 0 disables the map - nothing is kept.
+    Map can be used by many threads.
+    """
+
+    def __init__(self, capacity: int):
+        """Create an empty map.
+
+        :param capacity: maximal number of kept entities
+        :raises ValueError: if capacity is negative
+        """
+        if capacity < 0:
+            raise ValueError("Capacity must not be negative")
+        self.__capacity = capacity
+        self.__entities: OrderedDict[str, T] = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, entity_id: str) -> Optional[T]:
+        """Return entity with the id and mark it as recently used.
+
+        Returns None if entity is not kept
+
+        :param entity_id: id of the entity
+        """
+        with self.__lock:
+            entity = self.__entities.get(entity_id)
+            if entity is not None:
+                self.__entities.move_to_end(entity_id)
+            return entity
+
+    def put(self, entity_id: str, entity: T) -> None:
+        """Keep entity, evicting the least recently used one if full.
+
+        :param entity_id: id of the entity
+        :param entity: entity object
+        """
+        with self.__lock:
+            self._put(entity_id, entity)
+
+    def put_if_absent(self, entity_id: str, entity: T) -> T:
+        """Keep entity unless one with the id is kept, return the kept one.
+
+        Returns the given entity if the map is disabled
+
+        :param entity_id: id of the entity
+        :param entity: entity object
+        """
+        with self.__lock:
+            kept = self.__entities.get(entity_id)
+            if kept is not None:
+                self.__entities.move_to_end(entity_id)
+                return kept
+            self._put(entity_id, entity)
+            return entity
+
+    def discard(self, entity_id: str) -> None:
+        """Forget entity with the id or do nothing if not kept.
+
+        :param entity_id: id of the entity
+        """
+        with self.__lock:
+            self.__entities.pop(entity_id, None)
+
+    def clear(self) -> None:
+        """Forget all entities."""
+        with self.__lock:
+            self.__entities.clear()
+
+    def __len__(self) -> int:
+        """Return number of kept entities."""
+        return len(self.__entities)
+
+    def _put(self, entity_id: str, entity: T) -> None:
+        """Keep entity, the lock must be held."""
+        if self.__capacity == 0:
+            return
+
+        self.__entities[entity_id] = entity
+        self.__entities.move_to_end(entity_id)
+        if len(self.__entities) > self.__capacity:
+            self.__entities.popitem(last=False)
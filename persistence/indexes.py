@@ -0,0 +1,284 @@
+"""In-memory indexes over entity dictionaries."""
+
+import heapq
+from bisect import bisect_left
+from typing import (
+    Any, Dict, Set, FrozenSet, List, Tuple, Optional, Iterable
+)
+
+ConversationKey = FrozenSet[str]
+SortKey = Tuple[str, str]
+GRAM_LENGTH = 3
+
+
+class HashIndex:
+    """Index mapping values of a single field to ids of entities.
+
+    Multiple entities can share the same value.
+    Index is updated incrementally, adding an entity which is already
+    indexed replaces its previous value.
+    """
+
+    def __init__(self, field_name: str):
+        """Create an empty index over the given field.
+
+        :param field_name: key of the indexed value in entity dictionaries
+        """
+        self.__field_name = field_name
+        self.__ids_by_value: Dict[Any, Set[str]] = {}
+        self.__value_by_id: Dict[str, Any] = {}
+
+    def add(self, entity_dict: Dict) -> None:
+        """Index an entity dictionary, replacing its previous entry.
+
+        :param entity_dict: entity dictionary with a uuid key
+        """
+        entity_id = entity_dict["uuid"]
+        self.remove(entity_id)
+        value = entity_dict.get(self.__field_name)
+        self.__value_by_id[entity_id] = value
+        self.__ids_by_value.setdefault(value, set()).add(entity_id)
+
+    def remove(self, entity_id: str) -> None:
+        """Remove an entity from the index or do nothing if not indexed.
+
+        :param entity_id: id of the entity
+        """
+        if entity_id not in self.__value_by_id:
+            return
+
+        value = self.__value_by_id.pop(entity_id)
+        ids = self.__ids_by_value[value]
+        ids.discard(entity_id)
+        if not ids:
+            del self.__ids_by_value[value]
+
+    def get(self, value: Any) -> Set[str]:
+        """Return ids of entities having given value of the indexed field.
+
+        :param value: value of the indexed field
+        """
+        return set(self.__ids_by_value.get(value, ()))
+
+    def clear(self) -> None:
+        """Remove all entities from the index."""
+        self.__ids_by_value.clear()
+        self.__value_by_id.clear()
+
+
+class ConversationIndex:
+    """Index partitioning messages into conversations between two users.
+
+    A conversation is identified by an unordered pair of user ids.
+    Messages of every conversation are kept sorted by timestamp,
+    timestamps are ISO-format strings, which sort chronologically.
+    Messages with equal timestamps are ordered by their ids.
+    """
+
+    def __init__(
+            self,
+            first_user_field: str = "from_user_id",
+            second_user_field: str = "to_user_id",
+            timestamp_field: str = "timestamp"
+    ):
+        """Create an empty index.
+
+        :param first_user_field: key of one user's id in entity dictionaries
+        :param second_user_field: key of the other user's id
+        :param timestamp_field: key of the ISO-format timestamp
+        """
+        self.__first_user_field = first_user_field
+        self.__second_user_field = second_user_field
+        self.__timestamp_field = timestamp_field
+        self.__sort_keys: Dict[ConversationKey, List[SortKey]] = {}
+        self.__entities: Dict[ConversationKey, List[Dict]] = {}
+        self.__location_by_id: Dict[str, Tuple[ConversationKey, SortKey]] = {}
+
+    def add(self, entity_dict: Dict) -> None:
+        """Index a message dictionary, replacing its previous entry.
+
+        :param entity_dict: message dictionary with a uuid key
+        """
+        entity_id = entity_dict["uuid"]
+        self.remove(entity_id)
+
+        conversation = self._conversation_key(
+            entity_dict[self.__first_user_field],
+            entity_dict[self.__second_user_field]
+        )
+        sort_key = (entity_dict[self.__timestamp_field], entity_id)
+        sort_keys = self.__sort_keys.setdefault(conversation, [])
+        entities = self.__entities.setdefault(conversation, [])
+
+        position = bisect_left(sort_keys, sort_key)
+        sort_keys.insert(position, sort_key)
+        entities.insert(position, entity_dict)
+        self.__location_by_id[entity_id] = (conversation, sort_key)
+
+    def remove(self, entity_id: str) -> None:
+        """Remove a message from the index or do nothing if not indexed.
+
+        :param entity_id: id of the message
+        """
+        if entity_id not in self.__location_by_id:
+            return
+
+        conversation, sort_key = self.__location_by_id.pop(entity_id)
+        sort_keys = self.__sort_keys[conversation]
+        position = bisect_left(sort_keys, sort_key)
+        del sort_keys[position]
+        del self.__entities[conversation][position]
+        if not sort_keys:
+            del self.__sort_keys[conversation]
+            del self.__entities[conversation]
+
+    def get(self, user_a_id: str, user_b_id: str) -> List[Dict]:
+        """Return messages exchanged between two users, earliest first.
+
+        Order of users does not matter
+
+        :param user_a_id: id of one of the users
+        :param user_b_id: id of the other user
+        """
+        conversation = self._conversation_key(user_a_id, user_b_id)
+        return list(self.__entities.get(conversation, ()))
+
+    def get_page(
+            self,
+            user_a_id: str,
+            user_b_id: str,
+            before: Optional[str],
+            limit: int
+    ) -> Tuple[List[Dict], bool]:
+        """Return newest messages sent before given timestamp, earliest first.
+
+        Messages sharing a timestamp are never split between pages,
+        so a page can be longer than the limit
+
+        :param user_a_id: id of one of the users
+        :param user_b_id: id of the other user
+        :param before: ISO-format timestamp, only earlier messages
+            are returned, None to start from the newest message
+        :param limit: maximal number of messages on the page
+        :return: messages and whether there are any earlier messages
+        :raises ValueError: if limit is not positive
+        """
+        if limit <= 0:
+            raise ValueError("Page limit must be positive")
+
+        conversation = self._conversation_key(user_a_id, user_b_id)
+        sort_keys = self.__sort_keys.get(conversation, [])
+        entities = self.__entities.get(conversation, [])
+
+        end = len(sort_keys)
+        if before is not None:
+            end = bisect_left(sort_keys, (before, ""))
+        start = max(end - limit, 0)
+        while 0 < start < end \
+                and sort_keys[start - 1][0] == sort_keys[start][0]:
+            start -= 1
+
+        return entities[start:end], start > 0
+
+    def clear(self) -> None:
+        """Remove all messages from the index."""
+        self.__sort_keys.clear()
+        self.__entities.clear()
+        self.__location_by_id.clear()
+
+    @staticmethod
+    def _conversation_key(user_a_id: str, user_b_id: str) -> ConversationKey:
+        """Return key identifying conversation between two users."""
+        return frozenset((user_a_id, user_b_id))
+
+
+class TrigramIndex:
+    """Index of a text field answering substring queries.
+
+    Every value is split into overlapping trigrams, each trigram maps
+    to the ids of entities containing it. Entities containing a fragment
+    are found by intersecting posting lists of the fragment's trigrams
+    and verifying the candidates. Fragments shorter than a trigram
+    are matched against indexed values directly.
+    """
+
+    def __init__(self, field_name: str):
+        """Create an empty index over the given text field.
+
+        :param field_name: key of the indexed text in entity dictionaries
+        """
+        self.__field_name = field_name
+        self.__ids_by_gram: Dict[str, Set[str]] = {}
+        self.__value_by_id: Dict[str, str] = {}
+
+    def add(self, entity_dict: Dict) -> None:
+        """Index an entity dictionary, replacing its previous entry.
+
+        :param entity_dict: entity dictionary with a uuid key
+        """
+        entity_id = entity_dict["uuid"]
+        self.remove(entity_id)
+        value = entity_dict.get(self.__field_name) or ""
+        self.__value_by_id[entity_id] = value
+        for gram in self._grams(value):
+            self.__ids_by_gram.setdefault(gram, set()).add(entity_id)
+
+    def remove(self, entity_id: str) -> None:
+        """Remove an entity from the index or do nothing if not indexed.
+
+        :param entity_id: id of the entity
+        """
+        if entity_id not in self.__value_by_id:
+            return
+
+        value = self.__value_by_id.pop(entity_id)
+        for gram in self._grams(value):
+            ids = self.__ids_by_gram[gram]
+            ids.discard(entity_id)
+            if not ids:
+                del self.__ids_by_gram[gram]
+
+    def search(self, fragment: str, limit: Optional[int] = None) -> List[str]:
+        """Return ids of entities with values containing the fragment.
+
+        Ids are ordered by the indexed value
+
+        :param fragment: text contained in the indexed values
+        :param limit: maximal number of returned ids,
+            defaults to None - no limit
+        """
+        if len(fragment) < GRAM_LENGTH:
+            candidates: Iterable[str] = self.__value_by_id.keys()
+        else:
+            postings = []
+            for gram in self._grams(fragment):
+                ids = self.__ids_by_gram.get(gram)
+                if ids is None:
+                    return []
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+
+        matches = [
+            (self.__value_by_id[entity_id], entity_id)
+            for entity_id in candidates
+            if fragment in self.__value_by_id[entity_id]
+        ]
+        if limit is None:
+            matches.sort()
+        else:
+            matches = heapq.nsmallest(limit, matches)
+        return [entity_id for _, entity_id in matches]
+
+    def clear(self) -> None:
+        """Remove all entities from the index."""
+        self.__ids_by_gram.clear()
+        self.__value_by_id.clear()
+
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        """Return set of distinct trigrams of the text."""
+        return {
+            text[start:start + GRAM_LENGTH]
+            for start in range(len(text) - GRAM_LENGTH + 1)
+        }
@@ -1,15 +1,56 @@
 """Protocol classes (interfaces) used by the persistence layer."""
 
-from typing import Protocol, TypeVar, Optional, Dict, List
+from typing import (
+    Protocol, TypeVar, Optional, Dict, List, Iterable, NamedTuple,
+    ContextManager, Any, Callable
+)
 
 from core.model import Entity
+from persistence.rw_lock import ReadWriteLock
 
 T = TypeVar("T", bound=Entity, covariant=True)
 
 
+class Mutation(NamedTuple):
+    """Change of a single entity in a database collection.
+
+    Entity dictionary is saved under the entity id,
+    if it is None the entity is deleted
+    """
+
+    collection_name: str
+    entity_id: str
+    entity_dict: Optional[Dict] = None
+
+
+class VersionedCollection(NamedTuple):
+    """Collection read from a database with its version.
+
+    Collection is None if it did not change since the requested version
+    """
+
+    version: int
+    collection: Optional[List[Dict]]
+
+
 class Database(Protocol):
     """Interface for a database storing collections of entity dictionaries."""
 
+    @property
+    def lock(self) -> ReadWriteLock:
+        """Return lock of the database, shared with its repositories."""
+        ...
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection, increased by each of its changes."""
+        ...
+
+    def get_collection_if_changed(
+            self, collection_name: str, since_version: int
+    ) -> VersionedCollection:
+        """Get collection with its version if newer than since_version."""
+        ...
+
     def save(self, entity_dict: Dict, collection_name: str):
         """Create new entity or update existing."""
         ...
@@ -20,6 +61,12 @@ class Database(Protocol):
         """Get entity dictionary by id or None if it does not exist."""
         ...
 
+    def get_by_ids(
+            self, entity_ids: Iterable[str], collection_name: str
+    ) -> List[Dict]:
+        """Get entity dictionaries with given ids in order, skip missing."""
+        ...
+
     def delete_by_id(self, entity_id: str, collection_name: str):
         """Delete entity by its id or do nothing if it does not exist."""
         ...
@@ -32,6 +79,53 @@ class Database(Protocol):
         """Get collection of entity dictionaries by name."""
         ...
 
+    def is_indexed(self, collection_name: str, field: str) -> bool:
+        """Return whether find uses an index for the field."""
+        ...
+
+    def find(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]] = None,
+            order_by: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get entity dictionaries with fields equal to values in where.
+
+        Ordered by the order_by field, descending if prefixed with '-'
+        """
+        ...
+
+    def find_before(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]],
+            field: str,
+            before: Optional[Any],
+            limit: int
+    ) -> List[Dict]:
+        """Get entity dictionaries with field lower than before, highest first.
+
+        Entities must also have fields equal to values in where
+        """
+        ...
+
+    def apply_batch(self, mutations: Iterable[Mutation]) -> None:
+        """Apply mutations of entities in any collections, in order."""
+        ...
+
+    def transaction(self) -> ContextManager[None]:
+        """Group changes made in the block, persist all of them or none."""
+        ...
+
+    def call_after_commit(self, callback: Callable[[], None]) -> None:
+        """Call function after the running transaction commits, or now."""
+        ...
+
+    def close(self) -> None:
+        """Persist all changes and release resources held by the database."""
+        ...
+
 
 class JsonSerializer(Protocol[T]):
     """Generic interface for JSON serializer of model classes."""
@@ -42,6 +136,10 @@ class JsonSerializer(Protocol[T]):
         ...
 
     @staticmethod
-    def from_json(json_dict: Dict) -> T:
-        """Deserialize entity from its JSON-like dictionary representation."""
+    def from_json(json_dict: Dict, trusted: bool = False) -> T:
+        """Deserialize entity from its JSON-like dictionary representation.
+
+        Trusted representations were validated before and are not
+        validated again
+        """
         ...
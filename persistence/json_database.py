@@ -1,12 +1,26 @@
 """Database in a JSON file."""
 
+import atexit
+import heapq
 import json
-from typing import TextIO, Optional, Dict, List
+import os
+from contextlib import contextmanager
+from threading import Lock, Timer, get_ident
+from typing import (
+    TextIO, Optional, Dict, List, Iterable, Iterator, Set, Any, Callable
+)
+
+from persistence.base_database import BaseDatabase, JsonDatabaseException
+from persistence.file_lock import FileLock
+from persistence.file_watcher import (
+    FileSignature, FileWatcher, read_file_signature
+)
+from persistence.interface import Mutation
 
 SerializedCollection = Dict[str, Dict]
 
 
-class JsonDatabase:
+class JsonDatabase(BaseDatabase):
     """Database in a JSON file storing collections of entity dictionaries.
 
     List of collections used by the database is passed to init.
@@ -16,19 +30,208 @@ class JsonDatabase:
 
     A collection is a list of entity dictionaries.
     An entity dictionary must have uuid key
+
+    In cached mode the file is parsed once, reads are served from memory
+    and by default writes go through to the file. Changes made to the file
+    by anyone else are only visible after calling reload()
+    or, if the file is watched, after the change is noticed.
+    Entity dictionaries returned in cached mode are shared with the cache
+    and must not be mutated.
+
+    In cached mode writes can be deferred: changes are collected in memory
+    and flushed to the file after a number of mutations, after a time
+    interval, on flush() or close() and when the interpreter exits.
+    Only collections changed since the last flush are tracked as dirty.
+
+    Changes made inside a transaction are kept in memory and written
+    to the file at once when the transaction ends.
+
+    In cached mode the file can be watched for changes made by others.
+    A changed file is parsed again, unflushed changes of entities are
+    applied on top of it and subscribers are notified. The file is also
+    checked before every flush, so changes of other entities are not
+    overwritten.
+
+    If the handle refers to a file on disk, every save writes a temporary
+    file next to it and atomically renames it over the database file,
+    so an interrupted save never leaves a partially written database.
+    The file is then accessed by its path, the handle is only closed
+    by close().
+
+    A file on disk can be shared by processes. It is read under a shared
+    lock and replaced under an exclusive lock, held only to check
+    that nobody changed the file since it was read and to rename
+    the temporary file. If somebody did, the file is read again,
+    changes of entities made by this database are applied to it
+    and it is written again, so changes of other entities made by others
+    are not overwritten.
+
+    Database can be used by many threads. Reads hold a shared read lock
+    and proceed in parallel, writes and transactions hold the write lock.
+    Reads of a file on disk use their own handles.
     """
 
-    def __init__(self, db_file: TextIO, collection_names: List[str]):
+    def __init__(
+            self,
+            db_file: TextIO,
+            collection_names: List[str],
+            cached: bool = False,
+            flush_every: int = 1,
+            flush_interval_ms: Optional[int] = None,
+            watch_interval_ms: Optional[int] = None
+    ):
         """Create a new database instance persisting data in the given file.
 
         :param db_file: file to persist data in and to load data from
         :param collection_names: list of collection names used by the database
+        :param cached: whether to keep all collections in memory,
+            defaults to False
+        :param flush_every: number of mutations after which changes
+            are written to the file, defaults to 1 - every mutation
+            is written immediately
+        :param flush_interval_ms: time in milliseconds after the first
+            unflushed mutation when changes are written to the file,
+            defaults to None - no time limit
+        :param watch_interval_ms: time in milliseconds between checks
+            if the file was changed by others, defaults to None -
+            the file is not watched
         :raises InvalidDatabaseFileError: if file is not JSON or if file
         does not have all the required collections
+        :raises ValueError: if writes are deferred or the file is watched
+            without cached mode, if a watched file is not on disk
         """
+        deferred = flush_every > 1 or flush_interval_ms is not None
+        if deferred and not cached:
+            raise ValueError("Deferred writes require cached mode")
+        if watch_interval_ms is not None and not cached:
+            raise ValueError("Watching the file requires cached mode")
+
         JsonDatabase._verify_file(db_file, collection_names)
         self.__db_file = db_file
-        self.__collection_names = collection_names
+        super().__init__(collection_names)
+        self.__cache: Optional[Dict[str, SerializedCollection]] = None
+        self.__transaction: Optional[Dict[str, SerializedCollection]] = None
+        self.__transaction_dirty: Set[str] = set()
+        self.__flush_every = flush_every
+        self.__flush_interval_ms = flush_interval_ms
+        self.__dirty: Set[str] = set()
+        self.__pending_mutations = 0
+        self.__flush_timer: Optional[Timer] = None
+        self.__versions = {
+            collection_name: 0 for collection_name in collection_names
+        }
+        self.__handle_lock = Lock()
+        self.__subscribers: List[Callable[[], None]] = []
+        self.__path = self._get_db_file_path()
+        self.__encoding = getattr(db_file, "encoding", None)
+        self.__file_lock: Optional[FileLock] = None
+        if self.__path is not None:
+            self.__file_lock = FileLock(self.__path)
+        self.__file_signature: Optional[FileSignature] = None
+        self.__version_lock = Lock()
+        self.__versioned_signature: Optional[FileSignature] = None
+        if self.__path is not None and not cached:
+            self.__versioned_signature = read_file_signature(self.__path)
+        self.__flushed: Dict[str, SerializedCollection] = {}
+        self.__watcher: Optional[FileWatcher] = None
+        if watch_interval_ms is not None:
+            if self.__path is None:
+                raise ValueError("Watched file must be on disk")
+            self.__watcher = FileWatcher(
+                self.__path, self._on_file_changed, watch_interval_ms
+            )
+        if cached:
+            with self._lock.write():
+                self.__cache = self._read_all_collections()
+        if deferred:
+            atexit.register(self.flush)
+        if self.__watcher is not None:
+            self.__watcher.start()
+
+    @property
+    def cached(self) -> bool:
+        """Return whether collections are kept in memory."""
+        return self.__cache is not None
+
+    @property
+    def dirty_collections(self) -> Set[str]:
+        """Return names of collections changed since the last flush."""
+        with self._lock.read():
+            return set(self.__dirty)
+
+    @property
+    def transaction_changes(self) -> Dict[str, SerializedCollection]:
+        """Return collections changed in the running transaction.
+
+        Empty outside a transaction. Must be called by the thread
+        running the transaction
+        """
+        if self.__transaction is None:
+            return {}
+        return {
+            collection_name: dict(self.__transaction[collection_name])
+            for collection_name in self.__transaction_dirty
+        }
+
+    @property
+    def watched(self) -> bool:
+        """Return whether the file is watched for changes made by others."""
+        return self.__watcher is not None
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Register function called after changes made by others are loaded.
+
+        Callback is called in the thread which noticed the change,
+        usually the thread watching the file
+
+        :param callback: function to call
+        """
+        self.__subscribers.append(callback)
+
+    def check_for_changes(self) -> bool:
+        """Load the file now if it was changed by others.
+
+        Does nothing if the file is not watched
+
+        :return: whether the file changed
+        """
+        if self.__watcher is None:
+            return False
+        return self.__watcher.check()
+
+    def reload(self) -> None:
+        """Discard cached collections and parse the database file again.
+
+        Unflushed changes are discarded
+        Does nothing if the database is not in cached mode
+        """
+        with self._lock.write():
+            if self.cached:
+                self._clear_dirty()
+                if self.__watcher is not None:
+                    self.__watcher.acknowledge()
+                self.__cache = self._read_all_collections()
+                self._increase_versions(self._collection_names)
+
+    def flush(self) -> None:
+        """Write changes not flushed yet to the file.
+
+        Does nothing if no collection is dirty
+        """
+        with self._lock.write():
+            if not self.__dirty or self.__cache is None:
+                return
+            self.__cache = self._write_all_collections(self.__cache)
+            self._clear_dirty()
+
+    def close(self) -> None:
+        """Stop watching the file, flush changes and close the file."""
+        if self.__watcher is not None:
+            self.__watcher.stop()
+        with self._lock.write():
+            self.flush()
+            atexit.unregister(self.flush)
+            self.__db_file.close()
 
     def get_by_id(
             self, entity_id: str, collection_name: str
@@ -41,8 +244,46 @@ class JsonDatabase:
             does not exist
         """
         self._verify_collection_name(collection_name)
-        collection = self._get_serialized_collection(collection_name)
-        return collection[entity_id] if entity_id in collection else None
+        with self._lock.read():
+            collection = self._get_serialized_collection(collection_name)
+            return collection.get(entity_id)
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection.
+
+        Version increases with every change of the collection made through
+        this database, reload and discarded transaction changing it.
+        Without cached mode versions of all collections also increase
+        when the file on disk was changed by others
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        if self.__versioned_signature is not None:
+            self._check_file_version()
+        return self.__versions[collection_name]
+
+    def get_by_ids(
+            self, entity_ids: Iterable[str], collection_name: str
+    ) -> List[Dict]:
+        """Get entities with given ids, skipping ids not found.
+
+        Entities are returned in order of the ids
+
+        :param entity_ids: ids of entities
+        :param collection_name: entities' collection name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            collection = self._get_serialized_collection(collection_name)
+            return [
+                collection[entity_id] for entity_id in entity_ids
+                if entity_id in collection
+            ]
 
     def save(self, entity_dict: Dict, collection_name: str) -> None:
         """Save an entity to the database, overwriting previous value.
@@ -56,9 +297,11 @@ class JsonDatabase:
         self._verify_collection_name(collection_name)
         self._verify_has_uuid(entity_dict)
 
-        collection = self._get_serialized_collection(collection_name)
-        collection[entity_dict["uuid"]] = entity_dict
-        self._save_serialized_collection(collection, collection_name)
+        with self._lock.write():
+            all_collections = self._load_all_collections()
+            all_collections[collection_name][entity_dict["uuid"]] = \
+                dict(entity_dict)
+            self._save_all_collections(all_collections, {collection_name})
 
     def delete_by_id(self, entity_id: str, collection_name: str) -> None:
         """Delete an existing entity from the database by its id.
@@ -71,12 +314,13 @@ class JsonDatabase:
             does not exist
         """
         self._verify_collection_name(collection_name)
-        collection = self._get_serialized_collection(collection_name)
-        try:
-            collection.pop(entity_id)
-            self._save_serialized_collection(collection, collection_name)
-        except KeyError:
-            pass
+        with self._lock.write():
+            all_collections = self._load_all_collections()
+            collection = all_collections[collection_name]
+            if entity_id not in collection:
+                return
+            del collection[entity_id]
+            self._save_all_collections(all_collections, {collection_name})
 
     def get_collection(self, collection_name: str) -> List[Dict]:
         """Get collection of entities by its name.
@@ -86,8 +330,72 @@ class JsonDatabase:
             does not exist
         """
         self._verify_collection_name(collection_name)
-        collection = self._get_serialized_collection(collection_name)
-        return list(collection.values())
+        with self._lock.read():
+            collection = self._get_serialized_collection(collection_name)
+            return list(collection.values())
+
+    def is_indexed(self, collection_name: str, field: str) -> bool:
+        """Return whether the database indexes the field, it never does.
+
+        Entities are found by scanning the collection in memory
+
+        :param collection_name: name of the collection
+        :param field: name of the field
+        """
+        return False
+
+    def find(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]] = None,
+            order_by: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get entities with fields equal to given values.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, defaults to None -
+            all entities match
+        :param order_by: name of the field to order by, prefixed with '-'
+            for descending order, defaults to None - any order
+        :param limit: maximal number of returned entities,
+            defaults to None - no limit
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            collection = self._get_serialized_collection(collection_name)
+            return select_entities(
+                collection.values(), where, order_by, limit
+            )
+
+    def find_before(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]],
+            field: str,
+            before: Optional[Any],
+            limit: int
+    ) -> List[Dict]:
+        """Get entities with a field lower than given value, highest first.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, None - all entities
+            match
+        :param field: name of the compared and ordered field
+        :param before: only entities with lower values are returned,
+            None - no bound
+        :param limit: maximal number of returned entities
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            collection = self._get_serialized_collection(collection_name)
+            return select_entities_before(
+                collection.values(), where, field, before, limit
+            )
 
     def save_collection(self, collection: List[Dict],
                         collection_name: str) -> None:
@@ -105,12 +413,87 @@ class JsonDatabase:
             self._verify_has_uuid(entity_dict)
 
         serialized_collection = {
-            entity_dict["uuid"]: entity_dict
+            entity_dict["uuid"]: dict(entity_dict)
             for entity_dict in collection
         }
-        self._save_serialized_collection(
-            serialized_collection, collection_name
-        )
+        with self._lock.write():
+            self._save_serialized_collection(
+                serialized_collection, collection_name
+            )
+
+    def apply_batch(self, mutations: Iterable[Mutation]) -> None:
+        """Apply mutations of entities with a single load and write.
+
+        Mutations are applied in order, either all of them or none
+
+        :param mutations: entities to save or delete
+        :raises CollectionDoesNotExistError: when collection of any mutation
+            does not exist
+        :raises NoUuidError: when any saved entity_dict does not have a uuid
+        """
+        mutations = list(mutations)
+        for mutation in mutations:
+            self._verify_collection_name(mutation.collection_name)
+            if mutation.entity_dict is not None:
+                self._verify_has_uuid(mutation.entity_dict)
+        if not mutations:
+            return
+
+        with self._lock.write():
+            all_collections = self._load_all_collections()
+            for mutation in mutations:
+                collection = all_collections[mutation.collection_name]
+                if mutation.entity_dict is None:
+                    collection.pop(mutation.entity_id, None)
+                else:
+                    collection[mutation.entity_id] = \
+                        dict(mutation.entity_dict)
+            self._save_all_collections(
+                all_collections,
+                {mutation.collection_name for mutation in mutations}
+            )
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Buffer changes made in the block and write them to the file once.
+
+        Changes are visible to reads inside the block.
+        If the block raises an exception, all its changes are discarded.
+        Transaction started inside another one is a part of the outer one
+        """
+        with self._lock.write():
+            if self.__transaction is not None:
+                yield
+                return
+
+            self.__transaction = {
+                collection_name: dict(collection)
+                for collection_name, collection
+                in self._load_all_collections().items()
+            }
+            self.__transaction_dirty = set()
+            self._after_commit = []
+            try:
+                yield
+            except BaseException:
+                self.__transaction = None
+                self._after_commit = []
+                self._increase_versions(self.__transaction_dirty)
+                raise
+
+            collections = self.__transaction
+            self.__transaction = None
+            if self.__transaction_dirty:
+                self._save_all_collections(
+                    collections, self.__transaction_dirty, committed=True
+                )
+            callbacks, self._after_commit = self._after_commit, []
+            for callback in callbacks:
+                callback()
+
+    def _in_transaction(self) -> bool:
+        """Return whether a transaction is running."""
+        return self.__transaction is not None
 
     def _get_serialized_collection(
             self,
@@ -135,49 +518,287 @@ class JsonDatabase:
         """
         all_collections = self._load_all_collections()
         all_collections[collection_name] = serialized_collection
-        self._save_all_collections(all_collections)
+        self._save_all_collections(all_collections, {collection_name})
 
     def _load_all_collections(self) -> Dict[str, SerializedCollection]:
-        """Load all collection from the database file.
+        """Load all collections, from memory in cached mode or from the file.
 
         :return: dictionary mapping collection names to serialized collections
         """
-        self.__db_file.seek(0)  # Go to the first byte before reading
-        data = json.load(self.__db_file)
+        if self.__transaction is not None:
+            return self.__transaction
+        if self.__cache is not None:
+            return self.__cache
+        return self._read_all_collections()
+
+    def _read_all_collections(self) -> Dict[str, SerializedCollection]:
+        """Read and parse all collections from the database file.
+
+        File on disk is read with a new handle under a shared file lock.
+        State of the file read by a writer is remembered to find changes
+        made since then
+
+        :return: dictionary mapping collection names to serialized collections
+        :raises InvalidDatabaseFileError: if file on disk does not have
+            all the required collections
+        """
+        if self.__path is None or self.__file_lock is None:
+            with self.__handle_lock:
+                self.__db_file.seek(0)  # Go to the first byte before reading
+                return json.load(self.__db_file)
+
+        with self.__file_lock.shared():
+            signature = read_file_signature(self.__path)
+            with open(self.__path, encoding=self.__encoding) as db_file:
+                data = json.load(db_file)
+        JsonDatabase._verify_collections(data, self._collection_names)
+        if self._lock.held_for_writing:
+            self.__file_signature = signature
+            self._remember_flushed(data)
         return data
 
     def _save_all_collections(
             self,
-            collections: Dict[str, SerializedCollection]
+            collections: Dict[str, SerializedCollection],
+            changed_collection_names: Iterable[str],
+            committed: bool = False
     ) -> None:
         """Save all serialized collection to the database file.
 
+        Inside a transaction collections are only kept in memory.
+        If writes are deferred, changed collections are marked as dirty
+        and written when the flush policy requires it
+
         :param collections: dictionary mapping collection names to
         serialized collections
+        :param changed_collection_names: names of collections
+            changed by the mutation
+        :param committed: whether changes come from a committed transaction,
+            so versions were already increased, defaults to False
+        """
+        if not committed:
+            self._increase_versions(changed_collection_names)
+        if self.__transaction is not None:
+            self.__transaction = collections
+            self.__transaction_dirty.update(changed_collection_names)
+            return
+
+        if self.__cache is None:
+            self._write_all_collections(collections)
+            return
+
+        self.__cache = collections
+        self.__dirty.update(changed_collection_names)
+        self.__pending_mutations += 1
+        if self.__pending_mutations >= self.__flush_every:
+            self.flush()
+        elif self.__flush_timer is None \
+                and self.__flush_interval_ms is not None:
+            self.__flush_timer = Timer(
+                self.__flush_interval_ms / 1000, self.flush
+            )
+            self.__flush_timer.daemon = True
+            self.__flush_timer.start()
+
+    def _increase_versions(self, collection_names: Iterable[str]) -> None:
+        """Increase versions of the collections after they changed."""
+        with self.__version_lock:
+            for collection_name in collection_names:
+                self.__versions[collection_name] += 1
+
+    def _check_file_version(self) -> None:
+        """Increase versions of all collections if others changed the file.
+
+        Changes are noticed by the file's signature, which differs from
+        the one known to versions only after writes of others
         """
-        self.__db_file.seek(0)  # Go to the first byte before reading
-        self.__db_file.truncate(0)  # Delete file content
-        json.dump(collections, self.__db_file)
+        signature = read_file_signature(self.__path) if self.__path else None
+        with self.__version_lock:
+            if signature == self.__versioned_signature:
+                return
+            self.__versioned_signature = signature
+            for collection_name in self._collection_names:
+                self.__versions[collection_name] += 1
+
+    def _acknowledge_own_write(
+            self,
+            previous: Optional[FileSignature],
+            current: Optional[FileSignature]
+    ) -> None:
+        """Treat the file written by this database as known to versions.
 
-    def _verify_collection_name(self, collection_name: str):
-        """Verify if collection with given name exists.
+        Only if versions knew the file it replaced, otherwise changes
+        of others read before the write are still noticed
 
-        :param collection_name: name of a collection to verify
-        :raises CollectionDoesNotExistError: if collection with given name
-            does not exist
+        :param previous: signature of the replaced file
+        :param current: signature of the written file
         """
-        if collection_name not in self.__collection_names:
-            raise CollectionDoesNotExistError(collection_name)
+        with self.__version_lock:
+            if self.__versioned_signature is not None \
+                    and self.__versioned_signature == previous:
+                self.__versioned_signature = current
+
+    def _clear_dirty(self) -> None:
+        """Mark all collections as flushed and cancel the scheduled flush."""
+        self.__dirty.clear()
+        self.__pending_mutations = 0
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+
+    def _write_all_collections(
+            self,
+            collections: Dict[str, SerializedCollection]
+    ) -> Dict[str, SerializedCollection]:
+        """Write all serialized collections to the database file.
 
-    @staticmethod
-    def _verify_has_uuid(entity_dict: Dict) -> None:
-        """Verify if entiy dictionary has uuid key.
+        File on disk is replaced only if nobody changed it since it was
+        last read or written. Otherwise changes of the collections are
+        applied to the current content of the file and written again.
+        Collections are serialized outside the file lock
+
+        :param collections: dictionary mapping collection names to
+        serialized collections
+        :return: written collections, with changes made by others
+        """
+        path, file_lock = self.__path, self.__file_lock
+        if path is None or file_lock is None:
+            with self.__handle_lock:
+                self.__db_file.seek(0)  # Go to the first byte before writing
+                self.__db_file.truncate(0)  # Delete file content
+                self.__db_file.write(json.dumps(collections))
+                self.__db_file.flush()
+            return collections
+
+        while True:
+            temp_path = self._write_temp_file(path, json.dumps(collections))
+            if self._replace_db_file(path, temp_path, file_lock):
+                break
+            collections = self._merge_changes_of_others(collections)
+
+        if self.__watcher is not None:
+            self.__watcher.acknowledge()
+        self._remember_flushed(collections)
+        return collections
+
+    def _on_file_changed(self) -> None:
+        """Load the file changed by others and notify subscribers.
+
+        Changes not flushed yet are applied to the loaded collections.
+        File which is not a valid database yet, e.g. written
+        without replacing it, is loaded when it changes again
+        """
+        with self._lock.write():
+            if self.__cache is None:
+                return
+            flushed = self.__flushed
+            try:
+                collections = self._read_all_collections()
+            except (OSError, ValueError, InvalidDatabaseFileError):
+                return
+            self.__cache = apply_changes(self.__cache, flushed, collections)
+            self._increase_versions(self._collection_names)
+
+        self._notify_subscribers()
+
+    def _merge_changes_of_others(
+            self,
+            collections: Dict[str, SerializedCollection]
+    ) -> Dict[str, SerializedCollection]:
+        """Apply changes of collections to the file changed by others.
+
+        Changes are found by comparing collections with the content
+        of the file they are based on. Versions of all collections increase
+        and subscribers are notified
+
+        :param collections: dictionary mapping collection names to
+            serialized collections
+        :return: collections read from the file with the changes applied
+        """
+        flushed = self.__flushed
+        merged = apply_changes(
+            collections, flushed, self._read_all_collections()
+        )
+        self._increase_versions(self._collection_names)
+        with self.__version_lock:
+            if self.__versioned_signature is not None:
+                self.__versioned_signature = self.__file_signature
+        self._notify_subscribers()
+        return merged
+
+    def _notify_subscribers(self) -> None:
+        """Call functions registered by subscribe()."""
+        for callback in list(self.__subscribers):
+            callback()
+
+    def _remember_flushed(
+            self,
+            collections: Dict[str, SerializedCollection]
+    ) -> None:
+        """Keep content of the file on disk to find changes made later.
 
-        :param entity_dict: dictionary to verify
-        :raises NoUuidError: if dictionary does not have a uuid key
+        Collections are copied because cached collections
+        are changed in place
         """
-        if "uuid" not in entity_dict:
-            raise NoUuidError()
+        if self.__path is None:
+            return
+        self.__flushed = {
+            collection_name: dict(collection)
+            for collection_name, collection in collections.items()
+        }
+
+    def _write_temp_file(self, path: str, content: str) -> str:
+        """Write content to a new temporary file next to the database file.
+
+        Content is written with a single write and synced to disk.
+        Name of the file is unique for the process and thread
+
+        :param path: path to the database file
+        :param content: serialized collections
+        :return: path to the temporary file
+        """
+        temp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(temp_path, mode="w", encoding=self.__encoding) as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        return temp_path
+
+    def _replace_db_file(
+            self, path: str, temp_path: str, file_lock: FileLock
+    ) -> bool:
+        """Atomically rename the temporary file over the database file.
+
+        The file is replaced under the exclusive lock, only if nobody
+        changed it since it was last read or written.
+        Otherwise, or if renaming fails, the temporary file is removed
+
+        :param path: path to the database file
+        :param temp_path: path to the temporary file
+        :param file_lock: inter-process lock of the database file
+        :return: whether the database file was replaced
+        """
+        try:
+            with file_lock.exclusive():
+                if read_file_signature(path) != self.__file_signature:
+                    os.remove(temp_path)
+                    return False
+                os.replace(temp_path, path)
+                previous = self.__file_signature
+                self.__file_signature = read_file_signature(path)
+                self._acknowledge_own_write(previous, self.__file_signature)
+                return True
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _get_db_file_path(self) -> Optional[str]:
+        """Return path of the database file or None if it is not on disk."""
+        path = getattr(self.__db_file, "name", None)
+        if isinstance(path, str) and os.path.isfile(path):
+            return path
+        return None
 
     @staticmethod
     def _verify_file(db_file: TextIO, collection_names: List[str]) -> None:
@@ -200,39 +821,137 @@ class JsonDatabase:
                 "File must be readable and writable")
 
         try:
+            db_file.seek(0)
             file_data = json.load(db_file)
-            file_keys = set(file_data.keys())
-            collection_names_set = set(collection_names)
-            if not collection_names_set.issubset(file_keys):
-                raise InvalidDatabaseFileError(
-                    "JSON must contain all specified collections")
+            JsonDatabase._verify_collections(file_data, collection_names)
         except Exception as e:
             raise InvalidDatabaseFileError(
                 "File must be in JSON format") from e
 
+    @staticmethod
+    def _verify_collections(file_data: Any, collection_names: List[str]):
+        """Verify if parsed file contains all collections from the list.
 
-class JsonDatabaseException(Exception):
-    """Generic exception signaling a problem with the JsonDatabase."""
-
-    pass
-
+        :param file_data: parsed content of the database file
+        :param collection_names: list of names of the collections
+        :raises InvalidDatabaseFileError: if any of the collection names
+            is not represented in the file
+        """
+        if not isinstance(file_data, dict) \
+                or not set(collection_names).issubset(file_data.keys()):
+            raise InvalidDatabaseFileError(
+                "JSON must contain all specified collections")
 
-class InvalidDatabaseFileError(JsonDatabaseException):
-    """JSON file is not a valid representation of a database."""
 
-    pass
+def apply_changes(
+        changed: Dict[str, SerializedCollection],
+        base: Dict[str, SerializedCollection],
+        target: Dict[str, SerializedCollection]
+) -> Dict[str, SerializedCollection]:
+    """Apply changes of entities made since base to target collections.
 
+    Entities are changed if they are not the same objects in the changed
+    and base collections. Target is not modified
 
-class CollectionDoesNotExistError(JsonDatabaseException):
-    """Collection does not exist in the database."""
+    :param changed: dictionary mapping collection names to changed
+        serialized collections
+    :param base: dictionary mapping collection names to serialized
+        collections the changes were made to
+    :param target: dictionary mapping collection names to serialized
+        collections to apply the changes to
+    :return: target collections with the changes applied
+    """
+    merged = dict(target)
+    for collection_name, collection in changed.items():
+        base_collection = base.get(collection_name, {})
+        changed_ids = [
+            entity_id for entity_id
+            in collection.keys() | base_collection.keys()
+            if collection.get(entity_id) is not base_collection.get(entity_id)
+        ]
+        if not changed_ids:
+            continue
+
+        merged_collection = dict(target.get(collection_name, {}))
+        for entity_id in changed_ids:
+            entity_dict = collection.get(entity_id)
+            if entity_dict is None:
+                merged_collection.pop(entity_id, None)
+            else:
+                merged_collection[entity_id] = entity_dict
+        merged[collection_name] = merged_collection
+    return merged
+
+
+def select_entities(
+        entities: Iterable[Dict],
+        where: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None
+) -> List[Dict]:
+    """Filter, order and limit entity dictionaries in memory.
+
+    Implements Database.find for databases without indexes,
+    ordered field must be present in all matching entities
+
+    :param entities: entity dictionaries to select from
+    :param where: field values entities must have, defaults to None -
+        all entities match
+    :param order_by: name of the field to order by, prefixed with '-'
+        for descending order, defaults to None - any order
+    :param limit: maximal number of returned entities,
+        defaults to None - no limit
+    """
+    if where:
+        conditions = list(where.items())
+        entities = (
+            entity for entity in entities
+            if all(entity.get(field) == value for field, value in conditions)
+        )
 
-    def __init__(self, collection_name):
-        super().__init__(f"Collection: {collection_name} does not exist")
-        self.collection_name = collection_name
+    if order_by is None:
+        selected = list(entities)
+        return selected[:limit] if limit is not None else selected
+
+    field = order_by.lstrip("-")
+    descending = order_by.startswith("-")
+
+    def sort_key(entity: Dict) -> Any:
+        return entity[field]
+
+    if limit is None:
+        return sorted(entities, key=sort_key, reverse=descending)
+    if descending:
+        return heapq.nlargest(limit, entities, key=sort_key)
+    return heapq.nsmallest(limit, entities, key=sort_key)
+
+
+def select_entities_before(
+        entities: Iterable[Dict],
+        where: Optional[Dict[str, Any]],
+        field: str,
+        before: Optional[Any],
+        limit: int
+) -> List[Dict]:
+    """Select entities with a field lower than given value in memory.
+
+    Implements Database.find_before for databases without indexes,
+    the field must be present in all matching entities
+
+    :param entities: entity dictionaries to select from
+    :param where: field values entities must have, None - all entities match
+    :param field: name of the compared and ordered field
+    :param before: only entities with lower values are selected,
+        None - no bound
+    :param limit: maximal number of selected entities
+    """
+    selected: Iterable[Dict] = select_entities(entities, where)
+    if before is not None:
+        selected = (entity for entity in selected if entity[field] < before)
+    return select_entities(selected, order_by="-" + field, limit=limit)
 
 
-class NoUuidError(JsonDatabaseException):
-    """Entity does not have a uuid."""
+class InvalidDatabaseFileError(JsonDatabaseException):
+    """JSON file is not a valid representation of a database."""
 
-    def __init__(self):
-        super().__init__("Entity dictionary must have a uuid key")
+    pass
@@ -0,0 +1,592 @@
+"""Database in an append-only log of mutations."""
+
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from threading import Thread
+from typing import (
+    Optional, Dict, List, Iterable, Iterator, Any
+)
+
+from persistence.base_database import BaseDatabase
+from persistence.file_lock import FileLock
+from persistence.interface import Mutation
+from persistence.json_database import (
+    SerializedCollection,
+    select_entities,
+    select_entities_before,
+    InvalidDatabaseFileError
+)
+
+
+class LogDatabase(BaseDatabase):
+    """Database storing collections of entity dictionaries in a log file.
+
+    Every mutation appends a single JSON line to the log, so the cost of
+    a write depends only on the size of the change.
+    All collections are kept in memory, on open they are restored
+    from the latest snapshot and by replaying the log.
+
+    When the log grows past the compaction threshold, it is rotated and
+    the current state is written to a snapshot file in a background thread.
+
+    Log records have one of the forms:
+        {"op": "upsert", "collection": name, "entity": entity_dict}
+        {"op": "delete", "collection": name, "uuid": entity_id}
+        {"op": "replace", "collection": name, "entities": [entity_dict]}
+
+    Entity dictionaries returned by the database are shared with its
+    in-memory state and must not be mutated.
+
+    Records of changes made inside a transaction are appended to the log
+    at once when the transaction ends.
+
+    Database can be shared by threads, reads run in parallel while writes
+    and transactions hold the lock exclusively. Database holds a lock
+    of the log file until closed, so it can be opened only once at a time,
+    by any process.
+    """
+
+    def __init__(
+            self,
+            log_path: str,
+            collection_names: List[str],
+            compaction_threshold: int = 1000,
+            sync: bool = False
+    ):
+        """Open a database persisted in the given log file.
+
+        Missing files are created, snapshot is stored next to the log
+
+        :param log_path: path to the log file
+        :param collection_names: list of collection names used by the database
+        :param compaction_threshold: number of log records after which
+            the log is compacted into a snapshot, defaults to 1000
+        :param sync: whether to fsync the log after every write,
+            defaults to False
+        :raises InvalidDatabaseFileError: if the snapshot or the log
+            is corrupted
+        :raises DatabaseInUseError: if the database is already opened,
+            also by another process
+        """
+        self.__log_path = log_path
+        self.__snapshot_path = log_path + ".snapshot"
+        self.__rotated_log_path = log_path + ".compacting"
+        super().__init__(collection_names)
+        self.__compaction_threshold = compaction_threshold
+        self.__sync = sync
+        self.__compaction: Optional[Thread] = None
+        self.__transaction: Optional[List[Dict]] = None
+        self.__undo_records: List[Dict] = []
+        self.__versions = {
+            collection_name: 0 for collection_name in collection_names
+        }
+
+        self.__file_lock = FileLock(log_path)
+        if not self.__file_lock.acquire_exclusive(blocking=False):
+            raise DatabaseInUseError(log_path)
+        try:
+            self.__collections = self._load_snapshot()
+            interrupted_compaction = os.path.exists(self.__rotated_log_path)
+            if interrupted_compaction:
+                self._replay_log(self.__rotated_log_path)
+            self.__log_records = self._replay_log(self.__log_path)
+            self.__log_file = open(
+                self.__log_path, mode="a", encoding="utf-8"
+            )
+        except BaseException:
+            self.__file_lock.release()
+            raise
+
+        if interrupted_compaction:
+            self._write_snapshot(self._copy_collections())
+
+    def get_by_id(
+            self, entity_id: str, collection_name: str
+    ) -> Optional[Dict]:
+        """Get an entity by its id or None if not found.
+
+        :param entity_id: id of entity
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            return self.__collections[collection_name].get(entity_id)
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection.
+
+        Version increases with every change of the collection
+        and reverted transaction changing it
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        return self.__versions[collection_name]
+
+    def get_by_ids(
+            self, entity_ids: Iterable[str], collection_name: str
+    ) -> List[Dict]:
+        """Get entities with given ids, skipping ids not found.
+
+        Entities are returned in order of the ids
+
+        :param entity_ids: ids of entities
+        :param collection_name: entities' collection name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        collection = self.__collections[collection_name]
+        with self._lock.read():
+            return [
+                collection[entity_id] for entity_id in entity_ids
+                if entity_id in collection
+            ]
+
+    def save(self, entity_dict: Dict, collection_name: str) -> None:
+        """Save an entity to the database, overwriting previous value.
+
+        :param entity_dict: entity dictionary to be persisted in the database
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when entity_dict does not have a uuid
+        """
+        self._verify_collection_name(collection_name)
+        self._verify_has_uuid(entity_dict)
+        self._append({
+            "op": "upsert",
+            "collection": collection_name,
+            "entity": dict(entity_dict)
+        })
+
+    def delete_by_id(self, entity_id: str, collection_name: str) -> None:
+        """Delete an existing entity from the database by its id.
+
+        If there is no entity with given id - do nothing
+
+        :param entity_id: id of the entity to delete
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        if entity_id not in self.__collections[collection_name]:
+            return
+
+        self._append({
+            "op": "delete",
+            "collection": collection_name,
+            "uuid": entity_id
+        })
+
+    def get_collection(self, collection_name: str) -> List[Dict]:
+        """Get collection of entities by its name.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            return list(self.__collections[collection_name].values())
+
+    def is_indexed(self, collection_name: str, field: str) -> bool:
+        """Return whether the database indexes the field, it never does.
+
+        Entities are found by scanning the collection in memory
+
+        :param collection_name: name of the collection
+        :param field: name of the field
+        """
+        return False
+
+    def find(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]] = None,
+            order_by: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get entities with fields equal to given values.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, defaults to None -
+            all entities match
+        :param order_by: name of the field to order by, prefixed with '-'
+            for descending order, defaults to None - any order
+        :param limit: maximal number of returned entities,
+            defaults to None - no limit
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            return select_entities(
+                self.__collections[collection_name].values(),
+                where,
+                order_by,
+                limit
+            )
+
+    def find_before(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]],
+            field: str,
+            before: Optional[Any],
+            limit: int
+    ) -> List[Dict]:
+        """Get entities with a field lower than given value, highest first.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, None - all entities
+            match
+        :param field: name of the compared and ordered field
+        :param before: only entities with lower values are returned,
+            None - no bound
+        :param limit: maximal number of returned entities
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            return select_entities_before(
+                self.__collections[collection_name].values(),
+                where, field, before, limit
+            )
+
+    def save_collection(self, collection: List[Dict],
+                        collection_name: str) -> None:
+        """Save collection to the database, overwriting all existing items.
+
+        :param collection: collection of entities to persist in the database
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when any entiy dict in the collection does not
+            have a uuid
+        """
+        self._verify_collection_name(collection_name)
+        for entity_dict in collection:
+            self._verify_has_uuid(entity_dict)
+
+        self._append({
+            "op": "replace",
+            "collection": collection_name,
+            "entities": [dict(entity_dict) for entity_dict in collection]
+        })
+
+    def apply_batch(self, mutations: Iterable[Mutation]) -> None:
+        """Apply mutations of entities, appending them to the log at once.
+
+        Mutations are applied in order
+
+        :param mutations: entities to save or delete
+        :raises CollectionDoesNotExistError: when collection of any mutation
+            does not exist
+        :raises NoUuidError: when any saved entity_dict does not have a uuid
+        """
+        records: List[Dict] = []
+        for mutation in mutations:
+            self._verify_collection_name(mutation.collection_name)
+            if mutation.entity_dict is None:
+                records.append({
+                    "op": "delete",
+                    "collection": mutation.collection_name,
+                    "uuid": mutation.entity_id
+                })
+            else:
+                self._verify_has_uuid(mutation.entity_dict)
+                records.append({
+                    "op": "upsert",
+                    "collection": mutation.collection_name,
+                    "entity": dict(mutation.entity_dict)
+                })
+        self._append(*records)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Buffer changes made in the block and append them to the log once.
+
+        Changes are visible to reads inside the block.
+        If the block raises an exception, all its changes are reverted.
+        Transaction started inside another one is a part of the outer one.
+        Other threads wait until the transaction ends
+        """
+        with self._lock.write():
+            if self.__transaction is not None:
+                yield
+                return
+
+            self.__transaction = []
+            self.__undo_records = []
+            self._after_commit = []
+            try:
+                yield
+            except BaseException:
+                for undo_record in reversed(self.__undo_records):
+                    self._apply(undo_record)
+                raise
+            else:
+                records = self.__transaction
+                callbacks = self._after_commit
+            finally:
+                self.__transaction = None
+                self.__undo_records = []
+                self._after_commit = []
+
+            self._append(*records, applied=True)
+            for callback in callbacks:
+                callback()
+
+    def _in_transaction(self) -> bool:
+        """Return whether a transaction is running."""
+        return self.__transaction is not None
+
+    def compact(self) -> None:
+        """Compact the log into a snapshot and wait until it is written."""
+        self._start_compaction()
+        self._wait_for_compaction()
+
+    def close(self) -> None:
+        """Wait for a running compaction, close the log file and unlock it."""
+        self._wait_for_compaction()
+        with self._lock.write():
+            self.__log_file.close()
+            self.__file_lock.release()
+
+    def _append(self, *records: Dict, applied: bool = False) -> None:
+        """Apply mutation records to the state and append them to the log.
+
+        All records are written and flushed at once,
+        inside a transaction they are only applied and buffered
+
+        :param records: log records describing the mutations
+        :param applied: whether records were already applied to the state,
+            defaults to False
+        """
+        if not records:
+            return
+
+        with self._lock.write():
+            if self.__transaction is not None:
+                for record in records:
+                    self.__undo_records.append(self._undo_record(record))
+                    self._apply(record)
+                self.__transaction.extend(records)
+                return
+
+            self.__log_file.write(
+                "".join(json.dumps(record) + "\n" for record in records)
+            )
+            self.__log_file.flush()
+            if self.__sync:
+                os.fsync(self.__log_file.fileno())
+            if not applied:
+                for record in records:
+                    self._apply(record)
+            self.__log_records += len(records)
+            compaction_due = self.__log_records >= self.__compaction_threshold
+
+        if compaction_due:
+            self._start_compaction()
+
+    def _apply(self, record: Dict) -> None:
+        """Apply a mutation record to the in-memory state.
+
+        :param record: log record describing the mutation
+        :raises InvalidDatabaseFileError: if record is malformed
+        """
+        try:
+            collection = self.__collections[record["collection"]]
+            operation = record["op"]
+            if operation == "upsert":
+                entity_dict = record["entity"]
+                collection[entity_dict["uuid"]] = entity_dict
+            elif operation == "delete":
+                collection.pop(record["uuid"], None)
+            elif operation == "replace":
+                collection.clear()
+                for entity_dict in record["entities"]:
+                    collection[entity_dict["uuid"]] = entity_dict
+            else:
+                raise InvalidDatabaseFileError(
+                    f"Unknown log operation: {operation}")
+        except KeyError as e:
+            raise InvalidDatabaseFileError("Malformed log record") from e
+        self.__versions[record["collection"]] += 1
+
+    def _undo_record(self, record: Dict) -> Dict:
+        """Return a record reverting the given one in the current state.
+
+        :param record: log record describing the mutation
+        """
+        collection_name = record["collection"]
+        collection = self.__collections[collection_name]
+        if record["op"] == "replace":
+            return {
+                "op": "replace",
+                "collection": collection_name,
+                "entities": list(collection.values())
+            }
+
+        entity_id = record["uuid"] if record["op"] == "delete" \
+            else record["entity"]["uuid"]
+        if entity_id in collection:
+            return {
+                "op": "upsert",
+                "collection": collection_name,
+                "entity": collection[entity_id]
+            }
+        return {
+            "op": "delete",
+            "collection": collection_name,
+            "uuid": entity_id
+        }
+
+    def _start_compaction(self) -> None:
+        """Rotate the log and write a snapshot in a background thread.
+
+        Does nothing if a compaction is already running
+        or a transaction is in progress
+        """
+        with self._lock.write():
+            if self.__compaction is not None \
+                    and self.__compaction.is_alive():
+                return
+            if self.__transaction is not None:
+                return
+
+            snapshot = self._copy_collections()
+            self.__log_file.close()
+            if os.path.exists(self.__rotated_log_path):
+                # Snapshot of the previous compaction was not written,
+                # records of its rotated log are still needed
+                self._append_file(self.__log_path, self.__rotated_log_path)
+                os.remove(self.__log_path)
+            else:
+                os.replace(self.__log_path, self.__rotated_log_path)
+            self.__log_file = open(self.__log_path, mode="a",
+                                   encoding="utf-8")
+            self.__log_records = 0
+
+            self.__compaction = Thread(
+                target=self._write_snapshot, args=(snapshot,), daemon=True
+            )
+            self.__compaction.start()
+
+    @staticmethod
+    def _append_file(path: str, target_path: str) -> None:
+        """Append content of a file to another one and sync it to disk.
+
+        Records appended twice, if the file is not removed afterwards,
+        are harmless, replaying them again gives the same state
+        """
+        with open(path, mode="rb") as source_file, \
+                open(target_path, mode="ab") as target_file:
+            shutil.copyfileobj(source_file, target_file)
+            target_file.flush()
+            os.fsync(target_file.fileno())
+
+    def _wait_for_compaction(self) -> None:
+        """Block until a running compaction finishes."""
+        compaction = self.__compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _write_snapshot(
+            self,
+            snapshot: Dict[str, SerializedCollection]
+    ) -> None:
+        """Atomically replace the snapshot file and drop the rotated log.
+
+        :param snapshot: dictionary mapping collection names to
+            serialized collections
+        """
+        temp_path = self.__snapshot_path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as temp_file:
+            temp_file.write(json.dumps(snapshot))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, self.__snapshot_path)
+
+        if os.path.exists(self.__rotated_log_path):
+            os.remove(self.__rotated_log_path)
+
+    def _copy_collections(self) -> Dict[str, SerializedCollection]:
+        """Return a copy of the state safe to serialize in another thread."""
+        return {
+            collection_name: dict(collection)
+            for collection_name, collection in self.__collections.items()
+        }
+
+    def _load_snapshot(self) -> Dict[str, SerializedCollection]:
+        """Load collections from the snapshot file or create empty ones.
+
+        :raises InvalidDatabaseFileError: if snapshot is not a valid JSON
+        """
+        collections: Dict[str, SerializedCollection] = {
+            collection_name: {}
+            for collection_name in self._collection_names
+        }
+        if not os.path.exists(self.__snapshot_path):
+            return collections
+
+        try:
+            with open(self.__snapshot_path, encoding="utf-8") as snapshot:
+                data = json.load(snapshot)
+        except ValueError as e:
+            raise InvalidDatabaseFileError(
+                "Snapshot must be in JSON format") from e
+
+        for collection_name in self._collection_names:
+            collections[collection_name] = data.get(collection_name, {})
+        return collections
+
+    def _replay_log(self, path: str) -> int:
+        """Apply all records from the log file, return number of records.
+
+        A partially written last line, left by an interrupted write,
+        is cut off from the file
+
+        :param path: path to the log file
+        :raises InvalidDatabaseFileError: if any complete record is corrupted
+        """
+        if not os.path.exists(path):
+            return 0
+
+        with open(path, mode="rb") as log_file:
+            content = log_file.read()
+
+        complete_length = content.rfind(b"\n") + 1
+        if complete_length != len(content):
+            with open(path, mode="r+b") as log_file:
+                log_file.truncate(complete_length)
+
+        records = 0
+        for line in content[:complete_length].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise InvalidDatabaseFileError(
+                    "Log records must be in JSON format") from e
+            self._apply(record)
+            records += 1
+        return records
+
+
+class DatabaseInUseError(Exception):
+    """Database is already opened, possibly by another process."""
+
+    def __init__(self, path):
+        super().__init__(f"Database: {path} is already opened")
+        self.path = path
@@ -1,67 +1,350 @@
 """Repository classes for accessing data persisted in a Database."""
 from abc import ABC
-from typing import Optional, List, TypeVar, Generic
+from copy import copy
+from dataclasses import replace
+from datetime import datetime
+from typing import (
+    Optional, List, TypeVar, Generic, Dict, NamedTuple, Iterable, Set,
+    ContextManager, Tuple, Any
+)
 
 from core.model import User, Message, FriendRequest, Entity, Photo
-from persistence.interface import Database, JsonSerializer
+from persistence.blob_store import BlobStore
+from persistence.identity_map import IdentityMap
+from persistence.indexes import HashIndex, ConversationIndex, TrigramIndex
+from persistence.interface import Database, JsonSerializer, Mutation
+from persistence.rw_lock import ReadWriteLock
 
 T = TypeVar("T", bound=Entity)
 
+BLOB_ID_KEY = "blob_id"
+CACHE_SIZE = 1000
+PHOTO_CACHE_SIZE = 50
+
+
+class _Reading:
+    """Reusable context manager of a repository's synchronized reads."""
+
+    def __init__(self, repository: "BaseRepository", indexed: bool) -> None:
+        """Create context manager of reads of the repository."""
+        self.__repository = repository
+        self.__indexed = indexed
+
+    def __enter__(self) -> None:
+        """Take the read lock with derived state up to date."""
+        self.__repository._acquire_read(self.__indexed)
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Release the read lock."""
+        self.__repository._lock.release_read()
+
 
 class BaseRepository(ABC, Generic[T]):
-    """Generic abstract base class for database operations on entities."""
+    """Generic abstract base class for database operations on entities.
+
+    Entities read from the database are kept in an identity map, so there
+    is one live object per uuid and reading it again costs a dict lookup.
+    The least recently used entities are evicted when the map is full.
+    Saving or deleting an entity removes it from the map. Changes of the
+    collection not made through the repository, also by other processes
+    sharing the database file, are noticed by the collection's version
+    checked before every read, and clear the whole map and derived state
+    like indexes.
+    Callers get copies of the kept entities, so changes made to them
+    are not seen by anyone else until they are saved.
+
+    Repository can be used by many threads. Reads hold a read lock
+    and proceed in parallel, writes and updates of derived state
+    hold the write lock. The lock is the database's lock, shared by all
+    its repositories, so transactions spanning repositories and plain
+    reads and writes can not deadlock.
+    """
 
     def __init__(
             self,
             database: Database,
             serializer: JsonSerializer,
-            collection_name: str
+            collection_name: str,
+            cache_size: int = CACHE_SIZE
     ):
         """Create a Repository connected to the given database.
 
         :param database: database to persist entities in
         :param serializer: JSON serializer for entities
         :param collection_name: collection name in the database
+        :param cache_size: maximal number of entities kept in the identity
+            map, 0 disables it, defaults to CACHE_SIZE
         """
         self._database = database
         self._serializer = serializer
         self._collection_name = collection_name
+        self._identity_map: IdentityMap[T] = IdentityMap(cache_size)
+        self._seen_version: Optional[int] = None
+        self._indexes_built = False
+        self._lock: ReadWriteLock = database.lock
+        self.__readings = (_Reading(self, False), _Reading(self, True))
+
+    @property
+    def version(self) -> int:
+        """Return version of the collection, increased by its changes."""
+        return self._database.get_version(self._collection_name)
 
     def save(self, entity: T):
         """Create new entity or update existing one.
 
         :param entity: entity to create or update
         """
-        entity_dict = self._serializer.to_json(entity)
-        self._database.save(entity_dict, self._collection_name)
+        with self._lock.write():
+            self._identity_map.discard(entity.uuid)
+            entity_dict = self._serialize(entity)
+            version = self.version
+            self._database.save(entity_dict, self._collection_name)
+            self._after_write(version)
+            self._on_saved(entity_dict)
 
     def get_by_id(self, entity_id: str) -> Optional[T]:
         """Get entity by id or None if it does not exist.
 
         :param entity_id: id of searched entity
         """
+        with self._reading():
+            entity = self._get_by_id(entity_id)
+        return self._copy(entity) if entity is not None else None
+
+    def get_by_ids(self, entity_ids: Iterable[str]) -> List[T]:
+        """Get entities with given ids in a single database lookup.
+
+        Entities are returned in order of the ids, ids not found are skipped
+
+        :param entity_ids: ids of searched entities
+        """
+        with self._reading():
+            entities = self._get_by_ids(entity_ids)
+        return [self._copy(entity) for entity in entities]
+
+    def delete(self, entity: T):
+        """Delete entity or do nothing if it does not exist in the database.
+
+        :param entity: entity to delete
+        """
+        with self._lock.write():
+            self._identity_map.discard(entity.uuid)
+            version = self.version
+            self._database.delete_by_id(entity.uuid, self._collection_name)
+            self._after_write(version)
+            self._on_deleted(entity.uuid)
+
+    def save_many(self, entities: Iterable[T]):
+        """Create or update multiple entities with a single database write.
+
+        :param entities: entities to create or update
+        """
+        with self._lock.write():
+            entity_dicts = [self._serialize(entity) for entity in entities]
+            for entity_dict in entity_dicts:
+                self._identity_map.discard(entity_dict["uuid"])
+            version = self.version
+            self._database.apply_batch(
+                Mutation(
+                    self._collection_name, entity_dict["uuid"], entity_dict
+                )
+                for entity_dict in entity_dicts
+            )
+            self._after_write(version)
+            for entity_dict in entity_dicts:
+                self._on_saved(entity_dict)
+
+    def delete_many(self, entities: Iterable[T]):
+        """Delete multiple entities with a single database write.
+
+        Entities which do not exist in the database are skipped
+
+        :param entities: entities to delete
+        """
+        with self._lock.write():
+            entity_ids = [entity.uuid for entity in entities]
+            for entity_id in entity_ids:
+                self._identity_map.discard(entity_id)
+            version = self.version
+            self._database.apply_batch(
+                Mutation(self._collection_name, entity_id)
+                for entity_id in entity_ids
+            )
+            self._after_write(version)
+            for entity_id in entity_ids:
+                self._on_deleted(entity_id)
+
+    def transaction(self) -> ContextManager[None]:
+        """Return a context manager grouping changes into a transaction.
+
+        Transaction belongs to the database, so it also includes changes
+        made through other repositories sharing the database
+        """
+        return self._database.transaction()
+
+    def _reading(self, indexed: bool = False) -> ContextManager[None]:
+        """Return context manager holding the read lock in the block.
+
+        Methods called in the block must not take the lock again
+
+        :param indexed: whether the block uses indexes, which are then
+            built if needed, defaults to False
+        """
+        return self.__readings[indexed]
+
+    def _acquire_read(self, indexed: bool) -> None:
+        """Take the read lock with derived state up to date.
+
+        Derived state is updated under the write lock, downgraded
+        to the read lock afterwards, so readers never see it half-built
+
+        :param indexed: whether indexes are needed
+        """
+        self._lock.acquire_read()
+        if self._is_up_to_date(indexed):
+            return
+        self._lock.release_read()
+        with self._lock.write():
+            self._sync_with_database()
+            if indexed:
+                self._build_indexes()
+            self._lock.acquire_read()
+
+    def _is_up_to_date(self, indexed: bool) -> bool:
+        """Return whether derived state needs no update before a read.
+
+        :param indexed: whether indexes are needed
+        """
+        if indexed and not self._indexes_built:
+            return False
+        return self.version == self._seen_version
+
+    def _get_by_id(self, entity_id: str) -> Optional[T]:
+        """Get entity by id, the read lock must be held."""
+        entity = self._identity_map.get(entity_id)
+        if entity is not None:
+            return entity
+
         entity_dict = self._database.get_by_id(
             entity_id,
             self._collection_name
         )
-        return self._serializer.from_json(entity_dict) if entity_dict else None
+        return self._materialize(entity_dict) if entity_dict else None
+
+    def _get_by_ids(self, entity_ids: Iterable[str]) -> List[T]:
+        """Get entities with given ids, the read lock must be held."""
+        entity_ids = list(entity_ids)
+        found = {}
+        for entity_id in entity_ids:
+            entity = self._identity_map.get(entity_id)
+            if entity is not None:
+                found[entity_id] = entity
+
+        missing_ids = [
+            entity_id for entity_id in entity_ids if entity_id not in found
+        ]
+        if missing_ids:
+            for entity_dict in self._database.get_by_ids(
+                    missing_ids, self._collection_name
+            ):
+                found[entity_dict["uuid"]] = self._materialize(entity_dict)
+        return [
+            found[entity_id] for entity_id in entity_ids
+            if entity_id in found
+        ]
 
-    def delete(self, entity: T):
-        """Delete entity or do nothing if it does not exist in the database.
+    def _materialize(self, entity_dict: Dict) -> T:
+        """Return the live entity of the dictionary read from the database.
 
-        :param entity: entity to delete
+        Entity is deserialized and kept in the identity map
+        unless the map already has it
+        """
+        entity_id = entity_dict["uuid"]
+        entity = self._identity_map.get(entity_id)
+        if entity is None:
+            entity = self._identity_map.put_if_absent(
+                entity_id, self._deserialize(entity_dict)
+            )
+        return entity
+
+    def _sync_with_database(self) -> None:
+        """Forget entities and derived state if the collection was changed.
+
+        Only changes not made through this repository are noticed,
+        the write lock must be held
+        """
+        version = self.version
+        if version != self._seen_version:
+            self._identity_map.clear()
+            self._on_collection_changed()
+            self._seen_version = version
+
+    def _after_write(self, previous_version: int) -> None:
+        """Remember the version after a write made through the repository.
+
+        If the collection was also changed by someone else before,
+        the change is still noticed on the next read
+
+        :param previous_version: version of the collection before the write
+        """
+        if self._seen_version == previous_version:
+            self._seen_version = self.version
+
+    def _copy(self, entity: T) -> T:
+        """Return copy of a kept entity to be handed out to a caller."""
+        return copy(entity)
+
+    def _serialize(self, entity: T) -> Dict:
+        """Convert entity to the dictionary stored in the database."""
+        return self._serializer.to_json(entity)
+
+    def _deserialize(self, entity_dict: Dict) -> T:
+        """Create entity from the dictionary stored in the database.
+
+        Data in the database was validated when it was saved,
+        so it is deserialized without validation
+        """
+        return self._serializer.from_json(entity_dict, trusted=True)
+
+    def _on_saved(self, entity_dict: Dict) -> None:
+        """Update derived state after an entity was saved.
+
+        :param entity_dict: serialized entity that was saved
+        """
+        pass
+
+    def _on_deleted(self, entity_id: str) -> None:
+        """Update derived state after an entity was deleted.
+
+        :param entity_id: id of the deleted entity
         """
-        self._database.delete_by_id(entity.uuid, self._collection_name)
+        pass
+
+    def _build_indexes(self) -> None:
+        """Build indexes from the collection, the write lock must be held."""
+        self._indexes_built = True
+
+    def _on_collection_changed(self) -> None:
+        """Discard derived state after the collection was changed elsewhere."""
+        pass
 
 
 class UserRepository(BaseRepository[User]):
-    """Class for accessing users stored in a database."""
+    """Class for accessing users stored in a database.
+
+    Lookups by username and email are served from hash indexes
+    and username fragment search from a trigram index,
+    built from the collection on first use and kept up to date
+    by save and delete. If the database indexes usernames or emails,
+    lookups by them are passed to the database instead.
+    """
 
     def __init__(
             self,
             database: Database,
             serializer: JsonSerializer[User],
-            collection_name: str = "users"
+            collection_name: str = "users",
+            cache_size: int = CACHE_SIZE
     ):
         """Create UserRepository connected to the given database.
 
@@ -69,24 +352,48 @@ class UserRepository(BaseRepository[User]):
         :param serializer: JSON serializer for users
         :param collection_name: name of collection in datbase,
             defaults to "users"
+        :param cache_size: maximal number of entities kept in the identity
+            map, defaults to CACHE_SIZE
         """
-        super().__init__(database, serializer, collection_name)
+        super().__init__(database, serializer, collection_name, cache_size)
+        self._username_index = HashIndex("username")
+        self._email_index = HashIndex("email")
+        self._username_fragment_index = TrigramIndex("username")
+        self._all_users: Tuple[int, List[User]] = (-1, [])
 
     def get_all(self) -> List[User]:
-        """Get all users."""
-        users_json = self._database.get_collection(self._collection_name)
-        users = [self._serializer.from_json(user_json) for user_json in
-                 users_json]
-        return users
+        """Get all users.
+
+        Users are read and deserialized again only if the collection
+        changed since the previous call
+        """
+        with self._reading():
+            version, users = self._all_users
+            users_json = self._database.get_collection_if_changed(
+                self._collection_name, version
+            )
+            if users_json.collection is not None:
+                users = [
+                    self._materialize(user_json)
+                    for user_json in users_json.collection
+                ]
+                self._all_users = (users_json.version, users)
+        return [self._copy(user) for user in users]
 
     def get_by_username(self, username: str) -> Optional[User]:
         """Get user by username or None if not found.
 
         :param username: username matched exactly to a user
         """
-        users = self.get_all()
-        users = [user for user in users if user.username == username]
-        return users[0] if users else None
+        if self._database.is_indexed(self._collection_name, "username"):
+            return self._find_one({"username": username})
+
+        with self._reading(indexed=True):
+            for user_id in self._username_index.get(username):
+                user = self._get_by_id(user_id)
+                if user is not None and user.username == username:
+                    return self._copy(user)
+            return None
 
     def get_by_email(self, email: str) -> Optional[User]:
         """Get user by email or None if not found.
@@ -95,29 +402,115 @@ class UserRepository(BaseRepository[User]):
 
         :param email: email address of searched user
         """
-        users = self.get_all()
-        users = [user for user in users if user.email == email]
-        return users[0] if users else None
+        if self._database.is_indexed(self._collection_name, "email"):
+            return self._find_one({"email": email})
 
-    def get_by_username_fragment(self, username_fragment: str) -> List[User]:
-        """Get all users with username matching fragment.
+        with self._reading(indexed=True):
+            for user_id in self._email_index.get(email):
+                user = self._get_by_id(user_id)
+                if user is not None and user.email == email:
+                    return self._copy(user)
+            return None
+
+    def get_by_username_fragment(
+            self,
+            username_fragment: str,
+            limit: Optional[int] = None
+    ) -> List[User]:
+        """Get users with username matching fragment, ordered by username.
 
         :param username_fragment: string contained in user's username
+        :param limit: maximal number of returned users,
+            defaults to None - no limit
         """
-        return [
-            user for user in self.get_all()
-            if username_fragment in user.username
-        ]
+        with self._reading(indexed=True):
+            user_ids = self._username_fragment_index.search(
+                username_fragment, limit
+            )
+            users = self._get_by_ids(user_ids)
+        return [self._copy(user) for user in users]
+
+    def _find_one(self, where: Dict[str, str]) -> Optional[User]:
+        """Get any user matching the condition, found by the database.
+
+        :param where: field values of the matching user
+        """
+        with self._reading():
+            users_json = self._database.find(
+                self._collection_name, where, limit=1
+            )
+            if not users_json:
+                return None
+            user = self._materialize(users_json[0])
+        return self._copy(user)
+
+    def _copy(self, entity: User) -> User:
+        """Return copy of a kept user with its own set of friends."""
+        user = copy(entity)
+        user.friend_uuids = set(entity.friend_uuids)
+        return user
+
+    def _build_indexes(self) -> None:
+        """Index all users from the database if not indexed yet."""
+        if self._indexes_built:
+            return
+
+        for user_json in self._database.get_collection(self._collection_name):
+            self._username_index.add(user_json)
+            self._email_index.add(user_json)
+            self._username_fragment_index.add(user_json)
+        self._indexes_built = True
+
+    def _on_saved(self, entity_dict: Dict) -> None:
+        """Update indexes with the saved user."""
+        if self._indexes_built:
+            self._username_index.add(entity_dict)
+            self._email_index.add(entity_dict)
+            self._username_fragment_index.add(entity_dict)
+
+    def _on_deleted(self, entity_id: str) -> None:
+        """Remove the deleted user from indexes."""
+        if self._indexes_built:
+            self._username_index.remove(entity_id)
+            self._email_index.remove(entity_id)
+            self._username_fragment_index.remove(entity_id)
+
+    def _on_collection_changed(self) -> None:
+        """Drop indexes, they are built again on next use."""
+        self._username_index.clear()
+        self._email_index.clear()
+        self._username_fragment_index.clear()
+        self._indexes_built = False
+
+
+class MessagePage(NamedTuple):
+    """Part of a conversation, ordered by timestamp, earliest first.
+
+    Cursor is the timestamp of the earliest message on the page,
+    to be passed as 'before' to get the previous page,
+    or None if there are no earlier messages
+    """
+
+    messages: List[Message]
+    cursor: Optional[datetime]
 
 
 class MessageRepository(BaseRepository[Message]):
-    """Class for accessing messages persisted in a database."""
+    """Class for accessing messages persisted in a database.
+
+    Messages are partitioned into conversations by a ConversationIndex,
+    built from the collection on first use and kept up to date
+    by save and delete. If the database indexes senders, receivers
+    and timestamps, pages are read from the database one at a time instead.
+    Messages are immutable, so they are handed out without copying.
+    """
 
     def __init__(
             self,
             database: Database,
             serializer: JsonSerializer[Message],
-            collection_name: str = "messages"
+            collection_name: str = "messages",
+            cache_size: int = CACHE_SIZE
     ):
         """Create a message repository connected to the given database.
 
@@ -125,8 +518,11 @@ class MessageRepository(BaseRepository[Message]):
         :param serializer: JSON serializer for messages
         :param collection_name: name of collection in datbase,
         defaults to "messages"
+        :param cache_size: maximal number of entities kept in the identity
+            map, defaults to CACHE_SIZE
         """
-        super().__init__(database, serializer, collection_name)
+        super().__init__(database, serializer, collection_name, cache_size)
+        self._conversation_index = ConversationIndex()
 
     def get_messages(self, user_a: User, user_b: User) -> List[Message]:
         """Get all messages exchanged between two users, ordered by timestamp.
@@ -137,23 +533,146 @@ class MessageRepository(BaseRepository[Message]):
         :param user_a: one of the users sending or receiving messages
         :param user_b: one of the users sending or receiving messages
         """
-        messages_json = self._database.get_collection(self._collection_name)
-        messages = [
-            self._serializer.from_json(message_json)
-            for message_json in messages_json
-        ]
-        messages = [
-            msg for msg in messages
-            if _is_message_matched(msg, user_a, user_b)
+        with self._reading(indexed=True):
+            messages_json = self._conversation_index.get(
+                user_a.uuid, user_b.uuid
+            )
+            return [
+                self._materialize(message_json)
+                for message_json in messages_json
+            ]
+
+    def get_messages_page(
+            self,
+            user_a: User,
+            user_b: User,
+            before: Optional[datetime] = None,
+            limit: int = 50
+    ) -> MessagePage:
+        """Get newest messages exchanged between two users before timestamp.
+
+        Messages are ordered by timestamp, earliest first
+        Order of users does not matter
+
+        :param user_a: one of the users sending or receiving messages
+        :param user_b: one of the users sending or receiving messages
+        :param before: only messages sent earlier are returned,
+            None to get the newest messages
+        :param limit: maximal number of messages, defaults to 50
+        :raises ValueError: if limit is not positive
+        """
+        if limit <= 0:
+            raise ValueError("Page limit must be positive")
+
+        found_by_database = all(
+            self._database.is_indexed(self._collection_name, field)
+            for field in ("from_user_id", "to_user_id", "timestamp")
+        )
+        before_timestamp = before.isoformat() if before is not None else None
+        with self._reading(indexed=not found_by_database):
+            if found_by_database:
+                messages_json, has_earlier = self._find_page(
+                    user_a, user_b, before_timestamp, limit
+                )
+            else:
+                messages_json, has_earlier = self._conversation_index.get_page(
+                    user_a.uuid, user_b.uuid, before_timestamp, limit
+                )
+            messages = [
+                self._materialize(message_json)
+                for message_json in messages_json
+            ]
+        cursor = messages[0].timestamp if has_earlier and messages else None
+        return MessagePage(messages, cursor)
+
+    def _find_page(
+            self,
+            user_a: User,
+            user_b: User,
+            before: Optional[str],
+            limit: int
+    ) -> Tuple[List[Dict], bool]:
+        """Find a page of messages between two users in the database.
+
+        Pages match those of ConversationIndex.get_page, messages
+        sharing a timestamp are never split between pages
+
+        :param user_a: one of the users sending or receiving messages
+        :param user_b: one of the users sending or receiving messages
+        :param before: ISO-format timestamp, only earlier messages
+            are returned, None to start from the newest message
+        :param limit: maximal number of messages on the page
+        :return: messages, earliest first, and whether there are any
+            earlier messages
+        """
+        user_ids = {(user_a.uuid, user_b.uuid), (user_b.uuid, user_a.uuid)}
+
+        def find_before(timestamp: Optional[str], count: int) -> List[Dict]:
+            messages_json: List[Dict] = []
+            for from_user_id, to_user_id in user_ids:
+                messages_json.extend(self._database.find_before(
+                    self._collection_name,
+                    {"from_user_id": from_user_id, "to_user_id": to_user_id},
+                    "timestamp",
+                    timestamp,
+                    count
+                ))
+            return messages_json
+
+        newest = sorted(
+            find_before(before, limit), key=self._sort_key, reverse=True
+        )[:limit]
+        if not newest:
+            return [], False
+
+        boundary = newest[-1]["timestamp"]
+        page = [
+            message_json for message_json in newest
+            if message_json["timestamp"] != boundary
         ]
-        messages = sorted(messages, key=lambda msg: msg.timestamp)
-        return messages
+        for from_user_id, to_user_id in user_ids:
+            page.extend(self._database.find(self._collection_name, {
+                "from_user_id": from_user_id,
+                "to_user_id": to_user_id,
+                "timestamp": boundary
+            }))
+        page.sort(key=self._sort_key)
+        has_earlier = len(newest) == limit and bool(find_before(boundary, 1))
+        return page, has_earlier
+
+    @staticmethod
+    def _sort_key(message_json: Dict) -> Tuple[str, str]:
+        """Return key ordering messages as in ConversationIndex."""
+        return message_json["timestamp"], message_json["uuid"]
+
+    def _copy(self, entity: Message) -> Message:
+        """Return the kept message, messages are immutable."""
+        return entity
+
+    def _build_indexes(self) -> None:
+        """Index all messages from the database if not indexed yet."""
+        if self._indexes_built:
+            return
+
+        messages_json = self._database.get_collection(self._collection_name)
+        for message_json in messages_json:
+            self._conversation_index.add(message_json)
+        self._indexes_built = True
 
+    def _on_saved(self, entity_dict: Dict) -> None:
+        """Add the saved message to its conversation."""
+        if self._indexes_built:
+            self._conversation_index.add(entity_dict)
 
-def _is_message_matched(message: Message, user_a: User, user_b: User) -> bool:
-    """Return whether message was sent from one of given users to the other."""
-    user_ids = (user_a.uuid, user_b.uuid)
-    return message.to_user_id in user_ids and message.from_user_id in user_ids
+    def _on_deleted(self, entity_id: str) -> None:
+        """Remove the deleted message from its conversation."""
+        if self._indexes_built:
+            self._conversation_index.remove(entity_id)
+
+    def _on_collection_changed(self) -> None:
+        """Drop the index, it is built again on next use."""
+        self._conversation_index.clear()
+        self._indexes_built = False
 
 
 class FriendRequestRepository(BaseRepository[FriendRequest]):
@@ -163,7 +682,8 @@ class FriendRequestRepository(BaseRepository[FriendRequest]):
             self,
             database: Database,
             serializer: JsonSerializer[FriendRequest],
-            collection_name: str = "friend_requests"
+            collection_name: str = "friend_requests",
+            cache_size: int = CACHE_SIZE
     ):
         """Create FriendRequestRepository connected to the given database.
 
@@ -171,49 +691,57 @@ class FriendRequestRepository(BaseRepository[FriendRequest]):
         :param serializer: JSON serializer for friend requests
         :param collection_name: collection name in the database,
             defaults to "friend_requests"
+        :param cache_size: maximal number of entities kept in the identity
+            map, defaults to CACHE_SIZE
         """
-        super().__init__(database, serializer, collection_name)
+        super().__init__(database, serializer, collection_name, cache_size)
 
     def get_requests_to_user(self, to_user: User) -> List[FriendRequest]:
         """Get all requests sent to given user, ordered by timestamp.
 
         :param to_user: user receiving friend requests
         """
-        requests = self._get_all_requests()
-        requests = [req for req in requests if req.to_user_id == to_user.uuid]
-        requests = sorted(requests, key=lambda req: req.timestamp)
-        return requests
+        return self._find_requests({"to_user_id": to_user.uuid})
 
     def get_requests_from_user(self, from_user: User) -> List[FriendRequest]:
         """Get all requests sent by the given user, ordered by timestamp.
 
         :param from_user: user sending friend requests
         """
-        requests = self._get_all_requests()
-        requests = [
-            req for req in requests
-            if req.from_user_id == from_user.uuid
-        ]
-        requests = sorted(requests, key=lambda req: req.timestamp)
-        return requests
+        return self._find_requests({"from_user_id": from_user.uuid})
 
-    def _get_all_requests(self) -> List[FriendRequest]:
-        """Get all friend requests from the database."""
-        requests_json = self._database.get_collection(self._collection_name)
-        return [
-            self._serializer.from_json(req_json)
-            for req_json in requests_json
-        ]
+    def _find_requests(self, where: Dict[str, str]) -> List[FriendRequest]:
+        """Get friend requests matching the condition, ordered by timestamp.
+
+        Only matching requests are deserialized
+
+        :param where: field values of matching requests
+        """
+        with self._reading():
+            requests_json = self._database.find(
+                self._collection_name, where, order_by="timestamp"
+            )
+            return [
+                self._copy(self._materialize(req_json))
+                for req_json in requests_json
+            ]
 
 
 class PhotoRepository(BaseRepository[Photo]):
-    """Class for accessing photos stored in a database."""
+    """Class for accessing photos stored in a database.
+
+    If a blob store is given, content of saved photos is kept in the store
+    and the database holds only photo's metadata with the blob id.
+    Photos saved with their content in the database are still readable
+    """
 
     def __init__(
             self,
             database: Database,
             serializer: JsonSerializer,
-            collection_name: str = "photos"
+            collection_name: str = "photos",
+            blob_store: Optional[BlobStore] = None,
+            cache_size: int = PHOTO_CACHE_SIZE
     ):
         """Create PhotoRepository connected to the given database.
 
@@ -221,5 +749,89 @@ class PhotoRepository(BaseRepository[Photo]):
         :param serializer: JSON serializer for photos
         :param collection_name: collection name in the database,
             defaults to "photos"
+        :param blob_store: store for content of photos, defaults to None -
+            content is stored in the database
+        :param cache_size: maximal number of photos kept in the identity
+            map, defaults to PHOTO_CACHE_SIZE
+        """
+        super().__init__(database, serializer, collection_name, cache_size)
+        self._blob_store = blob_store
+
+    def delete(self, entity: Photo):
+        """Delete photo and its content if no other photo shares it.
+
+        :param entity: photo to delete
+        """
+        with self._lock.write():
+            blob_ids = self._get_blob_ids([entity])
+            super().delete(entity)
+            self._delete_unused_blobs_after_commit(blob_ids)
+
+    def delete_many(self, entities: Iterable[Photo]):
+        """Delete photos and their content not shared with other photos.
+
+        :param entities: photos to delete
+        """
+        with self._lock.write():
+            entities = list(entities)
+            blob_ids = self._get_blob_ids(entities)
+            super().delete_many(entities)
+            self._delete_unused_blobs_after_commit(blob_ids)
+
+    def _get_blob_ids(self, entities: List[Photo]) -> Set[str]:
+        """Get ids of blobs referenced by stored versions of the photos."""
+        if self._blob_store is None:
+            return set()
+
+        blob_ids = set()
+        for entity in entities:
+            entity_dict = self._database.get_by_id(
+                entity.uuid, self._collection_name
+            )
+            if entity_dict and entity_dict.get(BLOB_ID_KEY) is not None:
+                blob_ids.add(entity_dict[BLOB_ID_KEY])
+        return blob_ids
+
+    def _delete_unused_blobs_after_commit(self, blob_ids: Set[str]) -> None:
+        """Delete unused blobs once the running transaction is committed.
+
+        Blobs stay if the transaction is discarded, and photos saved
+        later in the transaction may still reference them
         """
-        super().__init__(database, serializer, collection_name)
+        if blob_ids and self._blob_store is not None:
+            self._database.call_after_commit(
+                lambda: self._delete_unused_blobs(blob_ids)
+            )
+
+    def _delete_unused_blobs(self, blob_ids: Set[str]) -> None:
+        """Delete blobs which are not referenced by any stored photo."""
+        if self._blob_store is None:
+            return
+
+        photos_json = self._database.get_collection(self._collection_name)
+        used_blob_ids = {
+            photo_json.get(BLOB_ID_KEY) for photo_json in photos_json
+        }
+        for blob_id in blob_ids - used_blob_ids:
+            self._blob_store.delete(blob_id)
+
+    def _serialize(self, entity: Photo) -> Dict:
+        """Store photo's content as a blob and return its metadata."""
+        if self._blob_store is None:
+            return super()._serialize(entity)
+
+        blob_id = self._blob_store.put(entity.get_buffer())
+        metadata = replace(entity, binary_data_hex="", blob=None)
+        entity_dict = super()._serialize(metadata)
+        entity_dict[BLOB_ID_KEY] = blob_id
+        return entity_dict
+
+    def _deserialize(self, entity_dict: Dict) -> Photo:
+        """Create photo with its content read lazily from the blob store."""
+        blob_id = entity_dict.get(BLOB_ID_KEY)
+        if blob_id is None or self._blob_store is None:
+            return super()._deserialize(entity_dict)
+
+        photo = super()._deserialize(entity_dict)
+        photo.blob = self._blob_store.get(blob_id)
+        return photo
@@ -0,0 +1,135 @@
+"""Lock shared by readers and exclusive for writers."""
+
+from threading import Condition, Lock, get_ident
+from typing import Any, Callable, ContextManager, Dict, Optional
+
+
+class _Holding:
+    """Context manager acquiring a lock in the block.
+
+    Reusable, unlike generator based context managers,
+    so entering it costs only the acquisition
+    """
+
+    def __init__(
+            self,
+            acquire: Callable[[], None],
+            release: Callable[[], None]
+    ) -> None:
+        """Create context manager calling given functions."""
+        self.__acquire = acquire
+        self.__release = release
+
+    def __enter__(self) -> None:
+        """Acquire the lock."""
+        self.__acquire()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Release the lock."""
+        self.__release()
+
+
+class ReadWriteLock:
+    """Lock held by many reading threads at once or by one writing thread.
+
+    Writers are preferred - new readers wait while a writer is waiting,
+    so a stream of reads does not starve writes.
+    Both locks are reentrant and the writer can also take the read lock,
+    which allows downgrading: taking the read lock before releasing
+    the write lock. Read lock can not be upgraded to the write lock.
+    """
+
+    def __init__(self) -> None:
+        """Create a lock not held by anyone."""
+        self.__mutex = Lock()
+        self.__condition = Condition(self.__mutex)
+        self.__readers: Dict[int, int] = {}
+        self.__writer: Optional[int] = None
+        self.__writer_depth = 0
+        self.__waiting_writers = 0
+        self.__reading = _Holding(self.acquire_read, self.release_read)
+        self.__writing = _Holding(self.acquire_write, self.release_write)
+
+    @property
+    def held_for_writing(self) -> bool:
+        """Return whether the current thread holds the write lock."""
+        return self.__writer == get_ident()
+
+    def read(self) -> ContextManager[None]:
+        """Return context manager holding the read lock in the block."""
+        return self.__reading
+
+    def write(self) -> ContextManager[None]:
+        """Return context manager holding the write lock in the block."""
+        return self.__writing
+
+    def acquire_read(self) -> None:
+        """Wait until no writer holds or waits for the lock and take it."""
+        thread_id = get_ident()
+        # Entering the condition's mutex directly is cheaper than the condition
+        with self.__mutex:
+            depth = self.__readers.get(thread_id, 0)
+            if not depth and self.__writer != thread_id:
+                while not self._can_read():
+                    self.__condition.wait()
+            self.__readers[thread_id] = depth + 1
+
+    def release_read(self) -> None:
+        """Release the read lock taken by the current thread.
+
+        :raises RuntimeError: if the current thread does not hold it
+        """
+        thread_id = get_ident()
+        with self.__mutex:
+            depth = self.__readers.get(thread_id)
+            if depth is None:
+                raise RuntimeError("Read lock is not held")
+            if depth > 1:
+                self.__readers[thread_id] = depth - 1
+                return
+            del self.__readers[thread_id]
+            # Only writers wait for readers
+            if not self.__readers and self.__waiting_writers:
+                self.__condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """Wait until nobody else holds the lock and take it exclusively.
+
+        :raises RuntimeError: if the current thread holds only the read lock
+        """
+        thread_id = get_ident()
+        with self.__mutex:
+            if self.__writer == thread_id:
+                self.__writer_depth += 1
+                return
+            if thread_id in self.__readers:
+                raise RuntimeError("Read lock can not be upgraded")
+
+            self.__waiting_writers += 1
+            try:
+                self.__condition.wait_for(self._can_write)
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = thread_id
+            self.__writer_depth = 1
+
+    def release_write(self) -> None:
+        """Release the write lock taken by the current thread.
+
+        :raises RuntimeError: if the current thread does not hold it
+        """
+        with self.__mutex:
+            if self.__writer != get_ident():
+                raise RuntimeError("Write lock is not held")
+            self.__writer_depth -= 1
+            if self.__writer_depth == 0:
+                self.__writer = None
+                self.__condition.notify_all()
+
+    def _can_read(self) -> bool:
+        """Return whether no writer holds or waits for the lock."""
+        return self.__writer is None and not self.__waiting_writers
+
+    def _can_write(self) -> bool:
+        """Return whether nobody holds the lock."""
+        return self.__writer is None and not self.__readers
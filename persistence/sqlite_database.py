@@ -0,0 +1,527 @@
+"""Database in an SQLite file."""
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from threading import Lock
+from typing import (
+    Optional, Dict, List, Iterable, Iterator, Tuple, Any, Sequence
+)
+
+from persistence.base_database import BaseDatabase
+from persistence.interface import Mutation
+from persistence.json_database import (
+    JsonDatabase,
+    select_entities,
+    select_entities_before
+)
+
+IndexSpec = Dict[str, List[Tuple[str, ...]]]
+MAX_QUERY_PARAMETERS = 500
+
+
+class SqliteDatabase(BaseDatabase):
+    """Database storing collections of entity dictionaries in SQLite.
+
+    Every collection is a table with the entity's uuid as the primary key
+    and the entity dictionary stored as JSON text.
+    Fields used by indexes are additionally stored in their own columns,
+    one column per field, so queries on them are answered by SQLite
+    from the index instead of scanning the collection. Ranges of find_before
+    on indexed fields are limited by SQLite too, reading only returned rows.
+
+    Indexes are given per collection as tuples of field names,
+    e.g. {"messages": [("from_user_id", "to_user_id", "timestamp")]}.
+    Columns and indexes missing in an existing file are added on open.
+
+    Database can be used by many threads sharing its connection.
+    Reads proceed in parallel, changes and transactions hold the lock
+    exclusively. Changes committed by other connections to the file,
+    also of other processes, are noticed by SQLite's data version.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            collection_names: List[str],
+            indexes: Optional[IndexSpec] = None
+    ):
+        """Open a database in the given file, creating it if missing.
+
+        :param path: path to the SQLite file, ":memory:" for
+            an in-memory database
+        :param collection_names: list of collection names used by the database
+        :param indexes: field names of indexes for each collection,
+            defaults to None - no indexes
+        :raises ValueError: if a collection or field name is not
+            a valid identifier
+        """
+        super().__init__(collection_names)
+        self.__indexes = indexes if indexes is not None else {}
+        self.__indexed_fields: Dict[str, List[str]] = {}
+        for collection_name in collection_names:
+            fields: List[str] = []
+            for index in self.__indexes.get(collection_name, []):
+                fields.extend(
+                    field for field in index if field not in fields
+                )
+            self.__indexed_fields[collection_name] = fields
+            self._verify_identifiers([collection_name, *fields])
+
+        self.__in_transaction = False
+        self.__version_lock = Lock()
+        self.__versions = {
+            collection_name: 0 for collection_name in collection_names
+        }
+        self.__connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self.__data_version = self._read_data_version()
+        self._create_schema()
+
+    def get_by_id(
+            self, entity_id: str, collection_name: str
+    ) -> Optional[Dict]:
+        """Get an entity by its id or None if not found.
+
+        :param entity_id: id of entity
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        with self._lock.read():
+            row = self.__connection.execute(
+                f'SELECT entity FROM "{collection_name}" WHERE uuid = ?',
+                (entity_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_version(self, collection_name: str) -> int:
+        """Get version of the collection.
+
+        Version increases with every change of the collection made through
+        this database, with every rolled back transaction and with every
+        change of the file committed by other connections
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        self._check_data_version()
+        return self.__versions[collection_name]
+
+    def get_by_ids(
+            self, entity_ids: Iterable[str], collection_name: str
+    ) -> List[Dict]:
+        """Get entities with given ids, skipping ids not found.
+
+        Entities are returned in order of the ids
+
+        :param entity_ids: ids of entities
+        :param collection_name: entities' collection name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        entity_ids = list(entity_ids)
+        entities: Dict[str, str] = {}
+        with self._lock.read():
+            for start in range(0, len(entity_ids), MAX_QUERY_PARAMETERS):
+                chunk = entity_ids[start:start + MAX_QUERY_PARAMETERS]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self.__connection.execute(
+                    f'SELECT uuid, entity FROM "{collection_name}" '
+                    f'WHERE uuid IN ({placeholders})',
+                    chunk
+                )
+                entities.update(rows)
+        return [
+            json.loads(entities[entity_id]) for entity_id in entity_ids
+            if entity_id in entities
+        ]
+
+    def save(self, entity_dict: Dict, collection_name: str) -> None:
+        """Save an entity to the database, overwriting previous value.
+
+        :param entity_dict: entity dictionary to be persisted in the database
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when entity_dict does not have a uuid
+        """
+        self._verify_has_uuid(entity_dict)
+        self.apply_batch(
+            [Mutation(collection_name, entity_dict["uuid"], entity_dict)]
+        )
+
+    def delete_by_id(self, entity_id: str, collection_name: str) -> None:
+        """Delete an existing entity from the database by its id.
+
+        If there is no entity with given id - do nothing
+
+        :param entity_id: id of the entity to delete
+        :param collection_name: entity collection's name
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self.apply_batch([Mutation(collection_name, entity_id)])
+
+    def get_collection(self, collection_name: str) -> List[Dict]:
+        """Get collection of entities by its name.
+
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        return self.find(collection_name)
+
+    def save_collection(self, collection: List[Dict],
+                        collection_name: str) -> None:
+        """Save collection to the database, overwriting all existing items.
+
+        :param collection: collection of entities to persist in the database
+        :param collection_name: name of the collection
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        :raises NoUuidError: when any entiy dict in the collection does not
+            have a uuid
+        """
+        self._verify_collection_name(collection_name)
+        for entity_dict in collection:
+            self._verify_has_uuid(entity_dict)
+
+        with self.transaction():
+            self.__connection.execute(f'DELETE FROM "{collection_name}"')
+            self._increase_versions([collection_name])
+            self.apply_batch(
+                Mutation(collection_name, entity_dict["uuid"], entity_dict)
+                for entity_dict in collection
+            )
+
+    def apply_batch(self, mutations: Iterable[Mutation]) -> None:
+        """Apply mutations of entities in a single SQLite transaction.
+
+        Mutations are applied in order, either all of them or none
+
+        :param mutations: entities to save or delete
+        :raises CollectionDoesNotExistError: when collection of any mutation
+            does not exist
+        :raises NoUuidError: when any saved entity_dict does not have a uuid
+        """
+        mutations = list(mutations)
+        for mutation in mutations:
+            self._verify_collection_name(mutation.collection_name)
+            if mutation.entity_dict is not None:
+                self._verify_has_uuid(mutation.entity_dict)
+
+        with self.transaction():
+            for mutation in mutations:
+                if mutation.entity_dict is None:
+                    self._delete_row(
+                        mutation.collection_name, mutation.entity_id
+                    )
+                else:
+                    self._upsert_row(
+                        mutation.collection_name, mutation.entity_dict
+                    )
+
+    def is_indexed(self, collection_name: str, field: str) -> bool:
+        """Return whether conditions on the field are evaluated by SQLite.
+
+        :param collection_name: name of the collection
+        :param field: name of the field
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        return field in self.__indexed_fields[collection_name]
+
+    def find(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]] = None,
+            order_by: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get entities with fields equal to given values.
+
+        Conditions and ordering on indexed fields are evaluated by SQLite,
+        on other fields they are evaluated on loaded entities
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, defaults to None -
+            all entities match
+        :param order_by: name of the field to order by, prefixed with '-'
+            for descending order, defaults to None - any order
+        :param limit: maximal number of returned entities,
+            defaults to None - no limit
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        where = where if where is not None else {}
+        indexed_fields = self.__indexed_fields[collection_name]
+        sql_conditions = {
+            field: value for field, value in where.items()
+            if field in indexed_fields
+        }
+        other_conditions = {
+            field: value for field, value in where.items()
+            if field not in indexed_fields
+        }
+        order_field = order_by.lstrip("-") if order_by is not None else None
+        descending = order_by is not None and order_by.startswith("-")
+        sql_order = order_field is None or order_field in indexed_fields
+        sql_limit = not other_conditions and sql_order
+
+        query = f'SELECT entity FROM "{collection_name}"'
+        parameters: List[Any] = []
+        if sql_conditions:
+            query += " WHERE " + " AND ".join(
+                f'"{self._column(field)}" = ?' for field in sql_conditions
+            )
+            parameters.extend(
+                self._column_value(value)
+                for value in sql_conditions.values()
+            )
+        if order_field is not None and sql_order:
+            direction = "DESC" if descending else "ASC"
+            query += f' ORDER BY "{self._column(order_field)}" {direction}'
+        if limit is not None and sql_limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self._lock.read():
+            rows = self.__connection.execute(query, parameters).fetchall()
+        entities = [json.loads(row[0]) for row in rows]
+        return select_entities(
+            entities,
+            other_conditions,
+            order_by if not sql_order else None,
+            limit if not sql_limit else None
+        )
+
+    def find_before(
+            self,
+            collection_name: str,
+            where: Optional[Dict[str, Any]],
+            field: str,
+            before: Optional[Any],
+            limit: int
+    ) -> List[Dict]:
+        """Get entities with a field lower than given value, highest first.
+
+        :param collection_name: name of the collection
+        :param where: field values entities must have, None - all entities
+            match
+        :param field: name of the compared and ordered field
+        :param before: only entities with lower values are returned,
+            None - no bound
+        :param limit: maximal number of returned entities
+        :raises CollectionDoesNotExistError: when collection with given name
+            does not exist
+        """
+        self._verify_collection_name(collection_name)
+        where = where if where is not None else {}
+        indexed_fields = self.__indexed_fields[collection_name]
+        if not all(name in indexed_fields for name in (*where, field)):
+            return select_entities_before(
+                self.find(collection_name, where), None, field, before, limit
+            )
+
+        conditions = [f'"{self._column(name)}" = ?' for name in where]
+        parameters: List[Any] = [
+            self._column_value(value) for value in where.values()
+        ]
+        if before is not None:
+            conditions.append(f'"{self._column(field)}" < ?')
+            parameters.append(self._column_value(before))
+        query = f'SELECT entity FROM "{collection_name}"'
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f' ORDER BY "{self._column(field)}" DESC LIMIT ?'
+        parameters.append(limit)
+
+        with self._lock.read():
+            rows = self.__connection.execute(query, parameters).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group changes made in the block into one SQLite transaction.
+
+        If the block raises an exception, all its changes are rolled back.
+        Transaction started inside another one is a part of the outer one
+        """
+        with self._lock.write():
+            if self.__in_transaction:
+                yield
+                return
+
+            self.__connection.execute("BEGIN")
+            self.__in_transaction = True
+            self._after_commit = []
+            try:
+                yield
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                self._increase_versions(self._collection_names)
+                raise
+            else:
+                self.__connection.execute("COMMIT")
+                callbacks = self._after_commit
+            finally:
+                self.__in_transaction = False
+                self._after_commit = []
+
+            for callback in callbacks:
+                callback()
+
+    def _in_transaction(self) -> bool:
+        """Return whether a transaction is running."""
+        return self.__in_transaction
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        with self._lock.write():
+            self.__connection.close()
+
+    def _upsert_row(self, collection_name: str, entity_dict: Dict) -> None:
+        """Insert or replace row of the entity."""
+        fields = self.__indexed_fields[collection_name]
+        columns = ["uuid", "entity", *map(self._column, fields)]
+        values = [
+            entity_dict["uuid"],
+            json.dumps(entity_dict),
+            *(self._column_value(entity_dict.get(field)) for field in fields)
+        ]
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        self.__connection.execute(
+            f'INSERT OR REPLACE INTO "{collection_name}" ({column_list}) '
+            f'VALUES ({placeholders})',
+            values
+        )
+        self._increase_versions([collection_name])
+
+    def _delete_row(self, collection_name: str, entity_id: str) -> None:
+        """Delete row of the entity if it exists."""
+        self.__connection.execute(
+            f'DELETE FROM "{collection_name}" WHERE uuid = ?', (entity_id,)
+        )
+        self._increase_versions([collection_name])
+
+    def _increase_versions(self, collection_names: Iterable[str]) -> None:
+        """Increase versions of the collections."""
+        with self.__version_lock:
+            for collection_name in collection_names:
+                self.__versions[collection_name] += 1
+
+    def _check_data_version(self) -> None:
+        """Increase all versions if other connections changed the file."""
+        with self.__version_lock:
+            data_version = self._read_data_version()
+            if data_version == self.__data_version:
+                return
+            self.__data_version = data_version
+            for collection_name in self.__versions:
+                self.__versions[collection_name] += 1
+
+    def _read_data_version(self) -> int:
+        """Read SQLite's counter of changes committed by other connections."""
+        return self.__connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _create_schema(self) -> None:
+        """Create missing tables, columns and indexes."""
+        with self.transaction():
+            for collection_name in self._collection_names:
+                self.__connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{collection_name}" '
+                    f'(uuid TEXT PRIMARY KEY, entity TEXT NOT NULL)'
+                )
+                self._add_missing_columns(collection_name)
+                for index in self.__indexes.get(collection_name, []):
+                    index_name = "_".join([collection_name, *index])
+                    column_list = ", ".join(
+                        f'"{self._column(field)}"' for field in index
+                    )
+                    self.__connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{index_name}" '
+                        f'ON "{collection_name}" ({column_list})'
+                    )
+
+    def _add_missing_columns(self, collection_name: str) -> None:
+        """Add columns of indexed fields and fill them for stored entities."""
+        existing_columns = {
+            row[1] for row in self.__connection.execute(
+                f'PRAGMA table_info("{collection_name}")'
+            )
+        }
+        missing_fields = [
+            field for field in self.__indexed_fields[collection_name]
+            if self._column(field) not in existing_columns
+        ]
+        if not missing_fields:
+            return
+
+        for field in missing_fields:
+            self.__connection.execute(
+                f'ALTER TABLE "{collection_name}" '
+                f'ADD COLUMN "{self._column(field)}"'
+            )
+        rows = self.__connection.execute(
+            f'SELECT entity FROM "{collection_name}"'
+        ).fetchall()
+        for row in rows:
+            self._upsert_row(collection_name, json.loads(row[0]))
+
+    @staticmethod
+    def _column(field: str) -> str:
+        """Return name of the column storing an indexed field."""
+        return "field_" + field
+
+    @staticmethod
+    def _column_value(value: Any) -> Any:
+        """Convert field value to a value stored in its column.
+
+        Strings, numbers and None are stored as they are,
+        other values as JSON text
+        """
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return json.dumps(value)
+
+    @staticmethod
+    def _verify_identifiers(names: Sequence[str]) -> None:
+        """Verify if names can be safely used in SQL statements.
+
+        :raises ValueError: if any name is not a valid identifier
+        """
+        for name in names:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid identifier: {name}")
+
+
+def migrate_json_database(
+        json_path: str,
+        database: SqliteDatabase,
+        collection_names: List[str]
+) -> None:
+    """Copy all collections from a JSON database file to an SQLite database.
+
+    Existing entities with the same ids are overwritten
+
+    :param json_path: path to the JSON database file
+    :param database: SQLite database to copy entities into
+    :param collection_names: names of the collections to copy
+    :raises InvalidDatabaseFileError: if JSON file is not a valid database
+    """
+    with open(json_path, mode="r+", encoding="utf-8") as json_file:
+        json_database = JsonDatabase(json_file, collection_names)
+        database.apply_batch(
+            Mutation(collection_name, entity_dict["uuid"], entity_dict)
+            for collection_name in collection_names
+            for entity_dict in json_database.get_collection(collection_name)
+        )
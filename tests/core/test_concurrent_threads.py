@@ -0,0 +1,113 @@
+import os
+from threading import Barrier, Thread
+
+from pytest import fixture
+
+from core.factory import COLLECTION_NAMES, get_user_service, open_database
+from core.user_service import UsernameTakenException
+from persistence.json_database import JsonDatabase
+
+THREADS = 8
+MESSAGES_PER_THREAD = 20
+PASSWORD = "Pa$$word8123"
+
+
+@fixture(params=["cached_json", "json", "directory", "log", "sqlite"])
+def database(request, tmp_path):
+    if request.param == "directory":
+        path = str(tmp_path / "database")
+        os.makedirs(path)
+        database = open_database(path)
+    elif request.param == "log":
+        database = open_database(str(tmp_path / "database.log"))
+    elif request.param == "sqlite":
+        database = open_database(str(tmp_path / "database.sqlite"))
+    else:
+        path = str(tmp_path / "database.json")
+        with open(path, mode="w", encoding="utf-8") as db_file:
+            db_file.write('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}')
+        if request.param == "cached_json":
+            database = open_database(path)
+        else:
+            database = JsonDatabase(open(path, mode="r+", encoding="utf-8"), COLLECTION_NAMES)
+    yield database
+    database.close()
+
+
+def run_in_threads(target, count):
+    barrier = Barrier(count)
+    errors = []
+
+    def run(i):
+        barrier.wait()
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [Thread(target=run, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads), "threads deadlocked"
+    return errors
+
+
+def test_threads_sharing_service_lose_no_writes(database):
+    user_service = get_user_service(database)
+    user_service.register_new_user("sender", "sender@example.com", PASSWORD)
+    user_service.log_in_user("sender", PASSWORD)
+
+    def send_messages(i):
+        user_service.register_new_user(f"receiver {i}", f"receiver{i}@example.com", PASSWORD)
+        sender = user_service.get_current_user()
+        receiver, = user_service.get_users_by_username_fragment(f"receiver {i}")
+        for j in range(MESSAGES_PER_THREAD):
+            user_service.send_message(sender, receiver, f"{i} {j}")
+            assert len(user_service.get_messages(sender, receiver)) == j + 1
+
+    assert run_in_threads(send_messages, THREADS) == []
+
+    sender = user_service.get_current_user()
+    receivers = user_service.get_users_by_username_fragment("receiver")
+    assert len(receivers) == THREADS
+    texts = {
+        message.text
+        for receiver in receivers
+        for message in user_service.get_messages(sender, receiver)
+    }
+    assert texts == {f"{i} {j}" for i in range(THREADS) for j in range(MESSAGES_PER_THREAD)}
+
+
+def test_concurrent_registrations_take_username_once(database):
+    user_service = get_user_service(database)
+
+    def register(i):
+        user_service.register_new_user("same_name", f"user{i}@example.com", PASSWORD)
+
+    errors = run_in_threads(register, THREADS)
+    assert len(errors) == THREADS - 1
+    assert all(isinstance(error, UsernameTakenException) for error in errors)
+    assert len(database.get_collection("users")) == 1
+
+
+def test_transactions_mixed_with_reads_and_writes(database):
+    user_service = get_user_service(database)
+    user_service.register_new_user("writer", "writer@example.com", PASSWORD)
+    user_service.register_new_user("other", "other@example.com", PASSWORD)
+    user_service.log_in_user("writer", PASSWORD)
+
+    def run(i):
+        for j in range(MESSAGES_PER_THREAD):
+            if i % 3 == 0:
+                user_service.set_bio(user_service.get_current_user(), f"bio {j}")
+            elif i % 3 == 1:
+                assert len(user_service.get_users_by_username_fragment("er")) == 2
+            else:
+                other, = user_service.get_users_by_username_fragment("other")
+                with database.transaction():
+                    user_service.save_user(other)
+                    user_service.get_current_user()
+
+    assert run_in_threads(run, 6) == []
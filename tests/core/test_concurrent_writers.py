@@ -0,0 +1,58 @@
+import multiprocessing
+
+from pytest import importorskip, mark
+
+from core.factory import COLLECTION_NAMES, get_user_service, open_database
+from persistence.json_database import JsonDatabase
+
+importorskip("fcntl")
+
+PROCESSES = 4
+MESSAGES_PER_PROCESS = 25
+PASSWORD = "Pa$$word8123"
+
+
+def send_messages(database_path, cached, username, receiver_username, count):
+    if cached:
+        database = open_database(database_path)
+    else:
+        database = JsonDatabase(open(database_path, mode="r+", encoding="utf-8"), COLLECTION_NAMES)
+    user_service = get_user_service(database)
+    user_service.log_in_user(username, PASSWORD)
+    sender = user_service.get_current_user()
+    receiver, = user_service.get_users_by_username_fragment(receiver_username)
+    for i in range(count):
+        user_service.send_message(sender, receiver, f"{username} {i}")
+    database.close()
+
+
+@mark.parametrize("cached", [False, True])
+def test_processes_sending_messages_lose_no_writes(tmp_path, cached):
+    database_path = str(tmp_path / "database.json")
+    with open(database_path, mode="w", encoding="utf-8") as db_file:
+        db_file.write('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}')
+    database = open_database(database_path)
+    user_service = get_user_service(database)
+    usernames = [f"sender {i}" for i in range(PROCESSES)]
+    for username in usernames + ["receiver"]:
+        user_service.register_new_user(username, f"{username.replace(' ', '')}@example.com", PASSWORD)
+    database.close()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=send_messages,
+            args=(database_path, cached, username, "receiver", MESSAGES_PER_PROCESS)
+        )
+        for username in usernames
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    database = open_database(database_path)
+    texts = {message["text"] for message in database.get_collection("messages")}
+    database.close()
+    assert texts == {f"{username} {i}" for username in usernames for i in range(MESSAGES_PER_PROCESS)}
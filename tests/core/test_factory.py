@@ -1,6 +1,8 @@
+import os
 from io import StringIO
 
-from core.factory import get_user_service_default
+from core.factory import get_user_service_default, get_user_service, open_database, migrate_to_sqlite
+from persistence.file_lock import LOCK_FILE_SUFFIX
 
 
 class TestDefaultUserServiceFactory:
@@ -63,3 +65,132 @@ class TestDefaultUserServiceFactory:
         messages = user_service.get_messages(user_1, user_2)
         assert len(messages) == 1
         assert messages[0].text == "Hello!"
+
+    def test_default_services_on_one_file_see_changes_of_each_other(self, tmp_path):
+        path = tmp_path / "database.json"
+        path.write_text('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}', encoding="utf-8")
+        with open(path, mode="r+", encoding="utf-8") as file, open(path, mode="r+", encoding="utf-8") as other_file:
+            user_service = get_user_service_default(file)
+            other_service = get_user_service_default(other_file)
+            assert user_service.get_users_by_username_fragment("new user") == []
+            version = user_service.get_data_version()
+
+            other_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+
+            assert user_service.get_data_version() != version
+            assert user_service.log_in_user("new user", "Pa$$word8123")
+            user_service.set_bio(user_service.get_current_user(), "bio")
+            assert other_service.log_in_user("new user", "Pa$$word8123")
+            assert other_service.get_current_user().bio == "bio"
+
+    def test_unsaved_changes_of_current_user_not_shared(self):
+        database_file = StringIO('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}')
+        user_service = get_user_service_default(database_file, cached=True)
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        user_service.log_in_user("new user", "Pa$$word8123")
+
+        user = user_service.get_current_user()
+        user.bio = "unsaved"
+        user.friend_uuids.add("1904713e-885c-11ed-942c-00155d211f36")
+
+        assert user_service.get_current_user().bio is None
+        assert user_service.get_current_user().friend_uuids == set()
+
+    def test_create_cached(self):
+        database_file = StringIO('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}')
+        user_service = get_user_service_default(database_file, cached=True)
+
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        assert user_service.log_in_user("new user", "Pa$$word8123")
+        assert "new user" in database_file.getvalue()
+
+    def test_open_log_database(self, tmp_path):
+        database = open_database(str(tmp_path / "database.log"))
+        user_service = get_user_service(database)
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        database.close()
+
+        user_service = get_user_service(open_database(str(tmp_path / "database.log")))
+        assert user_service.log_in_user("new user", "Pa$$word8123")
+
+    def test_open_json_database_flushed_on_close(self, tmp_path):
+        path = tmp_path / "database.json"
+        path.write_text('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}', encoding="utf-8")
+        database = open_database(str(path))
+        user_service = get_user_service(database)
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        assert "new user" not in path.read_text(encoding="utf-8")
+        database.close()
+
+        user_service = get_user_service(open_database(str(path)))
+        assert user_service.log_in_user("new user", "Pa$$word8123")
+
+    def test_open_json_database_sees_changes_of_other_instance(self, tmp_path):
+        path = tmp_path / "database.json"
+        path.write_text('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}', encoding="utf-8")
+        database = open_database(str(path))
+        other = open_database(str(path))
+        assert database.watched
+
+        get_user_service(other).register_new_user("new user", "new@example.com", "Pa$$word8123")
+        other.close()
+        database.check_for_changes()
+        assert get_user_service(database).log_in_user("new user", "Pa$$word8123")
+        database.close()
+
+    def test_open_sqlite_database_sees_changes_of_other_instance(self, tmp_path):
+        path = str(tmp_path / "database.sqlite")
+        database = open_database(path)
+        other = open_database(path)
+        user_service = get_user_service(database)
+        other_service = get_user_service(other)
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        other_service.log_in_user("new user", "Pa$$word8123")
+        assert other_service.get_users_by_username_fragment("bobcat") == []
+
+        user_service.log_in_user("new user", "Pa$$word8123")
+        user_service.set_bio(user_service.get_current_user(), "bio")
+        user_service.register_new_user("bobcat", "bobcat@example.com", "Pa$$word8123")
+
+        assert other_service.get_current_user().bio == "bio"
+        assert [user.username for user in other_service.get_users_by_username_fragment("bobcat")] == ["bobcat"]
+        other.close()
+        database.close()
+
+    def test_open_directory_database(self, tmp_path):
+        directory = tmp_path / "database"
+        directory.mkdir()
+        database = open_database(str(directory))
+        user_service = get_user_service(database)
+        user_service.register_new_user("new user", "new@example.com", "Pa$$word8123")
+        database.close()
+
+        assert sorted(name for name in os.listdir(directory) if not name.endswith(LOCK_FILE_SUFFIX)) == ["users.json"]
+        user_service = get_user_service(open_database(str(directory)))
+        assert user_service.log_in_user("new user", "Pa$$word8123")
+
+    def test_open_directory_database_sees_changes_of_other_instance(self, tmp_path):
+        directory = tmp_path / "database"
+        directory.mkdir()
+        database = open_database(str(directory))
+        other = open_database(str(directory))
+        user_service = get_user_service(database)
+        assert not user_service.log_in_user("new user", "Pa$$word8123")
+
+        get_user_service(other).register_new_user("new user", "new@example.com", "Pa$$word8123")
+        other.close()
+        assert database.check_for_changes()
+        assert user_service.log_in_user("new user", "Pa$$word8123")
+        database.close()
+
+    def test_migrate_to_sqlite(self, tmp_path):
+        json_path = tmp_path / "database.json"
+        json_path.write_text('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}', encoding="utf-8")
+        database = open_database(str(json_path))
+        get_user_service(database).register_new_user("new user", "new@example.com", "Pa$$word8123")
+        database.close()
+
+        sqlite_path = str(tmp_path / "database.sqlite")
+        migrate_to_sqlite(str(json_path), sqlite_path)
+        user_service = get_user_service(open_database(sqlite_path))
+        assert user_service.log_in_user("new user", "Pa$$word8123")
@@ -1,9 +1,12 @@
+from copy import deepcopy
+from dataclasses import FrozenInstanceError
 from datetime import datetime
 from io import BytesIO
+from pickle import dumps, loads
 
 from pytest import raises
 
-from core.model import User, Message, FriendRequest, Photo
+from core.model import User, Message, FriendRequest, Photo, BytesBlob, create_trusted
 from core.validation import (
     IncorrectUuidError,
     IncorrectUsernameError,
@@ -29,7 +32,7 @@ class TestUser:
             salt="aaaaaaaaaa"
         )
 
-        assert user.friend_uuids == []
+        assert user.friend_uuids == set()
         assert user.profile_picture_id is None
         assert user.bio is None
 
@@ -91,11 +94,11 @@ class TestUser:
                 email="email@example.com",
                 password_hash="fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd",
                 salt="aaaaaaaaaa",
-                friend_uuids=[
+                friend_uuids={
                     "901d01ba-887e-11ed-b239-00155d211f36",
                     "incorrect uuid",
                     "9a2eca6c-887e-11ed-b239-00155d211f36"
-                ]
+                }
             )
 
     def test_incorrect_profile_picture_id(self):
@@ -116,7 +119,7 @@ class TestUser:
             email="email@example.com",
             password_hash="fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd",
             salt="aaaaaaaaaa",
-            friend_uuids=["9a154c0c-7bba-11ed-9b3d-00155df7f899"]
+            friend_uuids={"9a154c0c-7bba-11ed-9b3d-00155df7f899"}
         )
         user_2 = User(
             uuid="9a154c0c-7bba-11ed-9b3d-00155df7f899",
@@ -124,7 +127,7 @@ class TestUser:
             email="email2@example.com",
             password_hash="b5c90ac7dc4c828717699bc943bfeb54e6f682ca055bfc5591c8a471dfc0d794",
             salt="saltsaltsa",
-            friend_uuids=["c1a40f26-7ba9-11ed-9382-00155df7f899"]
+            friend_uuids={"c1a40f26-7ba9-11ed-9382-00155df7f899"}
         )
         assert user_1.is_friends_with(user_2)
         assert user_2.is_friends_with(user_1)
@@ -147,6 +150,12 @@ class TestUser:
         assert not user_1.is_friends_with(user_2)
         assert not user_2.is_friends_with(user_1)
 
+    def test_get_mutual_friend_uuids(self, user_1, user_2):
+        user_1.friend_uuids = {"47ea7d2c-7baa-11ed-9382-00155df7f899", "4d2845c6-7baa-11ed-9382-00155df7f899"}
+        user_2.friend_uuids = {"4d2845c6-7baa-11ed-9382-00155df7f899", "52a4f634-7baa-11ed-9382-00155df7f899"}
+        assert user_1.get_mutual_friend_uuids(user_2) == {"4d2845c6-7baa-11ed-9382-00155df7f899"}
+        assert user_2.get_mutual_friend_uuids(user_1) == {"4d2845c6-7baa-11ed-9382-00155df7f899"}
+
 
 class TestMessage:
 
@@ -310,3 +319,71 @@ class TestPhoto:
         assert photo.filename == "picture.jpg"
         assert photo.format == "jpg"
         assert photo.get_bytes() == b"deadbeef01234"
+
+    def test_get_buffer(self):
+        photo = Photo(
+            uuid="d9eaaf36-8874-11ed-942c-00155d211f36",
+            filename="photo.jpg",
+            format="jpg",
+            blob=BytesBlob(b"deadbeef01234")
+        )
+        assert isinstance(photo.get_buffer(), memoryview)
+        assert photo.get_buffer() == b"deadbeef01234"
+        assert photo.get_bytes() == b"deadbeef01234"
+
+
+class TestCreateTrusted:
+
+    def test_skips_validation(self):
+        user = create_trusted(
+            User,
+            uuid="invalid",
+            username="abc",
+            email="not an email",
+            password_hash="not a hash",
+            salt="salt"
+        )
+        assert user.uuid == "invalid"
+        assert user.username == "abc"
+
+    def test_default_values(self):
+        user = create_trusted(
+            User,
+            uuid="c1a40f26-7ba9-11ed-9382-00155df7f899",
+            username="user 1",
+            email="email@example.com",
+            password_hash="fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd",
+            salt="aaaaaaaaaa"
+        )
+        assert user.friend_uuids == set()
+        assert user.profile_picture_id is None
+        assert user.bio is None
+
+    def test_equal_to_validated(self, message_1):
+        message = create_trusted(
+            Message,
+            uuid=message_1.uuid,
+            text=message_1.text,
+            timestamp=message_1.timestamp,
+            from_user_id=message_1.from_user_id,
+            to_user_id=message_1.to_user_id
+        )
+        assert message == message_1
+
+
+class TestSlots:
+
+    def test_no_instance_dictionary(self, user_1, message_1, request_1, photo_1):
+        for entity in (user_1, message_1, request_1, photo_1):
+            assert not hasattr(entity, "__dict__")
+            with raises(AttributeError):
+                entity.unknown_attribute = "value"
+
+    def test_message_is_frozen(self, message_1):
+        with raises(FrozenInstanceError):
+            message_1.text = "changed"
+
+    def test_copy_and_pickle(self, user_1, message_1):
+        assert deepcopy(user_1) == user_1
+        assert deepcopy(message_1) == message_1
+        assert loads(dumps(message_1)) == message_1
@@ -2,9 +2,10 @@ from datetime import datetime
 
 from pytest import raises
 
-from core.model import User, Message, FriendRequest, Photo
+from core.model import User, Message, FriendRequest, Photo, BytesBlob
 from core.serializers import UserSerializer, RepresentationError, MessageSerializer, FriendRequestSerializer, \
     PhotoSerializer
+from core.validation import IncorrectUuidError
 
 
 class TestUserSerializer:
@@ -15,11 +16,11 @@ class TestUserSerializer:
             email="email@example.com",
             password_hash="fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd",
             salt="aaaaaaaaaa",
-            friend_uuids=[
+            friend_uuids={
                 "47ea7d2c-7baa-11ed-9382-00155df7f899",
                 "4d2845c6-7baa-11ed-9382-00155df7f899",
                 "52a4f634-7baa-11ed-9382-00155df7f899"
-            ],
+            },
             profile_picture_id="657bf91a-7baa-11ed-9382-00155df7f899",
             bio="This is my bio"
         )
@@ -63,6 +64,14 @@ class TestUserSerializer:
             "bio": None
         }
 
+    def test_to_json_friend_uuids_sorted(self, user_1):
+        user_1.friend_uuids = {"52a4f634-7baa-11ed-9382-00155df7f899", "47ea7d2c-7baa-11ed-9382-00155df7f899"}
+        user_json = UserSerializer().to_json(user_1)
+        assert user_json["friend_uuids"] == [
+            "47ea7d2c-7baa-11ed-9382-00155df7f899",
+            "52a4f634-7baa-11ed-9382-00155df7f899"
+        ]
+
     def test_from_json_all_fields(self):
         user_json = {
             "uuid": "c1a40f26-7ba9-11ed-9382-00155df7f899",
@@ -87,11 +96,11 @@ class TestUserSerializer:
             email="email@example.com",
             password_hash="fb99705459b651e7c37b0da74a53a23fe1920b91a0553eaacd9098a3fe4025cd",
             salt="aaaaaaaaaa",
-            friend_uuids=[
+            friend_uuids={
                 "47ea7d2c-7baa-11ed-9382-00155df7f899",
                 "4d2845c6-7baa-11ed-9382-00155df7f899",
                 "52a4f634-7baa-11ed-9382-00155df7f899"
-            ],
+            },
             profile_picture_id="657bf91a-7baa-11ed-9382-00155df7f899",
             bio="This is my bio"
         )
@@ -237,6 +246,15 @@ class TestPhotoSerializer:
             "binary_data_hex": "deadbeef0123456789"
         }
 
+    def test_to_json_blob(self):
+        photo = Photo(
+            uuid="2c23e9ae-8850-11ed-942c-00155d211f36",
+            filename="picture.jpg",
+            format="jpg",
+            blob=BytesBlob(bytes.fromhex("deadbeef0123456789"))
+        )
+        assert PhotoSerializer.to_json(photo)["binary_data_hex"] == "deadbeef0123456789"
+
     def test_from_json(self):
         photo_json = {
             "uuid": "2c23e9ae-8850-11ed-942c-00155d211f36",
@@ -260,3 +278,33 @@ class TestPhotoSerializer:
                 "ds;hfnlds": []
             })
 
+
+
+class TestTrustedDeserialization:
+
+    def test_user_untrusted_is_validated(self, user_1_json):
+        user_1_json["uuid"] = "invalid"
+        with raises(IncorrectUuidError):
+            UserSerializer.from_json(user_1_json)
+
+    def test_user_trusted_is_not_validated(self, user_1_json, user_1):
+        user = UserSerializer.from_json(user_1_json, trusted=True)
+        assert user == user_1
+
+        user_1_json["uuid"] = "invalid"
+        assert UserSerializer.from_json(user_1_json, trusted=True).uuid == "invalid"
+
+    def test_message_trusted(self, message_1_json, message_1):
+        assert MessageSerializer.from_json(message_1_json, trusted=True) == message_1
+
+    def test_friend_request_trusted(self, request_1_json, request_1):
+        assert FriendRequestSerializer.from_json(request_1_json, trusted=True) == request_1
+
+    def test_photo_trusted(self, photo_1_json, photo_1):
+        photo = PhotoSerializer.from_json(photo_1_json, trusted=True)
+        assert photo == photo_1
+        assert photo.blob is None
+
+    def test_trusted_invalid_representation(self):
+        with raises(RepresentationError):
+            UserSerializer.from_json({"uuid": "c1a40f26-7ba9-11ed-9382-00155df7f899"}, trusted=True)
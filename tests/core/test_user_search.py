@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+from pytest import fixture, raises
+
+from core.authentication import UnauthorizedError
+from core.identifiers import generate_uuid
+from core.model import User
+from core.user_search import InviteCandidateSearch
+
+
+@fixture
+def other_users(user_1):
+    return [
+        User(
+            uuid=generate_uuid(),
+            username=username,
+            email=f"other{i}@example.com",
+            password_hash=user_1.password_hash,
+            salt=user_1.salt
+        )
+        for i, username in enumerate(["anna", "annabel", "hanna", "joanna", "bobby"])
+    ]
+
+
+@fixture
+def all_users(user_1, user_2, user_3, other_users):
+    return sorted([user_1, user_2, user_3, *other_users], key=lambda user: user.username)
+
+
+@fixture
+def user_service(user_1, user_2, all_users, request_1):
+    def get_users_by_username_fragment(username_fragment, limit=None):
+        return [user for user in all_users if username_fragment in user.username][:limit]
+
+    user_1.friend_uuids = {user_2.uuid}
+    service = MagicMock()
+    service.get_current_user = MagicMock(return_value=user_1)
+    service.get_friend_requests_from = MagicMock(return_value=[request_1])
+    service.get_friend_requests_to = MagicMock(return_value=[])
+    service.get_users_by_username_fragment = MagicMock(side_effect=get_users_by_username_fragment)
+    service.get_data_version = MagicMock(return_value=(0, 0, 0, 0))
+    return service
+
+
+def usernames(users):
+    return [user.username for user in users]
+
+
+class TestInviteCandidateSearch:
+
+    def test_search_excludes_self_friends_and_invited(self, user_service):
+        search = InviteCandidateSearch(user_service)
+        assert search.search("user") == []
+        assert usernames(search.search("")) == ["anna", "annabel", "bobby", "hanna", "joanna"]
+
+    def test_search_excludes_users_who_sent_request(self, user_service, request_2, user_2):
+        user_service.get_current_user.return_value = user_2
+        user_service.get_friend_requests_from.return_value = []
+        user_service.get_friend_requests_to.return_value = [request_2]
+        found = InviteCandidateSearch(user_service).search("user")
+        assert usernames(found) == ["user 1"]
+
+    def test_extended_query_narrows_previous_result(self, user_service):
+        search = InviteCandidateSearch(user_service)
+        assert usernames(search.search("an")) == ["anna", "annabel", "hanna", "joanna"]
+        assert usernames(search.search("ann")) == ["anna", "annabel", "hanna", "joanna"]
+        assert usernames(search.search("anna")) == ["anna", "annabel", "hanna", "joanna"]
+        assert usernames(search.search("annab")) == ["annabel"]
+        user_service.get_users_by_username_fragment.assert_called_once()
+
+    def test_changed_query_searches_again(self, user_service):
+        search = InviteCandidateSearch(user_service)
+        search.search("anna")
+        assert usernames(search.search("bo")) == ["bobby"]
+        assert user_service.get_users_by_username_fragment.call_count == 2
+
+    def test_excluded_ids_collected_once(self, user_service):
+        search = InviteCandidateSearch(user_service)
+        search.search("anna")
+        search.search("bobby")
+        user_service.get_current_user.assert_called_once()
+        user_service.get_friend_requests_from.assert_called_once()
+        user_service.get_friend_requests_to.assert_called_once()
+
+    def test_limit(self, user_service):
+        search = InviteCandidateSearch(user_service, limit=2)
+        assert usernames(search.search("an")) == ["anna", "annabel"]
+
+    def test_truncated_result_not_narrowed(self, user_service):
+        search = InviteCandidateSearch(user_service, limit=1)
+        search.search("")
+        assert usernames(search.search("j")) == ["joanna"]
+        assert user_service.get_users_by_username_fragment.call_count == 2
+
+    def test_complete_result_narrowed_with_limit(self, user_service):
+        search = InviteCandidateSearch(user_service, limit=10)
+        search.search("")
+        assert usernames(search.search("j")) == ["joanna"]
+        user_service.get_users_by_username_fragment.assert_called_once()
+
+    def test_reset(self, user_service, user_1, other_users):
+        search = InviteCandidateSearch(user_service)
+        search.search("anna")
+        user_1.friend_uuids.add(other_users[0].uuid)
+        search.reset()
+        assert usernames(search.search("anna")) == ["annabel", "hanna", "joanna"]
+        assert user_service.get_users_by_username_fragment.call_count == 2
+
+    def test_reset_when_data_version_changes(self, user_service, user_1, other_users):
+        search = InviteCandidateSearch(user_service)
+        search.search("anna")
+        user_1.friend_uuids.add(other_users[0].uuid)
+        user_service.get_data_version.return_value = (1, 0, 0, 0)
+        assert usernames(search.search("anna")) == ["annabel", "hanna", "joanna"]
+        assert user_service.get_friend_requests_from.call_count == 2
+
+    def test_not_logged_in(self, user_service):
+        user_service.get_current_user.return_value = None
+        with raises(UnauthorizedError):
+            InviteCandidateSearch(user_service).search("anna")
@@ -1,4 +1,5 @@
 from copy import deepcopy
+from dataclasses import replace
 from datetime import datetime
 from unittest.mock import MagicMock
 
@@ -47,8 +48,12 @@ def user_repository(user_1, user_2, user_3):
         else:
             return None
 
+    def get_by_ids(user_ids):
+        return [user for user_id in user_ids if (user := get_by_id(user_id)) is not None]
+
     repository = MagicMock()
     repository.get_by_id = get_by_id
+    repository.get_by_ids = get_by_ids
     repository.get_by_username = get_by_username
     repository.get_by_email = get_by_email
     return repository
@@ -106,9 +111,21 @@ class TestUserService:
     def test_get_user_by_id(self, user_service, user_repository, user_1):
         assert user_service.get_user_by_id(user_1.uuid) == user_1
 
+    def test_get_data_version(self, user_service, user_repository, message_repository):
+        user_repository.version = 1
+        message_repository.version = 2
+        version = user_service.get_data_version()
+        assert user_service.get_data_version() == version
+        message_repository.version = 3
+        assert user_service.get_data_version() != version
+
     def test_get_users_by_username_fragment(self, user_service, user_repository):
         user_service.get_users_by_username_fragment("fragment")
-        user_repository.get_by_username_fragment.assert_called_once_with("fragment")
+        user_repository.get_by_username_fragment.assert_called_once_with("fragment", None)
+
+    def test_get_users_by_username_fragment_limit(self, user_service, user_repository):
+        user_service.get_users_by_username_fragment("fragment", 10)
+        user_repository.get_by_username_fragment.assert_called_once_with("fragment", 10)
 
     def test_register_new_user(self, user_service, user_repository):
         user_service.register_new_user("user2", "user2@example.com", "safepa$$worD123")
@@ -129,9 +146,8 @@ class TestUserService:
     def test_set_bio(self, user_service, user_repository, user_1):
         user_service.log_in_user(user_1.username, "password")
         user_service.set_bio(user_1, "Hello world")
-        expected = user_1
-        expected.bio = "Hello world"
-        user_repository.save.assert_called_once_with(expected)
+        user_repository.save.assert_called_once_with(replace(user_1, bio="Hello world"))
+        assert user_1.bio is None
 
     def test_set_bio_unauthorized(self, user_service, user_1):
         with raises(UnauthorizedError):
@@ -144,12 +160,12 @@ class TestUserService:
 
     def test_add_profile_picture(self, user_service, user_repository, photo_repository, user_1, photo_1):
         user_service.log_in_user(user_1.username, "password")
-        expected = user_1
-        expected.profile_picture_id = photo_1.uuid
+        expected = replace(user_1, profile_picture_id=photo_1.uuid)
 
         user_service.add_profile_picture(user_1, photo_1)
         user_repository.save.assert_called_once_with(expected)
         photo_repository.save.assert_called_once_with(photo_1)
+        user_repository.transaction.assert_called_once()
 
     def test_add_profile_picture_log_in_required(self, user_service, user_1, photo_1):
         with raises(UnauthorizedError):
@@ -158,7 +174,7 @@ class TestUserService:
     def test_add_profile_picture_deletes_previous(self, user_service, photo_repository, user_1, photo_1, photo_2):
         user_service.log_in_user(user_1.username, "password")
         user_service.add_profile_picture(user_1, photo_1)
-        user_service.add_profile_picture(user_1, photo_2)
+        user_service.add_profile_picture(replace(user_1, profile_picture_id=photo_1.uuid), photo_2)
         photo_repository.delete.assert_called_once_with(photo_1)
 
     def test_delete_photo(self, user_service, photo_repository, photo_1):
@@ -166,11 +182,15 @@ class TestUserService:
         photo_repository.delete.assert_called_once_with(photo_1)
 
     def test_get_friends(self, user_service, user_1, user_2, user_3):
-        user_1.friend_uuids = [user_2.uuid, user_3.uuid]
+        user_1.friend_uuids = {user_2.uuid, user_3.uuid}
         friends = user_service.get_friends(user_1)
         assert user_2 in friends
         assert user_3 in friends
 
+    def test_get_friends_skips_missing(self, user_service, user_1, user_2):
+        user_1.friend_uuids = {user_2.uuid, "b1c2e8a4-7ba9-11ed-9382-00155df7f899"}
+        assert user_service.get_friends(user_1) == [user_2]
+
     def test_send_message(self, user_service, message_repository, user_1, user_2):
         user_service.log_in_user(user_1.username, "password")
         user_service.send_message(user_1, user_2, "Hello")
@@ -211,16 +231,16 @@ class TestUserService:
         request = FriendRequest("22854a44-8893-11ed-b239-00155d211f36",
                                 datetime.now(), user_2.uuid, user_1.uuid)
         user_1_expected = deepcopy(user_1)
-        user_1_expected.friend_uuids = [user_2.uuid]
+        user_1_expected.friend_uuids = {user_2.uuid}
         user_2_expected = deepcopy(user_2)
-        user_2_expected.friend_uuids = [user_1.uuid]
+        user_2_expected.friend_uuids = {user_1.uuid}
         user_service.log_in_user(user_1.username, "password")
 
         user_service.accept_friend_request(request)
 
-        user_repository.save.assert_any_call(user_1_expected)
-        user_repository.save.assert_any_call(user_2_expected)
+        user_repository.save_many.assert_called_once_with([user_1_expected, user_2_expected])
         friend_request_repository.delete.assert_called_once_with(request)
+        user_repository.transaction.assert_called_once()
 
     def test_accept_friend_request_requires_log_in(self, user_service, user_1, user_2):
         request = FriendRequest("4b30d26a-8a05-11ed-8f81-00155d211d29",
@@ -251,3 +271,16 @@ class TestUserService:
     def test_get_messages_unauthorized(self, user_service, user_1, user_2):
         with raises(UnauthorizedError):
             user_service.get_messages(user_1, user_2)
+
+    def test_get_messages_page(self, user_service, message_repository, user_1, user_2):
+        user_service.log_in_user(user_1.username, "password")
+        before = datetime(2022, 12, 30, 19, 30)
+        user_service.get_messages_page(user_1, user_2, before=before, limit=10)
+        message_repository.get_messages_page.assert_called_once_with(user_1, user_2, before, 10)
+
+    def test_get_messages_page_unauthorized(self, user_service, user_1, user_2, user_3):
+        with raises(UnauthorizedError):
+            user_service.get_messages_page(user_1, user_2)
+        user_service.log_in_user(user_1.username, "password")
+        with raises(UnauthorizedError):
+            user_service.get_messages_page(user_2, user_3)
@@ -65,6 +65,11 @@ class TestIsHex:
     def test_is_not_hex(self):
         assert not is_hex("DEADBEEF")
         assert not is_hex("109756x")
+        assert not is_hex("dead beef")
+
+    def test_is_hex_empty_and_odd_length(self):
+        assert is_hex("")
+        assert is_hex("abc")
 
 
 class TestIsSalt:
@@ -76,6 +81,7 @@ class TestIsSalt:
         assert not is_salt("afgsASFmpNa")
         assert not is_salt("afgsASFmp")
         assert not is_salt("123;,afds0")
+        assert not is_salt("ąśćźżółęńą")
 
 
 class TestIsHash:
@@ -86,3 +92,4 @@ class TestIsHash:
     def test_is_not_hash(self):
         assert not is_hash("6fe6021f948f23a378d338e5aae048b05bbf2a796101e6e5b10cf15dd0917a2")
         assert not is_hash("gfe6021f948f23a378d338e5aae048b05bbf2a796101e6e5b10cf15dd0917a2a")
+        assert not is_hash("6FE6021F948F23A378D338E5AAE048B05BBF2A796101E6E5B10CF15DD0917A2A")
@@ -0,0 +1,43 @@
+from pytest import fixture, raises
+
+from persistence.blob_store import BlobStore, BlobDoesNotExistError
+
+
+@fixture
+def blob_store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+class TestBlobStore:
+
+    def test_put_and_get(self, blob_store):
+        blob_id = blob_store.put(b"binary data")
+        blob = blob_store.get(blob_id)
+        assert blob.blob_id == blob_id
+        assert bytes(blob.get_buffer()) == b"binary data"
+
+    def test_get_returns_memoryview(self, blob_store):
+        blob_id = blob_store.put(b"binary data")
+        buffer = blob_store.get(blob_id).get_buffer()
+        assert isinstance(buffer, memoryview)
+        assert buffer[:6] == b"binary"
+
+    def test_put_same_content_same_id(self, blob_store):
+        assert blob_store.put(b"binary data") == blob_store.put(memoryview(b"binary data"))
+        assert blob_store.put(b"binary data") != blob_store.put(b"other data")
+
+    def test_put_empty(self, blob_store):
+        blob_id = blob_store.put(b"")
+        assert bytes(blob_store.get(blob_id).get_buffer()) == b""
+
+    def test_get_does_not_exist(self, blob_store):
+        with raises(BlobDoesNotExistError):
+            blob_store.get("0" * 64)
+
+    def test_delete(self, blob_store):
+        blob_id = blob_store.put(b"binary data")
+        blob_store.delete(blob_id)
+        assert not blob_store.contains(blob_id)
+
+    def test_delete_does_not_exist(self, blob_store):
+        blob_store.delete("0" * 64)
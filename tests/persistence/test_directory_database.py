@@ -0,0 +1,233 @@
+import json
+import os
+
+from pytest import fixture, raises
+
+from persistence.directory_database import DirectoryDatabase
+from persistence.file_lock import LOCK_FILE_SUFFIX
+from persistence.interface import Mutation
+from persistence.base_database import CollectionDoesNotExistError, NoUuidError
+from persistence.json_database import InvalidDatabaseFileError
+
+
+@fixture
+def default_collection_names():
+    return ["users", "messages", "friend_requests", "photos"]
+
+
+@fixture
+def directory(tmp_path):
+    return str(tmp_path / "database")
+
+
+@fixture
+def entity_dict():
+    return {
+        "uuid": "691a3d52-883e-11ed-bff4-00155d211f36",
+        "username": "Test_User"
+    }
+
+
+@fixture
+def database(directory, default_collection_names):
+    database = DirectoryDatabase(directory, default_collection_names)
+    yield database
+    database.close()
+
+
+def read_collection_file(directory, collection_name):
+    with open(os.path.join(directory, collection_name + ".json"), encoding="utf-8") as collection_file:
+        return json.load(collection_file)[collection_name]
+
+
+class TestDirectoryDatabase:
+
+    def test_create_empty(self, database):
+        assert database.get_collection("users") == []
+        assert database.get_by_id("id1", "messages") is None
+
+    def test_save_and_get_by_id(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_save_writes_only_its_collection(self, database, directory, entity_dict):
+        database.save(entity_dict, "users")
+        assert read_collection_file(directory, "users") == {entity_dict["uuid"]: entity_dict}
+        assert [name for name in os.listdir(directory) if not name.endswith(LOCK_FILE_SUFFIX)] == ["users.json"]
+
+    def test_versions(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.save({"uuid": "message"}, "messages")
+        assert database.get_version("users") == 1
+        database.close()
+        assert database.get_version("users") == 1
+        database.delete_by_id(entity_dict["uuid"], "users")
+        assert database.get_version("users") == 2
+        assert database.get_collection_if_changed("users", 2) == (2, None)
+        assert database.get_collection_if_changed("users", 1) == (2, [])
+
+    def test_get_by_ids(self, database, entity_dict):
+        other = {"uuid": "other", "username": "other"}
+        database.save_collection([entity_dict, other], "users")
+        found = database.get_by_ids(["other", "missing", entity_dict["uuid"]], "users")
+        assert found == [other, entity_dict]
+
+    def test_save_entity_no_uuid(self, database):
+        with raises(NoUuidError):
+            database.save({"username": "my_username"}, "users")
+
+    def test_collection_does_not_exist(self, database, entity_dict):
+        with raises(CollectionDoesNotExistError):
+            database.save(entity_dict, "payments")
+        with raises(CollectionDoesNotExistError):
+            database.apply_batch([Mutation("payments", "id")])
+
+    def test_delete_entity(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.delete_by_id(entity_dict["uuid"], "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") is None
+
+    def test_save_collection(self, database, entity_dict):
+        database.save({"uuid": "other", "username": "other"}, "users")
+        database.save_collection([entity_dict], "users")
+        assert database.get_collection("users") == [entity_dict]
+
+    def test_find(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.save({"uuid": "other", "username": "other"}, "users")
+        assert database.find("users", {"username": entity_dict["username"]}) == [entity_dict]
+        assert [user["uuid"] for user in database.find("users", order_by="username")] == [entity_dict["uuid"], "other"]
+
+    def test_reopen(self, database, directory, default_collection_names, entity_dict):
+        database.save(entity_dict, "users")
+        database.close()
+
+        reopened = DirectoryDatabase(directory, default_collection_names)
+        assert reopened.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        reopened.close()
+
+    def test_corrupted_collection_verified_lazily(self, directory, default_collection_names, entity_dict):
+        os.makedirs(directory)
+        with open(os.path.join(directory, "photos.json"), mode="w", encoding="utf-8") as photos_file:
+            photos_file.write("not a json")
+
+        database = DirectoryDatabase(directory, default_collection_names)
+        database.save(entity_dict, "users")
+        with raises(InvalidDatabaseFileError):
+            database.get_collection("photos")
+        database.close()
+
+    def test_apply_batch(self, database, directory, entity_dict):
+        database.save({"uuid": "to_delete"}, "messages")
+
+        database.apply_batch([
+            Mutation("users", entity_dict["uuid"], entity_dict),
+            Mutation("messages", "to_delete")
+        ])
+
+        assert read_collection_file(directory, "users") == {entity_dict["uuid"]: entity_dict}
+        assert read_collection_file(directory, "messages") == {}
+
+    def test_apply_batch_invalid_mutation_applies_nothing(self, database, entity_dict):
+        with raises(NoUuidError):
+            database.apply_batch([
+                Mutation("users", entity_dict["uuid"], entity_dict),
+                Mutation("messages", "id", {"text": "no uuid"})
+            ])
+        assert database.get_collection("users") == []
+
+    def test_transaction(self, database, directory, entity_dict):
+        database.get_collection("users")
+        with database.transaction():
+            database.save(entity_dict, "users")
+            database.save({"uuid": "message"}, "messages")
+            assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+            assert read_collection_file(directory, "users") == {}
+
+        assert read_collection_file(directory, "users") == {entity_dict["uuid"]: entity_dict}
+        assert read_collection_file(directory, "messages") == {"message": {"uuid": "message"}}
+
+    def test_transaction_discarded_on_exception(self, database, entity_dict):
+        database.get_collection("users")
+        with raises(ValueError):
+            with database.transaction():
+                database.save(entity_dict, "users")
+                database.save({"uuid": "message"}, "messages")
+                raise ValueError()
+
+        assert database.get_collection("users") == []
+        assert database.get_collection("messages") == []
+
+    def test_call_after_commit(self, database, entity_dict):
+        calls = []
+        with database.transaction():
+            database.save(entity_dict, "users")
+            database.call_after_commit(lambda: calls.append(database.get_collection("users")))
+            assert calls == []
+        assert calls == [[entity_dict]]
+
+        with raises(ValueError):
+            with database.transaction():
+                database.call_after_commit(lambda: calls.append(None))
+                raise ValueError()
+        assert len(calls) == 1
+
+        database.call_after_commit(lambda: calls.append(None))
+        assert len(calls) == 2
+
+    def test_deferred_writes(self, directory, default_collection_names, entity_dict):
+        database = DirectoryDatabase(directory, default_collection_names, cached=True, flush_every=100)
+        database.save(entity_dict, "users")
+        assert read_collection_file(directory, "users") == {}
+        database.flush()
+        assert read_collection_file(directory, "users") == {entity_dict["uuid"]: entity_dict}
+        database.close()
+
+    def test_deferred_writes_require_cached_mode(self, directory, default_collection_names):
+        with raises(ValueError):
+            DirectoryDatabase(directory, default_collection_names, flush_every=100)
+
+    def test_transaction_completed_from_journal_if_file_write_fails(self, database, directory, entity_dict,
+                                                                    monkeypatch):
+        replace = os.replace
+        failures = []
+
+        def replace_failing_once(source, destination):
+            if destination.endswith("messages.json") and not failures:
+                failures.append(destination)
+                raise OSError("Disk full")
+            replace(source, destination)
+
+        monkeypatch.setattr(os, "replace", replace_failing_once)
+        with database.transaction():
+            database.save(entity_dict, "users")
+            database.save({"uuid": "message"}, "messages")
+
+        assert failures
+        assert read_collection_file(directory, "users") == {entity_dict["uuid"]: entity_dict}
+        assert read_collection_file(directory, "messages") == {"message": {"uuid": "message"}}
+        assert not os.path.exists(os.path.join(directory, "transaction.journal"))
+
+    def test_transaction_completed_from_journal_when_reopened(self, directory, default_collection_names,
+                                                              entity_dict, monkeypatch):
+        replace = os.replace
+
+        def replace_failing(source, destination):
+            if destination.endswith("messages.json"):
+                raise OSError("Disk full")
+            replace(source, destination)
+
+        database = DirectoryDatabase(directory, default_collection_names)
+        monkeypatch.setattr(os, "replace", replace_failing)
+        with raises(OSError):
+            with database.transaction():
+                database.save(entity_dict, "users")
+                database.save({"uuid": "message"}, "messages")
+        database.close()
+        monkeypatch.setattr(os, "replace", replace)
+
+        database = DirectoryDatabase(directory, default_collection_names)
+        assert database.get_collection("users") == [entity_dict]
+        assert database.get_collection("messages") == [{"uuid": "message"}]
+        assert not os.path.exists(os.path.join(directory, "transaction.journal"))
+        database.close()
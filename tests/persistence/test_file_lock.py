@@ -0,0 +1,62 @@
+from threading import Event, Thread
+
+from pytest import fixture, importorskip
+
+from persistence.file_lock import FileLock
+
+importorskip("fcntl")
+
+
+@fixture
+def file_lock(tmp_path):
+    return FileLock(str(tmp_path / "database.json"))
+
+
+def acquire_in_thread(lock_context):
+    acquired = Event()
+
+    def acquire():
+        with lock_context():
+            acquired.set()
+
+    thread = Thread(target=acquire)
+    thread.start()
+    return thread, acquired
+
+
+class TestFileLock:
+
+    def test_lock_file_created(self, file_lock, tmp_path):
+        with file_lock.shared():
+            pass
+        assert file_lock.lock_path == str(tmp_path / "database.json.lock")
+        assert (tmp_path / "database.json.lock").exists()
+
+    def test_shared_locks_held_together(self, file_lock):
+        with file_lock.shared():
+            thread, acquired = acquire_in_thread(file_lock.shared)
+            assert acquired.wait(5)
+        thread.join()
+
+    def test_exclusive_lock_blocks_shared(self, file_lock):
+        with file_lock.exclusive():
+            thread, acquired = acquire_in_thread(file_lock.shared)
+            assert not acquired.wait(0.1)
+        assert acquired.wait(5)
+        thread.join()
+
+    def test_shared_lock_blocks_exclusive(self, file_lock):
+        with file_lock.shared():
+            thread, acquired = acquire_in_thread(file_lock.exclusive)
+            assert not acquired.wait(0.1)
+        assert acquired.wait(5)
+        thread.join()
+
+    def test_acquire_exclusive_held_until_released(self, file_lock, tmp_path):
+        other = FileLock(str(tmp_path / "database.json"))
+        assert file_lock.acquire_exclusive(blocking=False)
+        assert not other.acquire_exclusive(blocking=False)
+        file_lock.release()
+        assert other.acquire_exclusive(blocking=False)
+        other.release()
+        other.release()
@@ -0,0 +1,70 @@
+import time
+from unittest.mock import MagicMock
+
+from pytest import fixture, raises
+
+from persistence.file_watcher import FileWatcher
+
+
+@fixture
+def watched_path(tmp_path):
+    path = tmp_path / "watched.json"
+    path.write_text("{}", encoding="utf-8")
+    return path
+
+
+class TestFileWatcher:
+
+    def test_unchanged_file(self, watched_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change)
+        assert not watcher.check()
+        on_change.assert_not_called()
+
+    def test_changed_file(self, watched_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change)
+        watched_path.write_text('{"users": {}}', encoding="utf-8")
+        assert watcher.check()
+        assert not watcher.check()
+        on_change.assert_called_once()
+
+    def test_replaced_file(self, watched_path, tmp_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change)
+        replacement = tmp_path / "replacement.json"
+        replacement.write_text("{}", encoding="utf-8")
+        replacement.replace(watched_path)
+        assert watcher.check()
+
+    def test_deleted_file(self, watched_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change)
+        watched_path.unlink()
+        assert watcher.check()
+        assert not watcher.check()
+
+    def test_acknowledged_change(self, watched_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change)
+        watched_path.write_text('{"users": {}}', encoding="utf-8")
+        watcher.acknowledge()
+        assert not watcher.check()
+        on_change.assert_not_called()
+
+    def test_interval_must_be_positive(self, watched_path):
+        with raises(ValueError):
+            FileWatcher(str(watched_path), MagicMock(), interval_ms=0)
+
+    def test_background_thread(self, watched_path):
+        on_change = MagicMock()
+        watcher = FileWatcher(str(watched_path), on_change, interval_ms=10)
+        watcher.start()
+        assert watcher.running
+        watched_path.write_text('{"users": {}}', encoding="utf-8")
+        deadline = time.monotonic() + 5
+        while not on_change.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        watcher.stop()
+        assert not watcher.running
+        on_change.assert_called_once()
@@ -0,0 +1,64 @@
+from pytest import raises
+
+from persistence.identity_map import IdentityMap
+
+
+class TestIdentityMap:
+
+    def test_put_and_get(self):
+        identity_map = IdentityMap(2)
+        entity = object()
+        identity_map.put("1", entity)
+        assert identity_map.get("1") is entity
+        assert identity_map.get("2") is None
+
+    def test_evicts_least_recently_used(self):
+        identity_map = IdentityMap(2)
+        identity_map.put("1", "one")
+        identity_map.put("2", "two")
+        identity_map.get("1")
+        identity_map.put("3", "three")
+        assert identity_map.get("2") is None
+        assert identity_map.get("1") == "one"
+        assert identity_map.get("3") == "three"
+        assert len(identity_map) == 2
+
+    def test_put_replaces_entity(self):
+        identity_map = IdentityMap(2)
+        identity_map.put("1", "old")
+        identity_map.put("1", "new")
+        assert identity_map.get("1") == "new"
+        assert len(identity_map) == 1
+
+    def test_discard(self):
+        identity_map = IdentityMap(2)
+        identity_map.put("1", "one")
+        identity_map.discard("1")
+        identity_map.discard("not kept")
+        assert identity_map.get("1") is None
+
+    def test_clear(self):
+        identity_map = IdentityMap(2)
+        identity_map.put("1", "one")
+        identity_map.clear()
+        assert len(identity_map) == 0
+
+    def test_zero_capacity_keeps_nothing(self):
+        identity_map = IdentityMap(0)
+        identity_map.put("1", "one")
+        assert identity_map.get("1") is None
+
+    def test_negative_capacity(self):
+        with raises(ValueError):
+            IdentityMap(-1)
+
+    def test_put_if_absent(self):
+        identity_map = IdentityMap(2)
+        assert identity_map.put_if_absent("1", "one") == "one"
+        assert identity_map.put_if_absent("1", "other") == "one"
+        assert identity_map.get("1") == "one"
+
+    def test_put_if_absent_when_disabled(self):
+        identity_map = IdentityMap(0)
+        assert identity_map.put_if_absent("1", "one") == "one"
+        assert len(identity_map) == 0
@@ -0,0 +1,179 @@
+from pytest import raises
+
+from persistence.indexes import HashIndex, ConversationIndex, TrigramIndex
+
+
+class TestHashIndex:
+
+    def test_get(self):
+        index = HashIndex("username")
+        index.add({"uuid": "1", "username": "user"})
+        index.add({"uuid": "2", "username": "user"})
+        index.add({"uuid": "3", "username": "other"})
+        assert index.get("user") == {"1", "2"}
+        assert index.get("other") == {"3"}
+
+    def test_get_not_indexed(self):
+        assert HashIndex("username").get("user") == set()
+
+    def test_add_replaces_previous_value(self):
+        index = HashIndex("username")
+        index.add({"uuid": "1", "username": "old"})
+        index.add({"uuid": "1", "username": "new"})
+        assert index.get("old") == set()
+        assert index.get("new") == {"1"}
+
+    def test_remove(self):
+        index = HashIndex("username")
+        index.add({"uuid": "1", "username": "user"})
+        index.add({"uuid": "2", "username": "user"})
+        index.remove("1")
+        assert index.get("user") == {"2"}
+
+    def test_remove_not_indexed(self):
+        HashIndex("username").remove("1")
+
+    def test_clear(self):
+        index = HashIndex("username")
+        index.add({"uuid": "1", "username": "user"})
+        index.clear()
+        assert index.get("user") == set()
+
+
+def message_json(uuid, timestamp, from_user_id="a", to_user_id="b"):
+    return {
+        "uuid": uuid,
+        "timestamp": timestamp,
+        "from_user_id": from_user_id,
+        "to_user_id": to_user_id
+    }
+
+
+class TestConversationIndex:
+
+    def test_get_sorted_by_timestamp(self):
+        index = ConversationIndex()
+        second = message_json("2", "2022-12-30T19:45:00", "b", "a")
+        first = message_json("1", "2022-12-30T19:30:00")
+        third = message_json("3", "2022-12-30T19:45:00.500000")
+        index.add(second)
+        index.add(third)
+        index.add(first)
+        assert index.get("a", "b") == [first, second, third]
+
+    def test_order_of_users_does_not_matter(self):
+        index = ConversationIndex()
+        index.add(message_json("1", "2022-12-30T19:30:00"))
+        assert index.get("a", "b") == index.get("b", "a")
+
+    def test_conversations_are_separate(self):
+        index = ConversationIndex()
+        message = message_json("1", "2022-12-30T19:30:00")
+        index.add(message)
+        index.add(message_json("2", "2022-12-30T19:30:00", "a", "c"))
+        assert index.get("a", "b") == [message]
+        assert index.get("b", "c") == []
+
+    def test_add_replaces_previous_entry(self):
+        index = ConversationIndex()
+        index.add(message_json("1", "2022-12-30T19:30:00"))
+        updated = message_json("1", "2022-12-30T19:30:00", "a", "c")
+        index.add(updated)
+        assert index.get("a", "b") == []
+        assert index.get("a", "c") == [updated]
+
+    def test_remove(self):
+        index = ConversationIndex()
+        first = message_json("1", "2022-12-30T19:30:00")
+        index.add(first)
+        index.add(message_json("2", "2022-12-30T19:45:00"))
+        index.remove("2")
+        index.remove("does_not_exist")
+        assert index.get("a", "b") == [first]
+
+    def test_get_page_newest_first_page(self):
+        index = ConversationIndex()
+        messages = [message_json(str(i), f"2022-12-30T19:3{i}:00") for i in range(5)]
+        for message in messages:
+            index.add(message)
+        assert index.get_page("a", "b", None, 2) == (messages[3:], True)
+
+    def test_get_page_before(self):
+        index = ConversationIndex()
+        messages = [message_json(str(i), f"2022-12-30T19:3{i}:00") for i in range(5)]
+        for message in messages:
+            index.add(message)
+        assert index.get_page("a", "b", "2022-12-30T19:33:00", 2) == (messages[1:3], True)
+        assert index.get_page("a", "b", "2022-12-30T19:31:00", 2) == (messages[:1], False)
+
+    def test_get_page_does_not_split_equal_timestamps(self):
+        index = ConversationIndex()
+        first = message_json("1", "2022-12-30T19:30:00")
+        second = message_json("2", "2022-12-30T19:30:00")
+        third = message_json("3", "2022-12-30T19:31:00")
+        for message in (first, second, third):
+            index.add(message)
+        assert index.get_page("a", "b", None, 2) == ([first, second, third], False)
+
+    def test_get_page_empty(self):
+        assert ConversationIndex().get_page("a", "b", None, 10) == ([], False)
+
+    def test_get_page_limit_not_positive(self):
+        index = ConversationIndex()
+        index.add(message_json("1", "2022-12-30T19:30:00"))
+        for limit in (0, -1):
+            with raises(ValueError):
+                index.get_page("a", "b", None, limit)
+
+
+class TestTrigramIndex:
+
+    def test_search(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "kowalski"})
+        index.add({"uuid": "2", "username": "nowak"})
+        index.add({"uuid": "3", "username": "walczak"})
+        assert index.search("wal") == ["1", "3"]
+        assert index.search("owa") == ["1", "2"]
+        assert index.search("kowalski") == ["1"]
+        assert index.search("xyz") == []
+
+    def test_search_verifies_candidates(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "abcxbcd"})
+        assert index.search("abcd") == []
+
+    def test_search_short_fragment(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "bob"})
+        index.add({"uuid": "2", "username": "alice"})
+        assert index.search("b") == ["1"]
+        assert index.search("") == ["2", "1"]
+
+    def test_search_limit(self):
+        index = TrigramIndex("username")
+        for i in range(10):
+            index.add({"uuid": str(i), "username": f"user{9 - i}"})
+        assert index.search("user", limit=3) == ["9", "8", "7"]
+
+    def test_add_replaces_previous_value(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "old_name"})
+        index.add({"uuid": "1", "username": "new_name"})
+        assert index.search("old") == []
+        assert index.search("new") == ["1"]
+
+    def test_remove(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "user"})
+        index.add({"uuid": "2", "username": "user"})
+        index.remove("1")
+        index.remove("not indexed")
+        assert index.search("user") == ["2"]
+
+    def test_clear(self):
+        index = TrigramIndex("username")
+        index.add({"uuid": "1", "username": "user"})
+        index.clear()
+        assert index.search("use") == []
+        assert index.search("u") == []
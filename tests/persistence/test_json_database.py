@@ -1,8 +1,14 @@
+import json
+import os
+import time
 from io import StringIO
+from unittest.mock import MagicMock
 
-from pytest import fixture, raises
+from pytest import fixture, mark, raises
 
-from persistence.json_database import JsonDatabase, InvalidDatabaseFileError, CollectionDoesNotExistError, NoUuidError
+from persistence.interface import Mutation
+from persistence.base_database import CollectionDoesNotExistError, NoUuidError
+from persistence.json_database import JsonDatabase, InvalidDatabaseFileError
 
 
 @fixture
@@ -103,6 +109,40 @@ class TestJsonDatabase:
         entity_fict_from_db = empty_database.get_by_id(entity_dict["uuid"], "users")
         assert entity_fict_from_db == entity_dict
 
+    def test_versions(self, empty_database, entity_dict):
+        assert empty_database.get_version("users") == 0
+        empty_database.save(entity_dict, "users")
+        empty_database.delete_by_id(entity_dict["uuid"], "users")
+        assert empty_database.get_version("users") == 2
+        assert empty_database.get_version("messages") == 0
+        with raises(ValueError):
+            with empty_database.transaction():
+                empty_database.save(entity_dict, "users")
+                raise ValueError()
+        assert empty_database.get_version("users") == 4
+        with raises(CollectionDoesNotExistError):
+            empty_database.get_version("payments")
+
+    def test_transaction_increases_version_once_per_change(self, empty_database, entity_dict):
+        with empty_database.transaction():
+            empty_database.save(entity_dict, "users")
+        assert empty_database.get_version("users") == 1
+
+    def test_get_collection_if_changed(self, empty_database, entity_dict):
+        assert empty_database.get_collection_if_changed("users", -1) == (0, [])
+        assert empty_database.get_collection_if_changed("users", 0) == (0, None)
+        empty_database.save(entity_dict, "users")
+        assert empty_database.get_collection_if_changed("users", 0) == (1, [entity_dict])
+        assert empty_database.get_collection_if_changed("messages", 0) == (0, None)
+
+    def test_get_by_ids(self, empty_database, entity_dict):
+        other = {"uuid": "other", "username": "other"}
+        empty_database.save_collection([entity_dict, other], "users")
+        found = empty_database.get_by_ids(["other", "missing", entity_dict["uuid"]], "users")
+        assert found == [other, entity_dict]
+        with raises(CollectionDoesNotExistError):
+            empty_database.get_by_ids(["other"], "payments")
+
     def test_save_entity_no_uuid(self, empty_database):
         entity_dict = {"username": "my_username"}
         with raises(NoUuidError):
@@ -199,3 +239,445 @@ class TestJsonDatabase:
 
         empty_database.save_collection([], "users")
         assert empty_database.get_collection("users") == []
+
+    def test_find(self, empty_database):
+        empty_database.save_collection([
+            {"uuid": "r1", "to_user_id": "a", "timestamp": "2023-01-01T10:00:00"},
+            {"uuid": "r2", "to_user_id": "b", "timestamp": "2023-01-01T09:00:00"},
+            {"uuid": "r3", "to_user_id": "a", "timestamp": "2023-01-01T08:00:00"},
+            {"uuid": "r4", "to_user_id": "a", "timestamp": "2023-01-01T11:00:00"}
+        ], "friend_requests")
+
+        def find_ids(*args, **kwargs):
+            return [entity["uuid"] for entity in empty_database.find("friend_requests", *args, **kwargs)]
+
+        assert sorted(find_ids()) == ["r1", "r2", "r3", "r4"]
+        assert sorted(find_ids({"to_user_id": "a"})) == ["r1", "r3", "r4"]
+        assert find_ids({"to_user_id": "a"}, order_by="timestamp") == ["r3", "r1", "r4"]
+        assert find_ids({"to_user_id": "a"}, order_by="-timestamp", limit=2) == ["r4", "r1"]
+        assert find_ids(order_by="timestamp", limit=1) == ["r3"]
+        assert len(find_ids(limit=2)) == 2
+        assert find_ids({"to_user_id": "c"}) == []
+
+    def test_find_before(self, empty_database):
+        empty_database.save_collection([
+            {"uuid": "r1", "to_user_id": "a", "timestamp": "2023-01-01T10:00:00"},
+            {"uuid": "r2", "to_user_id": "b", "timestamp": "2023-01-01T09:00:00"},
+            {"uuid": "r3", "to_user_id": "a", "timestamp": "2023-01-01T08:00:00"},
+            {"uuid": "r4", "to_user_id": "a", "timestamp": "2023-01-01T11:00:00"}
+        ], "friend_requests")
+
+        def find_ids(*args):
+            return [entity["uuid"] for entity in empty_database.find_before("friend_requests", *args)]
+
+        assert find_ids(None, "timestamp", None, 10) == ["r4", "r1", "r2", "r3"]
+        assert find_ids({"to_user_id": "a"}, "timestamp", "2023-01-01T11:00:00", 10) == ["r1", "r3"]
+        assert find_ids({"to_user_id": "a"}, "timestamp", "2023-01-01T11:00:00", 1) == ["r1"]
+        assert find_ids({"to_user_id": "b"}, "timestamp", "2023-01-01T09:00:00", 10) == []
+
+    def test_find_collection_does_not_exist(self, empty_database):
+        with raises(CollectionDoesNotExistError):
+            empty_database.find("payments")
+
+    def test_apply_batch(self, empty_database, entity_dict):
+        message = {"uuid": "3621917a-8843-11ed-bff4-00155d211f36", "text": "Hi"}
+        empty_database.save(message, "messages")
+
+        empty_database.apply_batch([
+            Mutation("users", entity_dict["uuid"], entity_dict),
+            Mutation("messages", message["uuid"]),
+            Mutation("messages", "does_not_exist")
+        ])
+
+        assert empty_database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert empty_database.get_collection("messages") == []
+
+    def test_apply_batch_invalid_mutation_applies_nothing(self, empty_database, entity_dict):
+        with raises(CollectionDoesNotExistError):
+            empty_database.apply_batch([
+                Mutation("users", entity_dict["uuid"], entity_dict),
+                Mutation("payments", "id")
+            ])
+        with raises(NoUuidError):
+            empty_database.apply_batch([
+                Mutation("users", entity_dict["uuid"], entity_dict),
+                Mutation("users", "id", {"username": "no_uuid"})
+            ])
+        assert empty_database.get_collection("users") == []
+
+    def test_transaction_writes_on_exit(self, empty_database_file, empty_database, entity_dict):
+        with empty_database.transaction():
+            empty_database.save(entity_dict, "users")
+            empty_database.save({"uuid": "3621917a-8843-11ed-bff4-00155d211f36"}, "messages")
+            assert empty_database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+            assert entity_dict["uuid"] not in empty_database_file.getvalue()
+
+        assert entity_dict["uuid"] in empty_database_file.getvalue()
+        assert len(empty_database.get_collection("messages")) == 1
+
+    def test_transaction_discarded_on_exception(self, empty_database_file, empty_database, entity_dict):
+        with raises(ValueError):
+            with empty_database.transaction():
+                empty_database.save(entity_dict, "users")
+                raise ValueError()
+
+        assert empty_database.get_by_id(entity_dict["uuid"], "users") is None
+        assert entity_dict["uuid"] not in empty_database_file.getvalue()
+
+    def test_call_after_commit(self, empty_database, entity_dict):
+        calls = []
+        with empty_database.transaction():
+            empty_database.save(entity_dict, "users")
+            empty_database.call_after_commit(lambda: calls.append(empty_database.get_collection("users")))
+            assert calls == []
+        assert calls == [[entity_dict]]
+
+        with raises(ValueError):
+            with empty_database.transaction():
+                empty_database.call_after_commit(lambda: calls.append(None))
+                raise ValueError()
+        assert len(calls) == 1
+
+        empty_database.call_after_commit(lambda: calls.append(None))
+        assert len(calls) == 2
+
+    def test_nested_transaction_is_part_of_outer(self, empty_database_file, empty_database, entity_dict):
+        with empty_database.transaction():
+            with empty_database.transaction():
+                empty_database.save(entity_dict, "users")
+            assert entity_dict["uuid"] not in empty_database_file.getvalue()
+
+        assert entity_dict["uuid"] in empty_database_file.getvalue()
+
+
+@fixture
+def cached_database(empty_database_file, default_collection_names):
+    return JsonDatabase(empty_database_file, default_collection_names, cached=True)
+
+
+class TestCachedJsonDatabase:
+
+    def test_save_and_get_by_id(self, cached_database, entity_dict):
+        cached_database.save(entity_dict, "users")
+        assert cached_database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_writes_through_to_file(self, empty_database_file, cached_database, entity_dict):
+        cached_database.save(entity_dict, "users")
+        database = JsonDatabase(empty_database_file, ["users"])
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_delete_writes_through_to_file(self, empty_database_file, cached_database, entity_dict):
+        cached_database.save(entity_dict, "users")
+        cached_database.delete_by_id(entity_dict["uuid"], "users")
+        database = JsonDatabase(empty_database_file, ["users"])
+        assert database.get_collection("users") == []
+
+    def test_reads_served_from_memory(self, empty_database_file, cached_database, entity_dict):
+        other = JsonDatabase(empty_database_file, ["users"])
+        other.save(entity_dict, "users")
+        assert cached_database.get_by_id(entity_dict["uuid"], "users") is None
+
+    def test_reload(self, empty_database_file, cached_database, entity_dict):
+        other = JsonDatabase(empty_database_file, ["users"])
+        other.save(entity_dict, "users")
+        cached_database.reload()
+        assert cached_database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_saved_dict_is_copied(self, cached_database, entity_dict):
+        cached_database.save(entity_dict, "users")
+        entity_dict["username"] = "changed"
+        assert cached_database.get_by_id(entity_dict["uuid"], "users")["username"] == "Test_User"
+
+    def test_transaction_discarded_on_exception(self, cached_database, entity_dict):
+        with raises(ValueError):
+            with cached_database.transaction():
+                cached_database.save(entity_dict, "users")
+                raise ValueError()
+
+        assert cached_database.get_by_id(entity_dict["uuid"], "users") is None
+
+
+def saved_collection(db_file, collection_name):
+    return json.loads(db_file.getvalue())[collection_name]
+
+
+class TestDeferredFlush:
+
+    def test_deferred_writes_require_cached_mode(self, empty_database_file, default_collection_names):
+        with raises(ValueError):
+            JsonDatabase(empty_database_file, default_collection_names, flush_every=10)
+
+    def test_flush_every_n_mutations(self, empty_database_file, default_collection_names, entity_dict):
+        database = JsonDatabase(empty_database_file, default_collection_names, cached=True, flush_every=3)
+        database.save(entity_dict, "users")
+        database.save({"uuid": "3621917a-8843-11ed-bff4-00155d211f36"}, "messages")
+        assert saved_collection(empty_database_file, "users") == {}
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert database.dirty_collections == {"users", "messages"}
+
+        database.delete_by_id("3621917a-8843-11ed-bff4-00155d211f36", "messages")
+        assert saved_collection(empty_database_file, "users") == {entity_dict["uuid"]: entity_dict}
+        assert database.dirty_collections == set()
+        database.close()
+
+    def test_explicit_flush(self, empty_database_file, default_collection_names, entity_dict):
+        database = JsonDatabase(empty_database_file, default_collection_names, cached=True, flush_every=100)
+        database.save(entity_dict, "users")
+        database.flush()
+        assert saved_collection(empty_database_file, "users") == {entity_dict["uuid"]: entity_dict}
+        database.close()
+
+    def test_flush_without_changes_does_not_write(self, empty_database_file, default_collection_names):
+        database = JsonDatabase(empty_database_file, default_collection_names, cached=True, flush_every=100)
+        empty_database_file.write = None
+        database.flush()
+
+    def test_flush_after_interval(self, empty_database_file, default_collection_names, entity_dict):
+        database = JsonDatabase(empty_database_file, default_collection_names, cached=True,
+                                flush_every=100, flush_interval_ms=10)
+        database.save(entity_dict, "users")
+        deadline = time.monotonic() + 5
+        while database.dirty_collections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert saved_collection(empty_database_file, "users") == {entity_dict["uuid"]: entity_dict}
+        database.close()
+
+    def test_close_flushes(self, database_path, default_collection_names, entity_dict):
+        db_file = open(database_path, mode="r+", encoding="utf-8")
+        database = JsonDatabase(db_file, default_collection_names, cached=True, flush_every=100)
+        database.save(entity_dict, "users")
+        database.close()
+        with open(database_path, encoding="utf-8") as db_file:
+            assert json.load(db_file)["users"] == {entity_dict["uuid"]: entity_dict}
+
+    def test_reload_discards_unflushed_changes(self, empty_database_file, default_collection_names, entity_dict):
+        database = JsonDatabase(empty_database_file, default_collection_names, cached=True, flush_every=100)
+        database.save(entity_dict, "users")
+        database.reload()
+        assert database.get_by_id(entity_dict["uuid"], "users") is None
+        assert database.dirty_collections == set()
+        database.close()
+
+
+@fixture
+def database_path(tmp_path):
+    path = tmp_path / "database.json"
+    path.write_text('{"users": {}, "messages": {}, "friend_requests": {}, "photos": {}}', encoding="utf-8")
+    return str(path)
+
+
+class TestJsonDatabaseOnDisk:
+
+    def test_save_replaces_file(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            inode = os.stat(database_path).st_ino
+            database.save(entity_dict, "users")
+
+        assert os.stat(database_path).st_ino != inode
+        assert not os.path.exists(database_path + ".tmp")
+        with open(database_path, encoding="utf-8") as db_file:
+            assert json.load(db_file)["users"] == {entity_dict["uuid"]: entity_dict}
+
+    def test_handle_usable_after_save(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            database.save(entity_dict, "users")
+            database.save({"uuid": "3621917a-8843-11ed-bff4-00155d211f36"}, "messages")
+            assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+            assert len(database.get_collection("messages")) == 1
+
+    def test_save_keeps_given_handle_open(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            database.save(entity_dict, "users")
+            assert not db_file.closed
+            database.close()
+            assert db_file.closed
+
+    def test_interrupted_save_keeps_file(self, database_path, default_collection_names, entity_dict, monkeypatch):
+        with open(database_path, encoding="utf-8") as db_file:
+            content = db_file.read()
+        with open(database_path, mode="r+", encoding="utf-8") as db_file:
+            database = JsonDatabase(db_file, default_collection_names)
+
+            def interrupted_replace(source, destination):
+                raise KeyboardInterrupt()
+
+            monkeypatch.setattr(os, "replace", interrupted_replace)
+            with raises(KeyboardInterrupt):
+                database.save(entity_dict, "users")
+
+        with open(database_path, encoding="utf-8") as db_file:
+            assert db_file.read() == content
+        assert not [name for name in os.listdir(os.path.dirname(database_path)) if name.endswith(".tmp")]
+
+    def test_sees_file_replaced_by_other(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            other = JsonDatabase(other_file, default_collection_names)
+            other.save(entity_dict, "users")
+            assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_saves_of_two_instances_kept(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            other = JsonDatabase(other_file, default_collection_names)
+            database.save(entity_dict, "users")
+            other.save({"uuid": "other"}, "users")
+            database.save({"uuid": "message"}, "messages")
+
+        with open(database_path, encoding="utf-8") as db_file:
+            data = json.load(db_file)
+        assert set(data["users"]) == {entity_dict["uuid"], "other"}
+        assert set(data["messages"]) == {"message"}
+
+    @mark.parametrize("delete", [False, True])
+    def test_change_of_other_after_read_kept(self, database_path, default_collection_names, entity_dict, delete):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            other = JsonDatabase(other_file, default_collection_names)
+            database.save({"uuid": "deleted"}, "users")
+            read_all_collections = database._read_all_collections
+
+            def read_and_let_other_save():
+                collections = read_all_collections()
+                database._read_all_collections = read_all_collections
+                other.save({"uuid": "other"}, "users")
+                return collections
+
+            database._read_all_collections = read_and_let_other_save
+            if delete:
+                database.delete_by_id("deleted", "users")
+            else:
+                database.save(entity_dict, "users")
+
+        with open(database_path, encoding="utf-8") as db_file:
+            users = set(json.load(db_file)["users"])
+        assert users == ({"other"} if delete else {"deleted", "other", entity_dict["uuid"]})
+
+    def test_version_increased_by_changes_of_other(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            other = JsonDatabase(other_file, default_collection_names)
+            database.save({"uuid": "message"}, "messages")
+            assert database.get_version("messages") == 1
+            assert database.get_collection_if_changed("users", 0) == (0, None)
+
+            other.save(entity_dict, "users")
+
+            assert database.get_version("messages") == 2
+            assert database.get_collection_if_changed("users", 0) == (1, [entity_dict])
+            database.save({"uuid": "other message"}, "messages")
+            assert database.get_version("messages") == 3
+
+    def test_transaction_merged_with_changes_of_other(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names)
+            other = JsonDatabase(other_file, default_collection_names)
+            other.save({"uuid": "deleted"}, "users")
+            with database.transaction():
+                database.save(entity_dict, "users")
+                database.delete_by_id("deleted", "users")
+                other.save({"uuid": "other"}, "users")
+                other.save({"uuid": "message"}, "messages")
+            version = database.get_version("messages")
+
+            assert {user["uuid"] for user in database.get_collection("users")} == {entity_dict["uuid"], "other"}
+            assert database.get_collection("messages") == [{"uuid": "message"}]
+            assert version == 1
+
+    def test_cached_flush_merged_with_changes_of_other(self, database_path, default_collection_names, entity_dict):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file, \
+                open(database_path, mode="r+", encoding="utf-8") as other_file:
+            database = JsonDatabase(db_file, default_collection_names, cached=True, flush_every=100)
+            other = JsonDatabase(other_file, default_collection_names)
+            database.save(entity_dict, "users")
+            other.save({"uuid": "other"}, "users")
+            database.flush()
+            assert {user["uuid"] for user in database.get_collection("users")} == {entity_dict["uuid"], "other"}
+
+        with open(database_path, encoding="utf-8") as db_file:
+            assert set(json.load(db_file)["users"]) == {entity_dict["uuid"], "other"}
+
+
+def write_database(path, users):
+    with open(path + ".other", mode="w", encoding="utf-8") as other_file:
+        json.dump({"users": users, "messages": {}, "friend_requests": {}, "photos": {}}, other_file)
+    os.replace(path + ".other", path)
+
+
+@fixture
+def watched_database(database_path, default_collection_names):
+    db_file = open(database_path, mode="r+", encoding="utf-8")
+    database = JsonDatabase(db_file, default_collection_names, cached=True, flush_every=100,
+                            watch_interval_ms=60000)
+    yield database
+    database.close()
+
+
+class TestWatchedJsonDatabase:
+
+    def test_watching_requires_cached_mode(self, database_path, default_collection_names):
+        with open(database_path, mode="r+", encoding="utf-8") as db_file:
+            with raises(ValueError):
+                JsonDatabase(db_file, default_collection_names, watch_interval_ms=100)
+
+    def test_watching_requires_file_on_disk(self, empty_database_file, default_collection_names):
+        with raises(ValueError):
+            JsonDatabase(empty_database_file, default_collection_names, cached=True, watch_interval_ms=100)
+
+    def test_unchanged_file_not_reloaded(self, watched_database):
+        assert watched_database.watched
+        assert not watched_database.check_for_changes()
+        assert watched_database.get_version("users") == 0
+
+    def test_own_writes_not_reloaded(self, watched_database, entity_dict):
+        watched_database.save(entity_dict, "users")
+        watched_database.flush()
+        assert not watched_database.check_for_changes()
+        assert watched_database.get_version("users") == 1
+
+    def test_changed_file_reloaded(self, watched_database, database_path, entity_dict):
+        callback = MagicMock()
+        watched_database.subscribe(callback)
+        write_database(database_path, {entity_dict["uuid"]: entity_dict})
+
+        assert watched_database.check_for_changes()
+        assert watched_database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert watched_database.get_version("users") == 1
+        callback.assert_called_once()
+
+    def test_unflushed_changes_kept(self, watched_database, database_path, entity_dict):
+        watched_database.save({"uuid": "deleted"}, "users")
+        watched_database.flush()
+        watched_database.save(entity_dict, "users")
+        watched_database.delete_by_id("deleted", "users")
+        write_database(database_path, {"deleted": {"uuid": "deleted"}, "other": {"uuid": "other"}})
+
+        assert watched_database.check_for_changes()
+        assert {user["uuid"] for user in watched_database.get_collection("users")} == {entity_dict["uuid"], "other"}
+        assert watched_database.dirty_collections == {"users"}
+
+    def test_flush_keeps_changes_of_others(self, watched_database, database_path, entity_dict):
+        watched_database.save(entity_dict, "users")
+        write_database(database_path, {"other": {"uuid": "other"}})
+        watched_database.flush()
+
+        with open(database_path, encoding="utf-8") as db_file:
+            assert set(json.load(db_file)["users"]) == {entity_dict["uuid"], "other"}
+
+    def test_invalid_file_loaded_after_next_change(self, watched_database, database_path, entity_dict):
+        with open(database_path, mode="w", encoding="utf-8") as db_file:
+            db_file.write('{"users": ')
+        assert watched_database.check_for_changes()
+        assert watched_database.get_collection("users") == []
+
+        write_database(database_path, {entity_dict["uuid"]: entity_dict})
+        assert watched_database.check_for_changes()
+        assert watched_database.get_collection("users") == [entity_dict]
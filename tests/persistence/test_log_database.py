@@ -0,0 +1,265 @@
+import json
+import os
+
+from pytest import fixture, mark, raises
+
+from persistence.interface import Mutation
+from persistence.base_database import CollectionDoesNotExistError, NoUuidError
+from persistence.json_database import InvalidDatabaseFileError
+from persistence.log_database import LogDatabase, DatabaseInUseError
+
+
+@fixture
+def default_collection_names():
+    return ["users", "messages", "friend_requests", "photos"]
+
+
+@fixture
+def log_path(tmp_path):
+    return str(tmp_path / "database.log")
+
+
+@fixture
+def entity_dict():
+    return {
+        "uuid": "691a3d52-883e-11ed-bff4-00155d211f36",
+        "username": "Test_User"
+    }
+
+
+@fixture
+def database(log_path, default_collection_names):
+    database = LogDatabase(log_path, default_collection_names)
+    yield database
+    database.close()
+
+
+def read_log(log_path):
+    with open(log_path, encoding="utf-8") as log_file:
+        return [json.loads(line) for line in log_file]
+
+
+class TestLogDatabase:
+
+    def test_create_empty(self, database):
+        assert database.get_collection("users") == []
+        assert database.get_by_id("id1", "users") is None
+
+    def test_save_and_get_by_id(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_versions(self, database, entity_dict):
+        assert database.get_version("users") == 0
+        database.save(entity_dict, "users")
+        with raises(ValueError):
+            with database.transaction():
+                database.delete_by_id(entity_dict["uuid"], "users")
+                raise ValueError()
+        assert database.get_version("users") == 3
+        assert database.get_version("messages") == 0
+        assert database.get_collection_if_changed("users", 3) == (3, None)
+        assert database.get_collection_if_changed("users", 1) == (3, [entity_dict])
+
+    def test_get_by_ids(self, database, entity_dict):
+        other = {"uuid": "other", "username": "other"}
+        database.save_collection([entity_dict, other], "users")
+        found = database.get_by_ids(["other", "missing", entity_dict["uuid"]], "users")
+        assert found == [other, entity_dict]
+
+    def test_save_appends_single_record(self, database, log_path, entity_dict):
+        database.save(entity_dict, "users")
+        database.save(entity_dict, "users")
+        assert read_log(log_path) == [
+            {"op": "upsert", "collection": "users", "entity": entity_dict},
+            {"op": "upsert", "collection": "users", "entity": entity_dict}
+        ]
+
+    def test_save_entity_no_uuid(self, database):
+        with raises(NoUuidError):
+            database.save({"username": "my_username"}, "users")
+
+    def test_collection_does_not_exist(self, database, entity_dict):
+        with raises(CollectionDoesNotExistError):
+            database.save(entity_dict, "payments")
+        with raises(CollectionDoesNotExistError):
+            database.get_collection("payments")
+
+    def test_delete_entity(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.delete_by_id(entity_dict["uuid"], "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") is None
+
+    def test_delete_entity_does_not_exist_not_logged(self, database, log_path):
+        database.delete_by_id("does_not_exist", "users")
+        assert read_log(log_path) == []
+
+    def test_save_collection(self, database, entity_dict):
+        database.save({"uuid": "other", "username": "other"}, "users")
+        database.save_collection([entity_dict], "users")
+        assert database.get_collection("users") == [entity_dict]
+
+    def test_find(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.save({"uuid": "other", "username": "other"}, "users")
+        assert database.find("users", {"username": entity_dict["username"]}) == [entity_dict]
+        assert [user["uuid"] for user in database.find("users", order_by="-username", limit=1)] == ["other"]
+
+    def test_apply_batch(self, database, log_path, entity_dict):
+        database.save({"uuid": "to_delete"}, "messages")
+
+        database.apply_batch([
+            Mutation("users", entity_dict["uuid"], entity_dict),
+            Mutation("messages", "to_delete")
+        ])
+
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert database.get_collection("messages") == []
+        assert read_log(log_path)[1:] == [
+            {"op": "upsert", "collection": "users", "entity": entity_dict},
+            {"op": "delete", "collection": "messages", "uuid": "to_delete"}
+        ]
+
+    def test_apply_batch_invalid_mutation_applies_nothing(self, database, log_path, entity_dict):
+        with raises(CollectionDoesNotExistError):
+            database.apply_batch([
+                Mutation("users", entity_dict["uuid"], entity_dict),
+                Mutation("payments", "id")
+            ])
+        assert database.get_collection("users") == []
+        assert read_log(log_path) == []
+
+    def test_transaction_appends_on_exit(self, database, log_path, entity_dict):
+        with database.transaction():
+            database.save(entity_dict, "users")
+            assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+            assert read_log(log_path) == []
+
+        assert read_log(log_path) == [
+            {"op": "upsert", "collection": "users", "entity": entity_dict}
+        ]
+
+    def test_transaction_reverted_on_exception(self, database, log_path, entity_dict):
+        database.save(entity_dict, "users")
+        changed = dict(entity_dict, username="changed")
+
+        with raises(ValueError):
+            with database.transaction():
+                database.save(changed, "users")
+                database.save({"uuid": "new"}, "users")
+                database.delete_by_id(entity_dict["uuid"], "users")
+                database.save_collection([], "messages")
+                raise ValueError()
+
+        assert database.get_collection("users") == [entity_dict]
+        assert len(read_log(log_path)) == 1
+
+    def test_call_after_commit(self, database, entity_dict):
+        calls = []
+        with database.transaction():
+            database.save(entity_dict, "users")
+            database.call_after_commit(lambda: calls.append(database.get_collection("users")))
+            assert calls == []
+        assert calls == [[entity_dict]]
+
+        with raises(ValueError):
+            with database.transaction():
+                database.call_after_commit(lambda: calls.append(None))
+                raise ValueError()
+        assert len(calls) == 1
+
+        database.call_after_commit(lambda: calls.append(None))
+        assert len(calls) == 2
+
+    def test_replay_on_open(self, database, log_path, default_collection_names, entity_dict):
+        database.save(entity_dict, "users")
+        database.save({"uuid": "to_delete"}, "messages")
+        database.delete_by_id("to_delete", "messages")
+        database.close()
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert reopened.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert reopened.get_collection("messages") == []
+        reopened.close()
+
+    def test_compact(self, database, log_path, default_collection_names, entity_dict):
+        database.save(entity_dict, "users")
+        database.compact()
+        assert read_log(log_path) == []
+        assert not os.path.exists(log_path + ".compacting")
+
+        database.save({"uuid": "after_compaction"}, "messages")
+        database.close()
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert reopened.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert reopened.get_by_id("after_compaction", "messages") is not None
+        reopened.close()
+
+    def test_compaction_threshold(self, log_path, default_collection_names):
+        database = LogDatabase(log_path, default_collection_names, compaction_threshold=10)
+        for i in range(25):
+            database.save({"uuid": str(i)}, "messages")
+        database.close()
+
+        assert os.path.exists(log_path + ".snapshot")
+        assert len(read_log(log_path)) < 25
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert len(reopened.get_collection("messages")) == 25
+        reopened.close()
+
+    def test_interrupted_compaction_is_replayed(self, database, log_path, default_collection_names, entity_dict):
+        database.save(entity_dict, "users")
+        database.close()
+        os.replace(log_path, log_path + ".compacting")
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert reopened.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        assert not os.path.exists(log_path + ".compacting")
+        reopened.close()
+
+    @mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+    def test_failed_compaction_keeps_rotated_records(self, database, log_path, default_collection_names,
+                                                     monkeypatch):
+        def fail(snapshot):
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(database, "_write_snapshot", fail)
+        database.save({"uuid": "before_failure"}, "users")
+        database.compact()
+        database.save({"uuid": "after_failure"}, "users")
+        database.compact()
+        database.close()
+        assert not os.path.exists(log_path + ".snapshot")
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert {user["uuid"] for user in reopened.get_collection("users")} == {"before_failure", "after_failure"}
+        reopened.close()
+
+    def test_opened_once_at_a_time(self, database, log_path, default_collection_names):
+        with raises(DatabaseInUseError):
+            LogDatabase(log_path, default_collection_names)
+        database.close()
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        reopened.close()
+
+    def test_torn_last_record_is_dropped(self, database, log_path, default_collection_names, entity_dict):
+        database.save(entity_dict, "users")
+        database.close()
+        with open(log_path, mode="a", encoding="utf-8") as log_file:
+            log_file.write('{"op": "upsert", "collec')
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        reopened.save({"uuid": "after_crash"}, "users")
+        reopened.close()
+
+        reopened = LogDatabase(log_path, default_collection_names)
+        assert len(reopened.get_collection("users")) == 2
+        reopened.close()
+
+    def test_corrupted_log(self, log_path, default_collection_names):
+        with open(log_path, mode="w", encoding="utf-8") as log_file:
+            log_file.write("not json\n")
+        with raises(InvalidDatabaseFileError):
+            LogDatabase(log_path, default_collection_names)
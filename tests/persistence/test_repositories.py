@@ -1,8 +1,15 @@
+from io import StringIO
 from unittest.mock import MagicMock
 
-from pytest import fixture
+from pytest import fixture, raises
 
+from core.model import Photo, BytesBlob
+from core.serializers import PhotoSerializer, MessageSerializer
+from persistence.blob_store import BlobStore
+from persistence.interface import Mutation, VersionedCollection
+from persistence.json_database import JsonDatabase, select_entities, select_entities_before
 from persistence.repositories import UserRepository, MessageRepository, FriendRequestRepository, PhotoRepository
+from persistence.sqlite_database import SqliteDatabase
 
 
 @fixture
@@ -48,9 +55,30 @@ def database(user_1_json, user_2_json, user_3_json, users_json_collection,
         elif collection_name == "photos":
             return [photo_1_json]
 
+    def get_by_ids(entity_ids, collection_name):
+        return [entity_dict for entity_id in entity_ids if (entity_dict := get_by_id(entity_id, collection_name))]
+
+    def find(collection_name, where=None, order_by=None, limit=None):
+        return select_entities(get_collection(collection_name), where, order_by, limit)
+
+    def find_before(collection_name, where, field, before, limit):
+        return select_entities_before(get_collection(collection_name), where, field, before, limit)
+
+    def get_collection_if_changed(collection_name, since_version):
+        version = database.get_version(collection_name)
+        if version <= since_version:
+            return VersionedCollection(version, None)
+        return VersionedCollection(version, database.get_collection(collection_name))
+
     database = MagicMock()
     database.get_by_id = get_by_id
+    database.get_by_ids = get_by_ids
     database.get_collection = get_collection
+    database.find = find
+    database.find_before = find_before
+    database.is_indexed = MagicMock(return_value=False)
+    database.get_version = MagicMock(return_value=0)
+    database.get_collection_if_changed = get_collection_if_changed
     return database
 
 
@@ -62,7 +90,7 @@ def message_serializer(message_1, message_2, message_1_json, message_2_json):
         elif message == message_2:
             return message_2_json
 
-    def from_json(json_dict):
+    def from_json(json_dict, trusted=False):
         if json_dict == message_1_json:
             return message_1
         elif json_dict == message_2_json:
@@ -82,7 +110,7 @@ def friend_request_serializer(request_1, request_2, request_1_json, request_2_js
         elif entity == request_2:
             return request_2_json
 
-    def from_json(json_dict):
+    def from_json(json_dict, trusted=False):
         if json_dict == request_1_json:
             return request_1
         elif json_dict == request_2_json:
@@ -104,7 +132,7 @@ def user_serializer(user_1, user_2, user_3, user_1_json, user_2_json, user_3_jso
         elif user == user_3:
             return user_3_json
 
-    def from_json(json_dict):
+    def from_json(json_dict, trusted=False):
         if json_dict == user_1_json:
             return user_1
         elif json_dict == user_2_json:
@@ -124,7 +152,7 @@ def photo_serializer(photo_1, photo_1_json):
         if entity == photo_1:
             return photo_1_json
 
-    def from_json(json_dict):
+    def from_json(json_dict, trusted=False):
         if json_dict == photo_1_json:
             return photo_1
 
@@ -169,10 +197,126 @@ class TestUserRepository:
     def test_get_by_id_does_not_exist(self, user_repository):
         assert user_repository.get_by_id("02240d58-8866-11ed-942c-00155d211f36") is None
 
+    def test_get_by_ids(self, user_repository, user_1, user_3):
+        found = user_repository.get_by_ids([user_3.uuid, "02240d58-8866-11ed-942c-00155d211f36", user_1.uuid])
+        assert found == [user_3, user_1]
+
+    def test_get_by_id_from_identity_map(self, user_repository, user_serializer, user_1):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        user = user_repository.get_by_id(user_1.uuid)
+        assert user_repository.get_by_id(user_1.uuid) == user
+        assert user_repository.get_by_ids([user_1.uuid]) == [user]
+        from_json.assert_called_once()
+
+    def test_unsaved_changes_not_shared(self, user_repository, user_1, user_2):
+        user = user_repository.get_by_id(user_1.uuid)
+        user.bio = "unsaved"
+        user.friend_uuids.add(user_2.uuid)
+        for found in [
+            user_repository.get_by_id(user_1.uuid),
+            *user_repository.get_by_ids([user_1.uuid]),
+            user_repository.get_by_username(user_1.username),
+            user_repository.get_by_email(user_1.email),
+            *user_repository.get_by_username_fragment(user_1.username),
+            *[other for other in user_repository.get_all() if other.uuid == user_1.uuid]
+        ]:
+            assert found is not user
+            assert found.bio is None
+            assert found.friend_uuids == set()
+
+    def test_get_by_ids_reads_only_missing(self, user_repository, database, user_1, user_2):
+        user_repository.get_by_id(user_1.uuid)
+        database.get_by_ids = MagicMock(side_effect=database.get_by_ids)
+        assert user_repository.get_by_ids([user_2.uuid, user_1.uuid]) == [user_2, user_1]
+        database.get_by_ids.assert_called_once_with([user_2.uuid], "users")
+
+    def test_identity_map_invalidated_on_save_and_delete(self, user_repository, user_serializer, user_1):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        user_repository.get_by_id(user_1.uuid)
+        user_repository.save(user_1)
+        user_repository.get_by_id(user_1.uuid)
+        user_repository.delete(user_1)
+        user_repository.get_by_id(user_1.uuid)
+        assert from_json.call_count == 3
+
+    def test_identity_map_cleared_on_database_change(self, user_repository, user_serializer, database, user_1):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        user_repository.get_by_id(user_1.uuid)
+        user_repository.get_by_id(user_1.uuid)
+        database.get_version.return_value = 1
+        user_repository.get_by_id(user_1.uuid)
+        assert from_json.call_count == 2
+
+    def test_own_writes_keep_identity_map(self, user_repository, user_serializer, database, user_1, user_2):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        user_repository.get_by_id(user_1.uuid)
+
+        def save(entity_dict, collection_name):
+            database.get_version.return_value += 1
+
+        database.save = save
+        user_repository.save(user_2)
+        user_repository.get_by_id(user_1.uuid)
+        from_json.assert_called_once()
+
+    def test_indexes_rebuilt_on_collection_change(self, user_repository, database, user_1, user_1_json):
+        assert user_repository.get_by_username(user_1.username) == user_1
+        database.get_collection = MagicMock(return_value=[])
+        database.get_version.return_value = 1
+        assert user_repository.get_by_username(user_1.username) is None
+
+    def test_get_all_reads_changed_collection_only(self, user_repository, database, users_collection):
+        database.get_collection = MagicMock(side_effect=database.get_collection)
+        assert user_repository.get_all() == users_collection
+        assert user_repository.get_all() == users_collection
+        database.get_collection.assert_called_once()
+        database.get_version.return_value = 1
+        user_repository.get_all()
+        assert database.get_collection.call_count == 2
+
+    def test_identity_map_disabled(self, database, user_serializer, user_1):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        repository = UserRepository(database, user_serializer, cache_size=0)
+        repository.get_by_id(user_1.uuid)
+        repository.get_by_id(user_1.uuid)
+        assert from_json.call_count == 2
+
     def test_delete(self, user_repository, database, user_1):
         user_repository.delete(user_1)
         database.delete_by_id.assert_called_with(user_1.uuid, "users")
 
+    def test_save_many(self, database, user_repository, user_1, user_2, user_1_json, user_2_json):
+        user_repository.save_many([user_1, user_2])
+        mutations = list(database.apply_batch.call_args.args[0])
+        assert mutations == [
+            Mutation("users", user_1.uuid, user_1_json),
+            Mutation("users", user_2.uuid, user_2_json)
+        ]
+        database.save.assert_not_called()
+
+    def test_delete_many(self, database, user_repository, user_1, user_2):
+        user_repository.delete_many([user_1, user_2])
+        mutations = list(database.apply_batch.call_args.args[0])
+        assert mutations == [
+            Mutation("users", user_1.uuid),
+            Mutation("users", user_2.uuid)
+        ]
+        database.delete_by_id.assert_not_called()
+
+    def test_get_by_username_after_delete_many(self, user_repository, user_1, user_2):
+        assert user_repository.get_by_username(user_1.username) == user_1
+        user_repository.delete_many([user_1, user_2])
+        assert user_repository.get_by_username(user_1.username) is None
+        assert user_repository.get_by_email(user_2.email) is None
+
+    def test_transaction(self, database, user_repository):
+        assert user_repository.transaction() is database.transaction.return_value
+
     def test_get_by_username(self, user_repository, user_1):
         assert user_repository.get_by_username(user_1.username) == user_1
 
@@ -185,6 +329,41 @@ class TestUserRepository:
     def test_get_by_email_does_not_exist(self, user_repository):
         assert user_repository.get_by_email("doesnotexist@example.com") is None
 
+    def test_get_by_username_and_email_found_by_indexing_database(self, database, user_repository, user_1):
+        database.is_indexed.return_value = True
+        database.get_collection = MagicMock()
+        assert user_repository.get_by_username(user_1.username) == user_1
+        assert user_repository.get_by_email(user_1.email) == user_1
+        assert user_repository.get_by_username("doesnotexist") is None
+        database.get_collection.assert_not_called()
+
+    def test_get_by_id_deserializes_trusted(self, database, user_1, user_1_json):
+        serializer = MagicMock()
+        serializer.from_json.return_value = user_1
+        repository = UserRepository(database, serializer)
+        repository.get_by_id(user_1.uuid)
+        serializer.from_json.assert_called_once_with(user_1_json, trusted=True)
+
+    def test_get_by_username_deserializes_only_match(self, user_repository, user_serializer, user_2):
+        from_json = MagicMock(side_effect=user_serializer.from_json)
+        user_serializer.from_json = from_json
+        assert user_repository.get_by_username(user_2.username) == user_2
+        assert user_repository.get_by_email(user_2.email) == user_2
+        assert from_json.call_count == 1
+
+    def test_get_by_username_after_delete(self, user_repository, user_1):
+        assert user_repository.get_by_username(user_1.username) == user_1
+        user_repository.delete(user_1)
+        assert user_repository.get_by_username(user_1.username) is None
+        assert user_repository.get_by_email(user_1.email) is None
+
+    def test_get_by_username_after_save(self, user_repository, database, user_1):
+        database.get_collection = MagicMock(return_value=[])
+        assert user_repository.get_by_username(user_1.username) is None
+        user_repository.save(user_1)
+        assert user_repository.get_by_username(user_1.username) == user_1
+        database.get_collection.assert_called_once()
+
     def test_get_by_username_fragment(self, user_repository, user_1, user_2, user_3):
         found = user_repository.get_by_username_fragment("us")
         assert len(found) == 3
@@ -195,6 +374,25 @@ class TestUserRepository:
     def test_get_by_username_fragment_empty(self, user_repository):
         assert user_repository.get_by_username_fragment("no match") == []
 
+    def test_get_by_username_fragment_ordered_with_limit(self, user_repository, user_1, user_2, user_3):
+        found = user_repository.get_by_username_fragment("user", limit=2)
+        expected = sorted([user_1, user_2, user_3], key=lambda user: user.username)[:2]
+        assert found == expected
+
+    def test_get_by_username_fragment_short(self, user_repository, user_1, user_2, user_3):
+        assert len(user_repository.get_by_username_fragment("u")) == 3
+        assert user_repository.get_by_username_fragment("") == user_repository.get_by_username_fragment("user")
+
+    def test_get_by_username_fragment_after_save(self, user_repository, database, user_1):
+        database.get_collection = MagicMock(return_value=[])
+        assert user_repository.get_by_username_fragment(user_1.username) == []
+        user_repository.save(user_1)
+        assert user_repository.get_by_username_fragment(user_1.username) == [user_1]
+
+    def test_get_by_username_fragment_after_delete(self, user_repository, user_1):
+        assert user_1 in user_repository.get_by_username_fragment("user")
+        user_repository.delete(user_1)
+        assert user_1 not in user_repository.get_by_username_fragment("user")
 
 class TestMessageRepository:
 
@@ -225,6 +423,87 @@ class TestMessageRepository:
         assert message_repository.get_messages(user_1, user_3) == []
         assert message_repository.get_messages(user_2, user_3) == []
 
+    def test_get_messages_page(self, message_repository, message_1, message_2, user_1, user_2):
+        page = message_repository.get_messages_page(user_1, user_2, limit=1)
+        assert page.messages == [message_2]
+        assert page.cursor == message_2.timestamp
+
+        page = message_repository.get_messages_page(user_1, user_2, before=page.cursor, limit=1)
+        assert page.messages == [message_1]
+        assert page.cursor is None
+
+    def test_get_messages_page_all_messages(self, message_repository, message_1, message_2, user_1, user_2):
+        page = message_repository.get_messages_page(user_2, user_1)
+        assert page.messages == [message_1, message_2]
+        assert page.cursor is None
+
+    def test_get_messages_page_limit_not_positive(self, message_repository, database, user_1, user_2):
+        for indexed in (False, True):
+            database.is_indexed.return_value = indexed
+            with raises(ValueError):
+                message_repository.get_messages_page(user_1, user_2, limit=0)
+
+    def test_get_messages_page_found_by_indexing_database(self, message_repository, database,
+                                                          message_1, message_2, user_1, user_2, user_3):
+        database.is_indexed.return_value = True
+        database.get_collection = MagicMock()
+        database.find = MagicMock(wraps=database.find)
+        page = message_repository.get_messages_page(user_2, user_1, limit=1)
+        assert page.messages == [message_2]
+        assert page.cursor == message_2.timestamp
+
+        page = message_repository.get_messages_page(user_1, user_2, before=page.cursor)
+        assert page.messages == [message_1]
+        assert page.cursor is None
+        assert message_repository.get_messages_page(user_1, user_3).messages == []
+        database.get_collection.assert_not_called()
+        assert all("timestamp" in call.args[1] for call in database.find.call_args_list)
+
+    def test_get_messages_page_found_by_sqlite_matches_index(self, user_1, user_2):
+        messages = [
+            {"uuid": f"m{number}", "text": "Hi", "timestamp": timestamp, "from_user_id": from_user.uuid,
+             "to_user_id": to_user.uuid}
+            for number, (timestamp, from_user, to_user) in enumerate([
+                ("2023-01-01T10:00:00", user_1, user_2),
+                ("2023-01-01T11:00:00", user_2, user_1),
+                ("2023-01-01T11:00:00", user_1, user_2),
+                ("2023-01-01T12:00:00", user_1, user_2),
+                ("2023-01-01T13:00:00", user_2, user_1)
+            ])
+        ]
+        indexes = {"messages": [("from_user_id", "to_user_id", "timestamp")]}
+        indexed_database = SqliteDatabase(":memory:", ["messages"], indexes)
+        database = SqliteDatabase(":memory:", ["messages"])
+        for each in (indexed_database, database):
+            each.save_collection(messages, "messages")
+        indexed_repository = MessageRepository(indexed_database, MessageSerializer())
+        repository = MessageRepository(database, MessageSerializer())
+
+        for limit in range(1, 6):
+            before = None
+            while True:
+                page = indexed_repository.get_messages_page(user_1, user_2, before, limit)
+                assert page == repository.get_messages_page(user_1, user_2, before, limit)
+                if page.cursor is None:
+                    break
+                before = page.cursor
+        page = indexed_repository.get_messages_page(user_1, user_2, limit=2)
+        assert [message.uuid for message in page.messages] == ["m3", "m4"]
+        page = indexed_repository.get_messages_page(user_1, user_2, page.cursor, limit=1)
+        assert [message.uuid for message in page.messages] == ["m1", "m2"]
+        assert page.cursor is not None
+
+    def test_get_messages_after_save_and_delete(self, message_repository, database,
+                                                message_1, message_2, user_1, user_2):
+        database.get_collection = MagicMock(return_value=[])
+        assert message_repository.get_messages(user_1, user_2) == []
+        message_repository.save(message_2)
+        message_repository.save(message_1)
+        assert message_repository.get_messages(user_1, user_2) == [message_1, message_2]
+        message_repository.delete(message_1)
+        assert message_repository.get_messages(user_1, user_2) == [message_2]
+        database.get_collection.assert_called_once()
+
 
 class TestFriendRequestRepository:
 
@@ -252,6 +531,13 @@ class TestFriendRequestRepository:
         assert friend_request_repository.get_requests_from_user(user_2) == []
         assert friend_request_repository.get_requests_from_user(user_3) == [request_2]
 
+    def test_get_requests_deserializes_only_matches(self, friend_request_repository, friend_request_serializer,
+                                                    user_3, request_1):
+        from_json = MagicMock(side_effect=friend_request_serializer.from_json)
+        friend_request_serializer.from_json = from_json
+        assert friend_request_repository.get_requests_to_user(user_3) == [request_1]
+        assert from_json.call_count == 1
+
 
 class TestPhotoRepository:
 
@@ -268,3 +554,119 @@ class TestPhotoRepository:
     def test_delete(self, photo_repository, database, photo_1):
         photo_repository.delete(photo_1)
         database.delete_by_id.assert_called_with(photo_1.uuid, "photos")
+
+
+@fixture
+def blob_store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+@fixture
+def photos_database():
+    return JsonDatabase(StringIO('{"photos": {}}'), ["photos"])
+
+
+@fixture
+def blob_photo_repository(photos_database, blob_store):
+    return PhotoRepository(photos_database, PhotoSerializer(), "photos", blob_store)
+
+
+@fixture
+def blob_photo():
+    return Photo(
+        uuid="d9eaaf36-8874-11ed-942c-00155d211f36",
+        filename="photo.jpg",
+        format="jpg",
+        blob=BytesBlob(b"binary content")
+    )
+
+
+class TestPhotoRepositoryWithBlobStore:
+
+    def test_database_holds_only_metadata(self, blob_photo_repository, photos_database, blob_photo, blob_store):
+        blob_photo_repository.save(blob_photo)
+        photo_json = photos_database.get_by_id(blob_photo.uuid, "photos")
+        assert photo_json["binary_data_hex"] == ""
+        assert blob_store.contains(photo_json["blob_id"])
+
+    def test_save_and_get_by_id(self, blob_photo_repository, blob_photo):
+        blob_photo_repository.save(blob_photo)
+        photo = blob_photo_repository.get_by_id(blob_photo.uuid)
+        assert photo == blob_photo
+        assert photo.get_bytes() == b"binary content"
+
+    def test_get_photo_with_hex_content(self, blob_photo_repository, photo_1, photo_1_json, photos_database):
+        photos_database.save(photo_1_json, "photos")
+        photo = blob_photo_repository.get_by_id(photo_1.uuid)
+        assert photo == photo_1
+        assert photo.blob is None
+
+    def test_delete_removes_blob(self, blob_photo_repository, photos_database, blob_photo, blob_store):
+        blob_photo_repository.save(blob_photo)
+        blob_id = photos_database.get_by_id(blob_photo.uuid, "photos")["blob_id"]
+        blob_photo_repository.delete(blob_photo)
+        assert blob_photo_repository.get_by_id(blob_photo.uuid) is None
+        assert not blob_store.contains(blob_id)
+
+    def test_delete_keeps_shared_blob(self, blob_photo_repository, photos_database, blob_photo, blob_store):
+        copy = Photo(
+            uuid="8af8fc5e-8a02-11ed-8f81-00155d211d29",
+            filename="copy.jpg",
+            format="jpg",
+            blob=BytesBlob(b"binary content")
+        )
+        blob_photo_repository.save(blob_photo)
+        blob_photo_repository.save(copy)
+        blob_photo_repository.delete(blob_photo)
+        assert blob_photo_repository.get_by_id(copy.uuid).get_bytes() == b"binary content"
+
+    def test_delete_many_removes_unused_blobs(self, blob_photo_repository, photos_database, blob_photo, blob_store):
+        other = Photo(
+            uuid="8af8fc5e-8a02-11ed-8f81-00155d211d29",
+            filename="other.jpg",
+            format="jpg",
+            blob=BytesBlob(b"other content")
+        )
+        blob_photo_repository.save_many([blob_photo, other])
+        blob_ids = [photo_json["blob_id"] for photo_json in photos_database.get_collection("photos")]
+        blob_photo_repository.delete_many([blob_photo, other])
+        assert photos_database.get_collection("photos") == []
+        assert not any(blob_store.contains(blob_id) for blob_id in blob_ids)
+
+    def test_delete_in_discarded_transaction_keeps_blob(self, blob_photo_repository, photos_database, blob_photo,
+                                                        blob_store):
+        blob_photo_repository.save(blob_photo)
+        blob_id = photos_database.get_by_id(blob_photo.uuid, "photos")["blob_id"]
+        with raises(ValueError):
+            with blob_photo_repository.transaction():
+                blob_photo_repository.delete(blob_photo)
+                assert blob_store.contains(blob_id)
+                raise ValueError()
+
+        assert blob_photo_repository.get_by_id(blob_photo.uuid).get_bytes() == b"binary content"
+        assert blob_store.contains(blob_id)
+
+    def test_delete_in_transaction_removes_blob_after_commit(self, blob_photo_repository, photos_database,
+                                                              blob_photo, blob_store):
+        blob_photo_repository.save(blob_photo)
+        blob_id = photos_database.get_by_id(blob_photo.uuid, "photos")["blob_id"]
+        with blob_photo_repository.transaction():
+            blob_photo_repository.delete_many([blob_photo])
+            assert blob_store.contains(blob_id)
+
+        assert not blob_store.contains(blob_id)
+
+    def test_blob_saved_again_in_transaction_kept(self, blob_photo_repository, photos_database, blob_photo,
+                                                   blob_store):
+        copy = Photo(
+            uuid="8af8fc5e-8a02-11ed-8f81-00155d211d29",
+            filename="copy.jpg",
+            format="jpg",
+            blob=BytesBlob(b"binary content")
+        )
+        blob_photo_repository.save(blob_photo)
+        with blob_photo_repository.transaction():
+            blob_photo_repository.delete(blob_photo)
+            blob_photo_repository.save(copy)
+
+        assert blob_photo_repository.get_by_id(copy.uuid).get_bytes() == b"binary content"
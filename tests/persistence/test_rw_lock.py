@@ -0,0 +1,93 @@
+from threading import Event, Thread
+
+from pytest import fixture, raises
+
+from persistence.rw_lock import ReadWriteLock
+
+
+@fixture
+def lock():
+    return ReadWriteLock()
+
+
+def acquire_in_thread(lock_context):
+    acquired = Event()
+
+    def acquire():
+        with lock_context():
+            acquired.set()
+
+    thread = Thread(target=acquire)
+    thread.start()
+    return thread, acquired
+
+
+class TestReadWriteLock:
+
+    def test_readers_hold_lock_together(self, lock):
+        with lock.read():
+            thread, acquired = acquire_in_thread(lock.read)
+            assert acquired.wait(5)
+        thread.join()
+
+    def test_writer_blocks_readers(self, lock):
+        with lock.write():
+            thread, acquired = acquire_in_thread(lock.read)
+            assert not acquired.wait(0.1)
+        assert acquired.wait(5)
+        thread.join()
+
+    def test_reader_blocks_writers(self, lock):
+        with lock.read():
+            thread, acquired = acquire_in_thread(lock.write)
+            assert not acquired.wait(0.1)
+        assert acquired.wait(5)
+        thread.join()
+
+    def test_waiting_writer_blocks_new_readers(self, lock):
+        with lock.read():
+            writer, writer_acquired = acquire_in_thread(lock.write)
+            assert not writer_acquired.wait(0.1)
+            reader, reader_acquired = acquire_in_thread(lock.read)
+            assert not reader_acquired.wait(0.1)
+        assert writer_acquired.wait(5)
+        assert reader_acquired.wait(5)
+        writer.join()
+        reader.join()
+
+    def test_reentrant(self, lock):
+        with lock.write():
+            with lock.write():
+                assert lock.held_for_writing
+            assert lock.held_for_writing
+        assert not lock.held_for_writing
+
+        with lock.read():
+            with lock.read():
+                pass
+        with lock.write():
+            pass
+
+    def test_downgrade(self, lock):
+        lock.acquire_write()
+        lock.acquire_read()
+        lock.release_write()
+        assert not lock.held_for_writing
+
+        thread, acquired = acquire_in_thread(lock.read)
+        assert acquired.wait(5)
+        thread.join()
+        lock.release_read()
+
+    def test_upgrade_raises(self, lock):
+        with lock.read():
+            with raises(RuntimeError):
+                lock.acquire_write()
+        with lock.write():
+            pass
+
+    def test_release_not_held_raises(self, lock):
+        with raises(RuntimeError):
+            lock.release_read()
+        with raises(RuntimeError):
+            lock.release_write()
@@ -0,0 +1,243 @@
+import json
+import shutil
+from pathlib import Path
+
+from pytest import fixture, raises
+
+from persistence.interface import Mutation
+from persistence.base_database import CollectionDoesNotExistError, NoUuidError
+from persistence.sqlite_database import SqliteDatabase, migrate_json_database
+
+
+@fixture
+def default_collection_names():
+    return ["users", "messages", "friend_requests", "photos"]
+
+
+@fixture
+def indexes():
+    return {
+        "users": [("username",), ("email",)],
+        "messages": [("from_user_id", "to_user_id", "timestamp")]
+    }
+
+
+@fixture
+def entity_dict():
+    return {
+        "uuid": "691a3d52-883e-11ed-bff4-00155d211f36",
+        "username": "Test_User",
+        "email": "test@example.com",
+        "friend_uuids": ["3621917a-8843-11ed-bff4-00155d211f36"]
+    }
+
+
+@fixture
+def database(default_collection_names, indexes):
+    database = SqliteDatabase(":memory:", default_collection_names, indexes)
+    yield database
+    database.close()
+
+
+@fixture
+def messages():
+    return [
+        {"uuid": "m1", "from_user_id": "a", "to_user_id": "b", "timestamp": "2023-01-01T10:00:00", "text": "1"},
+        {"uuid": "m2", "from_user_id": "a", "to_user_id": "b", "timestamp": "2023-01-01T09:00:00", "text": "2"},
+        {"uuid": "m3", "from_user_id": "b", "to_user_id": "a", "timestamp": "2023-01-01T11:00:00", "text": "3"},
+        {"uuid": "m4", "from_user_id": "a", "to_user_id": "c", "timestamp": "2023-01-01T12:00:00", "text": "4"}
+    ]
+
+
+class TestSqliteDatabase:
+
+    def test_create_empty(self, database):
+        assert database.get_collection("users") == []
+        assert database.get_by_id("id1", "users") is None
+
+    def test_save_and_get_by_id(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+
+    def test_versions(self, database, entity_dict):
+        assert database.get_version("users") == 0
+        database.save(entity_dict, "users")
+        database.delete_by_id(entity_dict["uuid"], "users")
+        assert database.get_version("users") == 2
+        assert database.get_version("messages") == 0
+        with raises(ValueError):
+            with database.transaction():
+                raise ValueError()
+        assert database.get_version("users") == 3
+        assert database.get_collection_if_changed("users", 3) == (3, None)
+        assert database.get_collection_if_changed("users", 2) == (3, [])
+
+    def test_get_by_ids(self, database, entity_dict):
+        other = {"uuid": "other", "username": "other"}
+        database.save_collection([entity_dict, other], "users")
+        found = database.get_by_ids(["other", "missing", entity_dict["uuid"]], "users")
+        assert found == [other, entity_dict]
+        assert database.get_by_ids([], "users") == []
+
+    def test_get_by_ids_many(self, database):
+        database.save_collection([{"uuid": str(i)} for i in range(1200)], "messages")
+        ids = [str(i) for i in reversed(range(1200))]
+        assert [entity["uuid"] for entity in database.get_by_ids(ids, "messages")] == ids
+
+    def test_save_overwrite_existing_entity(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        changed = dict(entity_dict, username="changed")
+        database.save(changed, "users")
+        assert database.get_collection("users") == [changed]
+
+    def test_save_entity_no_uuid(self, database):
+        with raises(NoUuidError):
+            database.save({"username": "my_username"}, "users")
+
+    def test_collection_does_not_exist(self, database, entity_dict):
+        with raises(CollectionDoesNotExistError):
+            database.save(entity_dict, "payments")
+        with raises(CollectionDoesNotExistError):
+            database.get_collection("payments")
+        with raises(CollectionDoesNotExistError):
+            database.find("payments")
+
+    def test_delete_entity(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.delete_by_id(entity_dict["uuid"], "users")
+        database.delete_by_id("does_not_exist", "users")
+        assert database.get_by_id(entity_dict["uuid"], "users") is None
+
+    def test_save_collection(self, database, entity_dict):
+        database.save({"uuid": "other", "username": "other"}, "users")
+        database.save_collection([entity_dict], "users")
+        assert database.get_collection("users") == [entity_dict]
+
+    def test_invalid_identifier(self, default_collection_names):
+        with raises(ValueError):
+            SqliteDatabase(":memory:", default_collection_names, {"users": [('name"; DROP TABLE users',)]})
+
+    def test_apply_batch_invalid_mutation_applies_nothing(self, database, entity_dict):
+        with raises(NoUuidError):
+            database.apply_batch([
+                Mutation("users", entity_dict["uuid"], entity_dict),
+                Mutation("messages", "id", {"text": "no uuid"})
+            ])
+        assert database.get_collection("users") == []
+
+    def test_transaction_rolled_back_on_exception(self, database, entity_dict):
+        with raises(ValueError):
+            with database.transaction():
+                database.save(entity_dict, "users")
+                assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+                raise ValueError()
+        assert database.get_collection("users") == []
+
+    def test_call_after_commit(self, database, entity_dict):
+        calls = []
+        with database.transaction():
+            database.save(entity_dict, "users")
+            database.call_after_commit(lambda: calls.append(database.get_collection("users")))
+            assert calls == []
+        assert calls == [[entity_dict]]
+
+        with raises(ValueError):
+            with database.transaction():
+                database.call_after_commit(lambda: calls.append(None))
+                raise ValueError()
+        assert len(calls) == 1
+
+        database.call_after_commit(lambda: calls.append(None))
+        assert len(calls) == 2
+
+    def test_version_increased_by_changes_of_other_connection(self, tmp_path, default_collection_names, indexes,
+                                                               entity_dict):
+        path = str(tmp_path / "database.sqlite")
+        database = SqliteDatabase(path, default_collection_names, indexes)
+        other = SqliteDatabase(path, default_collection_names, indexes)
+        version = database.get_version("users")
+        assert database.get_version("users") == version
+
+        other.save(entity_dict, "users")
+        assert database.get_version("users") > version
+        assert database.get_by_id(entity_dict["uuid"], "users") == entity_dict
+        other.close()
+        database.close()
+
+    def test_is_indexed(self, database):
+        assert database.is_indexed("users", "username")
+        assert database.is_indexed("messages", "timestamp")
+        assert not database.is_indexed("users", "bio")
+
+    def test_find_by_indexed_field(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        database.save({"uuid": "other", "username": "other", "email": "test@example.com"}, "users")
+        assert database.find("users", {"username": "Test_User"}) == [entity_dict]
+        assert len(database.find("users", {"email": "test@example.com"})) == 2
+        assert database.find("users", {"username": "nobody"}) == []
+
+    def test_find_by_not_indexed_field(self, database, entity_dict):
+        database.save(entity_dict, "users")
+        assert database.find("users", {"friend_uuids": entity_dict["friend_uuids"]}) == [entity_dict]
+        assert database.find("users", {"bio": "not set"}) == []
+
+    def test_find_before(self, database, messages):
+        database.save_collection(messages, "messages")
+
+        def find_ids(*args):
+            return [message["uuid"] for message in database.find_before("messages", *args)]
+
+        assert find_ids({"from_user_id": "a", "to_user_id": "b"}, "timestamp", None, 10) == ["m1", "m2"]
+        assert find_ids({"from_user_id": "a"}, "timestamp", "2023-01-01T12:00:00", 1) == ["m1"]
+        assert find_ids(None, "timestamp", "2023-01-01T11:00:00", 10) == ["m1", "m2"]
+        assert find_ids({"from_user_id": "a"}, "text", "4", 2) == ["m2", "m1"]
+
+    def test_find_ordered_with_limit(self, database, messages):
+        database.save_collection(messages, "messages")
+        found = database.find(
+            "messages", {"from_user_id": "a", "to_user_id": "b"}, order_by="timestamp"
+        )
+        assert [message["uuid"] for message in found] == ["m2", "m1"]
+
+        found = database.find("messages", order_by="-timestamp", limit=2)
+        assert [message["uuid"] for message in found] == ["m4", "m3"]
+
+        found = database.find("messages", {"text": "1"}, order_by="-text", limit=1)
+        assert [message["uuid"] for message in found] == ["m1"]
+
+        found = database.find("messages", order_by="-text", limit=2)
+        assert [message["uuid"] for message in found] == ["m4", "m3"]
+
+    def test_reopen_adds_new_indexes(self, tmp_path, default_collection_names, entity_dict):
+        path = str(tmp_path / "database.sqlite")
+        database = SqliteDatabase(path, default_collection_names)
+        database.save(entity_dict, "users")
+        database.close()
+
+        database = SqliteDatabase(path, default_collection_names, {"users": [("username",)]})
+        assert database.find("users", {"username": entity_dict["username"]}) == [entity_dict]
+        database.close()
+
+
+class TestMigration:
+
+    def test_migrate_json_database(self, tmp_path, database, default_collection_names, entity_dict, messages):
+        json_path = tmp_path / "database.json"
+        json_path.write_text(json.dumps({
+            "users": {entity_dict["uuid"]: entity_dict},
+            "messages": {message["uuid"]: message for message in messages},
+            "friend_requests": {},
+            "photos": {}
+        }), encoding="utf-8")
+
+        migrate_json_database(str(json_path), database, default_collection_names)
+
+        assert database.get_collection("users") == [entity_dict]
+        assert len(database.get_collection("messages")) == 4
+        assert database.get_collection("photos") == []
+
+    def test_migrate_empty_example(self, database, default_collection_names, tmp_path):
+        example = tmp_path / "empty-db.json"
+        shutil.copyfile(Path(__file__).parents[2] / "examples" / "empty-db.json", example)
+        migrate_json_database(str(example), database, default_collection_names)
+        assert database.get_collection("users") == []